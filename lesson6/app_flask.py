@@ -1,24 +1,61 @@
 """
 Flask 版本的 MQTT 監控應用程式
 替代 Streamlit，解決 Raspberry Pi 相容性問題
+
+匯入本模組不會連線 MQTT 或讀取數據；由 create_app() 建立應用程式並啟動背景服務：
+    HTTP 立即開始服務，歷史數據在背景載入，載入完成後才開始處理佇列中的訊息，
+    /readyz 在歷史數據載入、接收流程啟動後回傳 200，並通知 systemd（Type=notify）
 """
 
-from flask import Flask, render_template, jsonify
-from flask_socketio import SocketIO
-import paho.mqtt.client as mqtt
-from datetime import datetime
-import json
-import threading
+from flask import Blueprint, Flask, Response, render_template, jsonify, request
+from flask_socketio import SocketIO, join_room, leave_room
+from collections import deque
 import csv
+import io
+import json
+import math
+import socket
 import os
+import threading
+import time
+
+import chart
+import metrics
+import packed
+from commands import ACK_SUBSCRIPTION, CommandChannel, validate_command, validate_device
+from devices import DEVICES
+from ingest import IngestPipeline, decode_button_event, decode_diagnostics
+from latency import TRACKER
+from log_config import get_logger
+from readiness import Readiness, process_uptime, sd_notify
+from retention import RetentionWorker
+from storage import RAW_FIELDS, TIER_MS, SensorStore, fill_forward, format_raw_row
+from timestamps import HOUR_MS, bucket_start, now_ms
+import timesync
+
+log = get_logger('monitor')
 
-app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*")
+bp = Blueprint('monitor', __name__)
+socketio = SocketIO(cors_allowed_origins="*")
 
 # MQTT 設定
 MQTT_BROKER = "localhost"
 MQTT_PORT = 1883
 MQTT_TOPIC = "living_room/sensor"
+# 按鈕事件主題（lesson8/lesson18_3.py）
+MQTT_BUTTON_TOPIC = "living_room/button"
+# 裝置診斷主題（pico/telemetry.py：記憶體、回收次數、最長迴圈時間）
+MQTT_DIAG_SUBSCRIPTION = "devices/+/diag"
+# 固定的 client id：broker 依此保留斷線期間的 session 與 QoS 1 訊息
+MQTT_CLIENT_ID = f"mqtt-monitor-{socket.gethostname()}"
+# 5 = MQTT v5（session expiry），4 = MQTT v3.1.1（clean_session=False）
+MQTT_PROTOCOL = 5
+
+# 是否允許瀏覽器選用二進位編碼（packed.py）；False 時一律使用 JSON
+BINARY_ENCODING = True
+# Socket.IO 房間：依瀏覽器選用的編碼分組，每筆數據每種編碼只編碼一次
+ROOM_JSON = 'json'
+ROOM_PACKED = 'packed'
 
 # 全域數據儲存
 sensor_data = []
@@ -28,161 +65,609 @@ latest_data = {
     'humidity': 0,
     'timestamp': None
 }
-mqtt_connected = False
 
-# CSV 檔案路徑
+# 最近的按鈕事件
+button_events = deque(maxlen=50)
+
+# 各裝置最近一次的診斷
+device_diagnostics = {}
+
+# 數據目錄（依日期分區的 CSV 與彙總檔案）
+DATA_DIR = 'data'
+# 舊版單一 CSV 檔案，首次啟動時會匯入到分區中
 CSV_FILE = 'sensor_data.csv'
 
-def load_from_csv():
-    """從 CSV 檔案載入歷史數據"""
-    global sensor_data
-    if os.path.exists(CSV_FILE):
-        try:
-            with open(CSV_FILE, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                loaded_data = []
-                for row in reader:
-                    data_dict = {
-                        'timestamp': row['時間戳記'],
-                        'light_status': row['電燈狀態'],
-                        'temperature': float(row['溫度']),
-                        'humidity': float(row['濕度'])
-                    }
-                    loaded_data.append(data_dict)
-                
-                # 只保留最近 100 筆
-                sensor_data = loaded_data[-100:]
-                
-                # 更新最新數據
-                if sensor_data:
-                    global latest_data
-                    latest_data = sensor_data[-1].copy()
-                
-                print(f"✅ 已載入 {len(sensor_data)} 筆歷史數據")
-        except Exception as e:
-            print(f"⚠️  載入 CSV 檔案時發生錯誤: {e}")
-
-def save_to_csv(data):
-    """儲存數據到 CSV 檔案"""
-    file_exists = os.path.exists(CSV_FILE)
-    
-    with open(CSV_FILE, 'a', newline='', encoding='utf-8') as f:
-        fieldnames = ['時間戳記', '電燈狀態', '溫度', '濕度']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        
-        if not file_exists:
-            writer.writeheader()
-        
-        writer.writerow(data)
-
-def on_connect(client, userdata, flags, reason_code, properties):
-    """MQTT 連線回調"""
-    global mqtt_connected
-    if reason_code.is_failure:
-        print(f"❌ MQTT 連線失敗: {reason_code}")
-        mqtt_connected = False
-    else:
-        print(f"✅ MQTT 連線成功")
-        mqtt_connected = True
-        client.subscribe(MQTT_TOPIC, qos=1)
-        print(f"✅ 已訂閱主題: {MQTT_TOPIC}")
+# 數據保留策略：層級 -> 保留天數（None 表示永久保留）
+RETENTION_POLICY = {
+    'raw': 7,     # 原始數據保留 7 天
+    '1m': 90,     # 1 分鐘彙總保留 90 天
+    '1h': None,   # 1 小時彙總永久保留
+}
 
-def on_message(client, userdata, message):
-    """MQTT 訊息回調"""
-    global latest_data, sensor_data
-    
+# 唯讀儀表板：不連線 MQTT、不寫入數據、不執行數據保留工作，
+# 只讀取由 gateway.py（可在另一台主機上）寫入的數據目錄，並追蹤新附加的數據推送到前端
+DASHBOARD_ONLY = False
+# 唯讀模式檢查數據分區新數據的間隔（秒）
+FOLLOW_INTERVAL = 1.0
+
+# 就緒前必須完成的啟動項目
+readiness = Readiness(['history', 'ingest'])
+
+# 背景服務（由 start_services() 建立）
+store = None
+ingest = None
+mqtt_session = None
+commands = None
+retention_worker = None
+_services_lock = threading.Lock()
+
+def load_from_csv():
+    """從數據分區載入最近的歷史數據"""
+    global sensor_data, latest_data
     try:
-        payload = message.payload.decode('utf-8')
-        print(f"📨 收到訊息: {payload}")
-        
-        # 解析 JSON
-        data_dict = json.loads(payload)
-        
-        # 提取數據
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        temperature = data_dict.get('temperature', data_dict.get('temp', 0))
-        humidity = data_dict.get('humidity', data_dict.get('humi', 0))
-        light_status = data_dict.get('light_status', data_dict.get('light', '未知'))
-        
+        # 首次啟動：將舊版 sensor_data.csv 拆分為分區（唯讀模式不寫入數據目錄）
+        if not DASHBOARD_ONLY and not store.list_partitions('raw') and os.path.exists(CSV_FILE):
+            count = store.import_csv(CSV_FILE)
+            print(f"📦 已將 {CSV_FILE} 的 {count} 筆數據匯入 {DATA_DIR}/")
+
+        # 只讀取最新分區的尾端，不需要讀完整個歷史
+        sensor_data = store.recent(100)
+
         # 更新最新數據
-        latest_data = {
-            'light_status': light_status,
-            'temperature': temperature,
-            'humidity': humidity,
-            'timestamp': timestamp
-        }
-        
-        # 儲存到列表
-        sensor_data.append(latest_data.copy())
-        
-        # 只保留最近 100 筆
-        if len(sensor_data) > 100:
-            sensor_data.pop(0)
-        
-        # 儲存到 CSV
-        csv_data = {
-            '時間戳記': timestamp,
-            '電燈狀態': light_status,
-            '溫度': temperature,
-            '濕度': humidity
-        }
-        save_to_csv(csv_data)
-        
-        # 透過 WebSocket 推送到前端
-        socketio.emit('new_data', latest_data)
-        
+        if sensor_data:
+            latest_data = sensor_data[-1].copy()
+
+        print(f"✅ 已載入 {len(sensor_data)} 筆歷史數據")
+        return True
     except Exception as e:
-        print(f"處理訊息錯誤: {e}")
+        print(f"⚠️  載入歷史數據時發生錯誤: {e}")
+        readiness.fail('history', e)
+        return False
+
+def on_message(topic, payload):
+    """MQTT 訊息回調：只放入接收佇列，解析與儲存在背景執行緒進行"""
+    if topic == MQTT_BUTTON_TOPIC:
+        on_button_event(payload)
+        return
+    if timesync.is_request(topic):
+        # 校時請求需要立即回應，延遲越小越準確
+        timesync.handle_request(topic, payload, mqtt_session.publish, label=DEVICES.label)
+        return
+    if topic.startswith('devices/') and topic.endswith('/diag'):
+        on_diagnostics(topic, payload)
+        return
+    if topic.startswith('devices/'):
+        # 指令確認需要立即處理，才能量測準確的來回時間
+        commands.handle_ack(topic, payload)
+        return
+    ingest.submit(topic, payload)
+
+def on_button_event(payload):
+    """按鈕事件數量少且不需儲存，直接推送到前端"""
+    metrics.MESSAGES_RECEIVED.inc(MQTT_BUTTON_TOPIC)
+    try:
+        event = decode_button_event(payload)
+    except (ValueError, UnicodeDecodeError) as e:
+        metrics.MESSAGES_REJECTED.inc(metrics.REJECT_DECODE)
+        log.warning('按鈕事件格式錯誤: %s', e)
+        return
+    event['timestamp'] = now_ms()
+    button_events.append(event)
+    metrics.BUTTON_EVENTS.inc(event['device'] or MQTT_BUTTON_TOPIC, event['event'])
+    with metrics.EMIT_SECONDS.time('button_event'):
+        socketio.emit('button_event', event)
 
-# 啟動 MQTT 客戶端
-mqtt_client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
-mqtt_client.on_connect = on_connect
-mqtt_client.on_message = on_message
+def on_diagnostics(topic, payload):
+    """
+    裝置診斷每幾分鐘一則，直接更新監控指標
 
-def start_mqtt():
-    """在背景執行緒中啟動 MQTT"""
+    只記錄裝置總覽中已有的裝置：裝置名稱由客戶端決定，不能讓它建立新的指標標籤。
+    """
+    metrics.MESSAGES_RECEIVED.inc(MQTT_DIAG_SUBSCRIPTION)
     try:
-        mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
-        mqtt_client.loop_forever()
+        diag = decode_diagnostics(payload)
+    except (ValueError, TypeError, OverflowError, UnicodeDecodeError) as e:
+        metrics.MESSAGES_REJECTED.inc(metrics.REJECT_DECODE)
+        log.warning('診斷訊息格式錯誤: %s', e)
+        return
+    device = diag['device'] or topic.split('/')[1]
+    if DEVICES.label(device) == metrics.OTHER_LABEL:
+        log.debug('略過未知裝置的診斷訊息 (device=%s)', device)
+        return
+    diag['timestamp'] = now_ms()
+    device_diagnostics[device] = diag
+    if diag['mem_free'] is not None:
+        metrics.DEVICE_MEM_FREE_BYTES.set(diag['mem_free'], device, 'current')
+    if diag['mem_min_free'] is not None:
+        metrics.DEVICE_MEM_FREE_BYTES.set(diag['mem_min_free'], device, 'min')
+    if diag['gc_collections'] is not None:
+        metrics.DEVICE_GC_COLLECTIONS.set(diag['gc_collections'], device, 'explicit')
+    if diag['gc_auto'] is not None:
+        metrics.DEVICE_GC_COLLECTIONS.set(diag['gc_auto'], device, 'auto')
+    if diag['gc_max_us'] is not None:
+        metrics.DEVICE_GC_MAX_SECONDS.set(diag['gc_max_us'] / 1e6, device)
+    if diag['loop_max_us'] is not None:
+        metrics.DEVICE_LOOP_MAX_SECONDS.set(diag['loop_max_us'] / 1e6, device)
+
+def on_sample(sample):
+    """接收流程每儲存一筆數據後呼叫"""
+    global latest_data, sensor_data
+
+    # 更新最新數據
+    latest_data = sample
+    DEVICES.update(sample)
+    chart.CHARTS.note(sample['timestamp'])
+
+    # 儲存到列表
+    sensor_data.append(latest_data.copy())
+
+    # 只保留最近 100 筆
+    if len(sensor_data) > 100:
+        sensor_data.pop(0)
+
+    # 透過 WebSocket 推送到前端；emitted_at（epoch 毫秒）由瀏覽器以 data_ack 回傳，用於量測推送延遲
+    emitted_at = now_ms()
+    with metrics.EMIT_SECONDS.time('new_data'):
+        socketio.emit('new_data', {**latest_data, 'emitted_at': emitted_at}, to=ROOM_JSON)
+        if BINARY_ENCODING:
+            socketio.emit('new_data_packed', packed.pack_sample(latest_data, emitted_at), to=ROOM_PACKED)
+
+def on_command_ack(result):
+    """裝置確認指令後推送到前端"""
+    with metrics.EMIT_SECONDS.time('command_ack'):
+        socketio.emit('command_ack', result)
+
+def start_services():
+    """
+    建立並啟動背景服務（重複呼叫不會重複啟動）
+
+    MQTT 立即連線（校時與指令確認不需要歷史數據），感測器訊息先放入接收佇列；
+    歷史數據在背景執行緒載入完成後才開始處理佇列，新數據一定接在歷史數據之後。
+    """
+    global store, ingest, mqtt_session, commands
+    with _services_lock:
+        if store is not None:
+            return
+        if DASHBOARD_ONLY:
+            store = SensorStore(DATA_DIR)
+            threading.Thread(target=_warm_up, daemon=True, name='warm-up').start()
+            return
+        # paho 只在啟動服務時才需要，匯入本模組（測試、工具）時不載入
+        from mqtt_session import MqttSession
+
+        store = SensorStore(DATA_DIR)
+        ingest = IngestPipeline(store, on_sample=on_sample)
+
+        # MQTT 客戶端（斷線後自動以指數退避重新連線）
+        mqtt_session = MqttSession(MQTT_BROKER, MQTT_PORT, MQTT_CLIENT_ID,
+                                   [MQTT_TOPIC, MQTT_BUTTON_TOPIC, ACK_SUBSCRIPTION,
+                                    timesync.REQUEST_SUBSCRIPTION, MQTT_DIAG_SUBSCRIPTION],
+                                   on_message, protocol=MQTT_PROTOCOL)
+
+        # 下行控制指令（devices/<id>/command）
+        commands = CommandChannel(mqtt_session.publish, on_ack=on_command_ack)
+
+        # 在背景執行緒中啟動 MQTT
+        mqtt_session.start()
+
+        threading.Thread(target=_warm_up, daemon=True, name='warm-up').start()
+
+def _warm_up():
+    """
+    背景載入歷史數據，之後啟動訊息處理與數據保留工作
+
+    歷史數據載入失敗時仍繼續接收新數據（/readyz 回報原因）；
+    接收流程無法啟動時通知 systemd 後以非 0 結束，由 Restart=on-failure 重新啟動。
+    """
+    global retention_worker
+    print("📂 載入歷史數據...")
+    if load_from_csv():
+        readiness.mark('history')
+
+    try:
+        if DASHBOARD_ONLY:
+            threading.Thread(target=_follow_store, daemon=True, name='follow').start()
+            readiness.mark('ingest')
+            return
+
+        # 啟動訊息處理執行緒（處理載入期間放入佇列的訊息）
+        ingest.start()
+        readiness.mark('ingest')
+
+        # 在背景執行緒中定期彙總與清除舊數據
+        retention_worker = RetentionWorker(store, RETENTION_POLICY)
+        retention_worker.start()
     except Exception as e:
-        print(f"MQTT 錯誤: {e}")
+        log.exception('無法啟動接收流程: %s', e)
+        readiness.fail('ingest', e)
+        os._exit(1)
+
+def _wait_for_listener(port, interval=0.05):
+    """
+    等待 HTTP 服務開始接受連線後標記 'http' 項目
+
+    socketio.run() 綁定連接埠後直接進入服務迴圈，沒有啟動完成的回調，
+    因此由背景執行緒請求本機的 /healthz，確認回應的是本程序（連接埠可能被其他程式占用）。
+    """
+    from http.client import HTTPConnection
+
+    while True:
+        connection = HTTPConnection('127.0.0.1', port, timeout=1)
+        try:
+            connection.request('GET', '/healthz')
+            response = connection.getresponse()
+            if response.status == 200 and json.loads(response.read()).get('pid') == os.getpid():
+                break
+        except (OSError, ValueError):
+            pass
+        finally:
+            connection.close()
+        time.sleep(interval)
+    readiness.mark('http')
+
+def _follow_store():
+    """
+    唯讀模式：定期讀取目前原始數據分區新附加的數據，逐筆交給 on_sample() 推送到前端
 
-# 啟動前先載入歷史數據
-print("📂 載入歷史數據...")
-load_from_csv()
+    從載入歷史數據後的檔案尾端開始；換日時先讀完前一個分區剩下的數據再切換到新分區。
+    """
+    partitions = store.list_partitions('raw')
+    partition = partitions[-1] if partitions else None
+    offset = 0
+    if partition is not None:
+        path = store.partition_path('raw', partition)
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+    while True:
+        time.sleep(FOLLOW_INTERVAL)
+        try:
+            partitions = store.list_partitions('raw')
+            if not partitions:
+                continue
+            if partition is None:
+                partition = partitions[-1]
+            samples, offset = store.read_appended(partition, offset)
+            if partitions[-1] > partition:
+                partition = partitions[-1]
+                more, offset = store.read_appended(partition, 0)
+                samples.extend(more)
+        except (OSError, ValueError, KeyError) as e:
+            log.warning('讀取新數據失敗: %s', e)
+            continue
+        for sample in samples:
+            on_sample(sample)
+
+def create_app(start=True):
+    """
+    建立 Flask 應用程式
+
+    Args:
+        start: 是否啟動背景服務（MQTT、接收流程、歷史數據載入；DASHBOARD_ONLY 時只載入與追蹤數據）；
+               測試或工具只需要路由時傳入 False
+
+    Returns:
+        Flask: 應用程式
+    """
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    socketio.init_app(app, cors_allowed_origins="*")
+    if start:
+        start_services()
+    return app
 
-# 在背景執行緒中啟動 MQTT
-mqtt_thread = threading.Thread(target=start_mqtt, daemon=True)
-mqtt_thread.start()
+def _mqtt_connected():
+    return mqtt_session is not None and mqtt_session.connected
 
-@app.route('/')
+@bp.route('/healthz')
+def healthz():
+    """存活檢查：HTTP 可以回應即為存活（pid 讓啟動檢查確認回應的是本程序）"""
+    return jsonify({'status': 'ok', 'uptime': round(process_uptime(), 3), 'pid': os.getpid()})
+
+@bp.route('/readyz')
+def readyz():
+    """就緒檢查：歷史數據已載入、接收流程已啟動時回傳 200，否則回傳 503"""
+    status = readiness.status()
+    status['mqtt_connected'] = _mqtt_connected()
+    status['queue_depth'] = ingest.qsize() if ingest is not None else 0
+    return jsonify(status), 200 if status['ready'] else 503
+
+@bp.route('/')
 def index():
     """主頁"""
     return render_template('index.html')
 
-@app.route('/api/latest')
+@socketio.on('connect')
+def handle_connect():
+    """瀏覽器連線（預設使用 JSON，可再以 set_encoding 選用二進位編碼）"""
+    metrics.SOCKETIO_CLIENTS.inc()
+    join_room(ROOM_JSON)
+
+@socketio.on('set_encoding')
+def handle_set_encoding(encoding):
+    """
+    瀏覽器選用即時數據的編碼：'packed'（new_data_packed 事件）或 'json'（new_data 事件）
+
+    回傳值作為 Socket.IO 的 ack：{'encoding': 實際使用的編碼}，伺服器不支援時維持 JSON
+    """
+    if encoding == ROOM_PACKED and BINARY_ENCODING:
+        leave_room(ROOM_JSON)
+        join_room(ROOM_PACKED)
+        return {'encoding': ROOM_PACKED}
+    leave_room(ROOM_PACKED)
+    join_room(ROOM_JSON)
+    return {'encoding': ROOM_JSON}
+
+@socketio.on('disconnect')
+def handle_disconnect(reason=None):
+    """瀏覽器斷線"""
+    metrics.SOCKETIO_CLIENTS.dec()
+
+@socketio.on('data_ack')
+def handle_data_ack(data):
+    """
+    瀏覽器收到 new_data 後回傳，記錄推送到瀏覽器的延遲
+
+    只記錄裝置總覽中已有的裝置：內容由瀏覽器送出，不能讓它建立新的延遲統計與指標標籤。
+    """
+    if not isinstance(data, dict):
+        return
+    device = data.get('device')
+    emitted_at = data.get('emitted_at')
+    if not isinstance(device, str) or device not in DEVICES:
+        return
+    if isinstance(emitted_at, bool) or not isinstance(emitted_at, (int, float)) or not math.isfinite(emitted_at):
+        return
+    TRACKER.record(device, 'emit_to_ack', (now_ms() - emitted_at) / 1000)
+
+@socketio.on('command')
+def handle_command(data):
+    """
+    瀏覽器送出控制指令：{'device': 'pico_led_control', 'action': 'led', 'value': 'on'}
+
+    回傳值作為 Socket.IO 的 ack；裝置確認後再推送 'command_ack' 事件
+    """
+    if not isinstance(data, dict) or not data.get('device'):
+        return {'error': '缺少 device'}
+    try:
+        device = validate_device(str(data['device']))
+        command = validate_command(data)
+    except ValueError as e:
+        return {'error': str(e)}
+    if not _mqtt_connected():
+        return {'error': 'MQTT 未連線'}
+    try:
+        return commands.send(device, command)
+    except ConnectionError as e:
+        return {'error': str(e)}
+
+@bp.route('/metrics')
+def get_metrics():
+    """Prometheus 監控指標"""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+@bp.route('/api/latest')
 def get_latest():
     """取得最新數據 API"""
     return jsonify({
         **latest_data,
-        'mqtt_connected': mqtt_connected,
+        'mqtt_connected': _mqtt_connected(),
         'total_records': len(sensor_data)
     })
 
-@app.route('/api/history')
+@bp.route('/api/fleet')
+def get_fleet():
+    """
+    裝置總覽 API（devices.py 的記憶體索引，不讀取歷史數據）
+
+    查詢參數：
+        sort=temperature|humidity|silence|rate_per_min|temperature_max|...（預設 device）
+        order=asc|desc、limit=N（預設 100）、state=online|offline、silent=秒數、q=名稱包含的字串
+
+    例如最熱的 20 台：/api/fleet?sort=temperature&limit=20
+    沉默超過 5 分鐘：/api/fleet?silent=300&sort=silence
+    """
+    order = request.args.get('order')
+    if order not in (None, 'asc', 'desc'):
+        return jsonify({'error': f'不支援的排序方向: {order}'}), 400
+    try:
+        result = DEVICES.query(
+            sort=request.args.get('sort', 'device'),
+            descending=None if order is None else order == 'desc',
+            limit=request.args.get('limit', default=100, type=int),
+            state=request.args.get('state'),
+            silent_for=request.args.get('silent', type=float),
+            match=request.args.get('q'),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result)
+
+@bp.route('/api/devices/<device_id>/command', methods=['POST'])
+def send_command(device_id):
+    """
+    發送控制指令 API
+
+    POST JSON: {"action": "led", "value": "on" | "off" | "toggle"}
+               {"action": "pwm", "value": 0 ~ 65535}
+    """
+    try:
+        validate_device(device_id)
+        command = validate_command(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not _mqtt_connected():
+        return jsonify({'error': 'MQTT 未連線'}), 503
+    try:
+        return jsonify(commands.send(device_id, command)), 202
+    except ConnectionError as e:
+        return jsonify({'error': str(e)}), 503
+
+@bp.route('/api/commands/latency')
+def get_command_latency():
+    """取得控制指令來回時間的百分位數"""
+    if commands is None:
+        return jsonify({'error': '唯讀模式沒有控制指令'}), 404
+    return jsonify(commands.stats())
+
+@bp.route('/api/latency')
+def get_latency():
+    """取得各裝置端到端延遲（各階段）的百分位數"""
+    return jsonify(TRACKER.summary())
+
+@bp.route('/api/diagnostics')
+def get_diagnostics():
+    """取得各裝置最近一次的診斷（記憶體、回收次數、最長迴圈時間）"""
+    return jsonify(device_diagnostics)
+
+@bp.route('/api/buttons')
+def get_buttons():
+    """取得最近的按鈕事件 API"""
+    return jsonify(list(button_events))
+
+def _wants_packed():
+    """依 Accept 標頭（或 format=packed）判斷是否回傳二進位編碼"""
+    if not BINARY_ENCODING:
+        return False
+    if request.args.get('format') == 'packed':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', packed.MIME_TYPE]) == packed.MIME_TYPE
+
+def _rows_response(rows, columns):
+    """以瀏覽器要求的編碼回傳數據列表（二進位或 JSON）"""
+    if _wants_packed():
+        try:
+            response = Response(packed.pack_columns(rows, columns), content_type=packed.MIME_TYPE)
+        except ValueError as e:
+            log.warning('無法使用二進位編碼，改用 JSON: %s', e)
+            response = jsonify(rows)
+    else:
+        response = jsonify(rows)
+    response.vary.add('Accept')
+    return response
+
+@bp.route('/api/history')
 def get_history():
-    """取得歷史數據 API"""
-    return jsonify(sensor_data)
+    """
+    取得歷史數據 API
+
+    時間戳記為 epoch 毫秒（由前端格式化顯示）。
+    不帶參數時回傳最近 100 筆原始數據；
+    帶 resolution=1m|1h 與 hours=N 時回傳該時間範圍的彙總數據；
+    裝置沒有變化而未發布的時間桶以前一個值補齊（fill=0 可關閉）。
+    Accept: application/vnd.sensor.columns（或 format=packed）時回傳欄位式二進位編碼（packed.py）。
+    """
+    resolution = request.args.get('resolution')
+    if resolution not in ('1m', '1h'):
+        return _rows_response(sensor_data, packed.RAW_COLUMNS)
+
+    hours = request.args.get('hours', default=24, type=int)
+    end = now_ms()
+    rollups = store.read_rollups(resolution, end - hours * HOUR_MS, end)
+    if request.args.get('fill', default=1, type=int):
+        rollups = fill_forward(rollups, resolution)
+    return _rows_response(rollups, packed.ROLLUP_COLUMNS)
+
+# 伺服器端圖表的最長時間範圍（小時）
+CHART_MAX_HOURS = {'1m': 7 * 24, '1h': 365 * 24}
+
+@bp.route('/api/chart.<any(svg, png):fmt>')
+def get_chart(fmt):
+    """
+    伺服器端繪製的歷史圖表（chart.py），給不執行 JavaScript 的低功耗看板使用
+
+    查詢參數：
+        resolution=1m|1h（預設 1m）、hours=N（預設 24）、width / height（像素，預設 800×400）
+        fill=0 不補齊空白時間桶、refresh=N 加上 Refresh 標頭讓瀏覽器每 N 秒重新載入
+
+    只包含已結束的時間桶；同樣的參數在下一個時間桶開始、或範圍內寫入延遲送達的數據之前
+    回傳快取的圖片，並支援 If-None-Match（304）。
+    """
+    resolution = request.args.get('resolution', '1m')
+    if resolution not in TIER_MS:
+        return jsonify({'error': f'不支援的解析度: {resolution}'}), 400
+    hours = request.args.get('hours', default=24, type=int)
+    width = request.args.get('width', default=chart.WIDTH, type=int)
+    height = request.args.get('height', default=chart.HEIGHT, type=int)
+    if not 1 <= hours <= CHART_MAX_HOURS[resolution]:
+        return jsonify({'error': f'hours 必須介於 1 與 {CHART_MAX_HOURS[resolution]} 之間'}), 400
+    if not (chart.MIN_SIZE <= width <= chart.MAX_SIZE and chart.MIN_SIZE <= height <= chart.MAX_SIZE):
+        return jsonify({'error': f'width / height 必須介於 {chart.MIN_SIZE} 與 {chart.MAX_SIZE} 之間'}), 400
+    fill = bool(request.args.get('fill', default=1, type=int))
+
+    end = bucket_start(now_ms(), TIER_MS[resolution])
+    start = end - hours * HOUR_MS
+    render, mime_type = chart.RENDERERS[fmt]
+
+    def build():
+        rollups = store.read_rollups(resolution, start, end)
+        if fill:
+            rollups = fill_forward(rollups, resolution)
+        return render(rollups, resolution, start, end, width, height)
+
+    body, etag, cached = chart.CHARTS.get((fmt, resolution, hours, width, height, fill), start, end, build)
+    metrics.CHART_REQUESTS.inc(fmt, 'hit' if cached else 'miss')
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, content_type=mime_type)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    refresh = request.args.get('refresh', type=int)
+    if refresh and refresh > 0:
+        response.headers['Refresh'] = str(refresh)
+    return response
+
+@bp.route('/api/export.csv')
+def export_csv():
+    """
+    匯出原始數據 CSV（hours=N，預設 24 小時）
+
+    格式與舊版 sensor_data.csv 相同（時間戳記為本地時間字串），可用試算表開啟。
+    """
+    hours = request.args.get('hours', default=24, type=int)
+    end = now_ms()
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=RAW_FIELDS)
+    writer.writeheader()
+    for sample in store.read_range(end - hours * HOUR_MS, end):
+        writer.writerow(format_raw_row(sample))
+    return Response(output.getvalue(), content_type='text/csv; charset=utf-8',
+                    headers={'Content-Disposition': 'attachment; filename=sensor_data.csv'})
 
 if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Flask MQTT 監控應用程式')
+    parser.add_argument('--dashboard-only', action='store_true',
+                        help='唯讀儀表板：不連線 MQTT，只讀取 gateway.py 寫入的數據目錄')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+    DASHBOARD_ONLY = args.dashboard_only
+    DATA_DIR = args.data_dir
+
     print("=" * 60)
     print(" Flask MQTT 監控應用程式")
     print("=" * 60)
     print(f" 啟動中...")
-    print(f" MQTT Broker: {MQTT_BROKER}:{MQTT_PORT}")
-    print(f" MQTT Topic: {MQTT_TOPIC}")
-    print(f" CSV 檔案: {CSV_FILE}")
+    if DASHBOARD_ONLY:
+        print(f" 唯讀模式（不連線 MQTT）")
+    else:
+        print(f" MQTT Broker: {MQTT_BROKER}:{MQTT_PORT}")
+        print(f" MQTT Topic: {MQTT_TOPIC}")
+    print(f" 數據目錄: {DATA_DIR}")
     print("=" * 60)
-    
-    socketio.run(app, host='0.0.0.0', port=8080, debug=False, allow_unsafe_werkzeug=True)
+
+    # HTTP 服務開始接受連線後才通知 systemd 啟動完成
+    readiness.require('http')
+    app = create_app()
+    sd_notify('STATUS=HTTP 服務啟動，背景載入歷史數據')
+    threading.Thread(target=_wait_for_listener, args=(args.port,), daemon=True, name='listen-check').start()
+    try:
+        socketio.run(app, host='0.0.0.0', port=args.port, debug=False, allow_unsafe_werkzeug=True)
+    except (OSError, SystemExit) as e:
+        # 例如連接埠已被使用（werkzeug 會自行呼叫 sys.exit(1)）：
+        # 明確以非 0 結束（Restart=on-failure），不讓 systemd 等到啟動逾時
+        print(f"❌ 無法啟動 HTTP 服務（連接埠 {args.port}）: {e}")
+        sd_notify(f'STATUS=❌ 無法啟動 HTTP 服務（連接埠 {args.port}）')
+        raise SystemExit(1)
 
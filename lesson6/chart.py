@@ -0,0 +1,501 @@
+"""
+伺服器端繪製的歷史圖表（SVG / PNG）
+給電子紙、舊平板等低功耗看板使用：一個請求取得已繪製好的圖片，不需要 JavaScript 與 CDN
+
+    /api/chart.svg?resolution=1m&hours=24
+    /api/chart.png?resolution=1h&hours=168&width=600&height=300
+
+只使用標準函式庫：SVG 以字串組成；PNG 以調色盤點陣圖（每個像素 1 byte）繪製後用 zlib 壓縮，
+數字與時間以內建的 5×7 點陣字型繪製（PNG 不含中文）。
+
+樣式與儀表板的 Chart.js 圖表相同：溫度（紅，左軸）與濕度（藍，右軸）的平均值以階梯線繪製，
+超過一個時間桶的缺口（裝置離線）保持空白。
+
+圖片只包含已結束的時間桶，由 ChartCache 依 (格式, 解析度, 範圍, 尺寸) 快取：
+時間範圍移到下一個時間桶、或有數據寫入範圍內（延遲送達的數據）時才重新繪製，
+其他請求直接回傳快取的圖片，多個看板同時顯示時伺服器只繪製一次。
+"""
+
+import html
+import math
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+from storage import TIER_MS
+from timestamps import DAY_MS, HOUR_MS, MINUTE_MS, bucket_start, format_timestamp
+
+# 預設與允許的圖片尺寸（像素）
+WIDTH = 800
+HEIGHT = 400
+MIN_SIZE = 200
+MAX_SIZE = 2000
+
+# 快取的圖片數上限（超過時移除最久沒有使用的）
+CACHE_SIZE = 32
+
+# 顏色（與儀表板相同）
+BACKGROUND = '#ffffff'
+GRID_COLOR = '#e5e7eb'
+TEXT_COLOR = '#374151'
+TEMPERATURE_COLOR = '#ef4444'
+HUMIDITY_COLOR = '#3b82f6'
+
+# 繪圖區與圖片邊緣的距離（像素）
+MARGIN_LEFT = 48
+MARGIN_RIGHT = 48
+MARGIN_TOP = 32
+MARGIN_BOTTOM = 24
+
+# 時間軸刻度的候選間隔：選用刻度數不超過 TIME_TICKS 的最小間隔
+TIME_STEPS = (10 * MINUTE_MS, 30 * MINUTE_MS, HOUR_MS, 3 * HOUR_MS, 6 * HOUR_MS, 12 * HOUR_MS,
+              DAY_MS, 2 * DAY_MS, 7 * DAY_MS, 30 * DAY_MS)
+TIME_TICKS = 6
+VALUE_TICKS = 5
+
+SVG_MIME_TYPE = 'image/svg+xml'
+PNG_MIME_TYPE = 'image/png'
+
+
+# ---------- 版面配置 ----------
+
+def _nice_step(span, count):
+    """刻度間隔：1 / 2 / 5 × 10^n 中，刻度數不超過 count 的最小值"""
+    raw = span / count
+    magnitude = 10 ** math.floor(math.log10(raw))
+    for multiple in (1, 2, 5, 10):
+        if raw <= multiple * magnitude:
+            return multiple * magnitude
+    return 10 * magnitude
+
+
+def _value_axis(values, count=VALUE_TICKS):
+    """
+    數值軸的範圍與刻度
+
+    Returns:
+        tuple: (最小值, 最大值, 刻度列表, 刻度間隔)
+    """
+    if not values:
+        low, high = 0.0, 1.0
+    else:
+        low, high = min(values), max(values)
+    if high - low < 1e-9:
+        low, high = low - 1, high + 1
+    step = _nice_step(high - low, count)
+    low = math.floor(low / step) * step
+    high = math.ceil(high / step) * step
+    ticks = [low + i * step for i in range(round((high - low) / step) + 1)]
+    return low, high, ticks, step
+
+
+def _time_ticks(start, end, count=TIME_TICKS):
+    """時間軸刻度（以本地時間對齊），回傳 (刻度列表, 間隔)"""
+    for interval in TIME_STEPS:
+        if (end - start) / interval <= count:
+            break
+    tick = bucket_start(start, interval)
+    if tick < start:
+        tick += interval
+    ticks = []
+    while tick < end:
+        ticks.append(tick)
+        tick += interval
+    return ticks, interval
+
+
+def _format_value(value, step):
+    return f'{value:.1f}' if step < 1 else f'{value:.0f}'
+
+
+def _format_time(ms, interval):
+    return format_timestamp(ms, '%m/%d' if interval >= DAY_MS else '%H:%M')
+
+
+def _decimate(points):
+    """
+    同一個像素欄有多個點時只保留最小與最大值（依原本的順序），
+    數據點遠多於圖片寬度時輸出大小仍與寬度成正比
+    """
+    result = []
+    group = []
+    for point in points:
+        if group and int(point[0]) != int(group[0][0]):
+            result.extend(_column_extremes(group))
+            group = []
+        group.append(point)
+    result.extend(_column_extremes(group))
+    return result
+
+
+def _column_extremes(group):
+    if len(group) <= 4:
+        return group
+    low = min(group, key=lambda p: p[1])
+    high = max(group, key=lambda p: p[1])
+    middle = [p for p in group[1:-1] if p is low or p is high]
+    return [group[0]] + middle + [group[-1]]
+
+
+def layout(rollups, tier, start, end, width=WIDTH, height=HEIGHT):
+    """
+    計算圖表的座標（SVG 與 PNG 共用）
+
+    Args:
+        rollups: 依時間排序的彙總字典列表（temperature_avg / humidity_avg）
+        tier: '1m' 或 '1h'
+        start: 圖表起始時間（epoch 毫秒）
+        end: 圖表結束時間（epoch 毫秒，不含）
+        width: 圖片寬度（像素）
+        height: 圖片高度（像素）
+
+    Returns:
+        dict: 繪圖區、兩個數值軸、時間軸刻度與各數列的線段（像素座標）
+    """
+    step = TIER_MS[tier]
+    left, right = MARGIN_LEFT, width - MARGIN_RIGHT
+    top, bottom = MARGIN_TOP, height - MARGIN_BOTTOM
+
+    def x_of(ms):
+        return left + (ms - start) / (end - start) * (right - left)
+
+    result = {'width': width, 'height': height, 'plot': (left, top, right, bottom),
+              'start': start, 'end': end, 'empty': not rollups, 'series': {}}
+    time_ticks, interval = _time_ticks(start, end)
+    result['time_ticks'] = [(x_of(t), _format_time(t, interval)) for t in time_ticks]
+
+    for key, field in (('temperature', 'temperature_avg'), ('humidity', 'humidity_avg')):
+        low, high, ticks, tick_step = _value_axis([r[field] for r in rollups])
+
+        def y_of(value, low=low, high=high):
+            return bottom - (value - low) / (high - low) * (bottom - top)
+
+        # 階梯線：每個時間桶畫一段水平線，相鄰時間桶以垂直線相連，缺口處斷開
+        segments = []
+        points = []
+        previous_end = None
+        for rollup in rollups:
+            if points and rollup['timestamp'] != previous_end:
+                segments.append(_decimate(points))
+                points = []
+            y = y_of(rollup[field])
+            points.append((x_of(rollup['timestamp']), y))
+            points.append((x_of(min(rollup['timestamp'] + step, end)), y))
+            previous_end = rollup['timestamp'] + step
+        if points:
+            segments.append(_decimate(points))
+
+        result['series'][key] = segments
+        result[key + '_ticks'] = [(y_of(t), _format_value(t, tick_step)) for t in ticks]
+    return result
+
+
+# ---------- SVG ----------
+
+def _path(points):
+    return 'M' + ' L'.join(f'{x:.1f},{y:.1f}' for x, y in points)
+
+
+def render_svg(rollups, tier, start, end, width=WIDTH, height=HEIGHT):
+    """
+    繪製 SVG 圖表
+
+    Returns:
+        bytes: UTF-8 編碼的 SVG
+    """
+    chart = layout(rollups, tier, start, end, width, height)
+    left, top, right, bottom = chart['plot']
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="sans-serif" font-size="12">',
+        f'<rect width="{width}" height="{height}" fill="{BACKGROUND}"/>',
+    ]
+
+    grid = ''.join(f'M{left},{y:.1f} H{right} ' for y, _ in chart['temperature_ticks'])
+    grid += ''.join(f'M{x:.1f},{top} V{bottom} ' for x, _ in chart['time_ticks'])
+    parts.append(f'<path d="{grid.strip()}" stroke="{GRID_COLOR}" fill="none"/>')
+    parts.append(f'<rect x="{left}" y="{top}" width="{right - left}" height="{bottom - top}" '
+                 f'stroke="{TEXT_COLOR}" fill="none"/>')
+
+    for y, label in chart['temperature_ticks']:
+        parts.append(f'<text x="{left - 4}" y="{y + 4:.1f}" text-anchor="end" '
+                     f'fill="{TEMPERATURE_COLOR}">{label}</text>')
+    for y, label in chart['humidity_ticks']:
+        parts.append(f'<text x="{right + 4}" y="{y + 4:.1f}" fill="{HUMIDITY_COLOR}">{label}</text>')
+    for x, label in chart['time_ticks']:
+        parts.append(f'<text x="{x:.1f}" y="{bottom + 16}" text-anchor="middle" '
+                     f'fill="{TEXT_COLOR}">{label}</text>')
+
+    for key, color in (('temperature', TEMPERATURE_COLOR), ('humidity', HUMIDITY_COLOR)):
+        paths = ' '.join(_path(points) for points in chart['series'][key])
+        if paths:
+            parts.append(f'<path d="{paths}" stroke="{color}" stroke-width="2" '
+                         f'stroke-linejoin="round" fill="none"/>')
+
+    # 圖例與更新時間
+    parts.append(f'<rect x="{left}" y="10" width="12" height="12" fill="{TEMPERATURE_COLOR}"/>'
+                 f'<text x="{left + 16}" y="20" fill="{TEXT_COLOR}">溫度 (°C)</text>'
+                 f'<rect x="{left + 90}" y="10" width="12" height="12" fill="{HUMIDITY_COLOR}"/>'
+                 f'<text x="{left + 106}" y="20" fill="{TEXT_COLOR}">濕度 (%)</text>')
+    updated = html.escape(format_timestamp(end, '%Y-%m-%d %H:%M'))
+    parts.append(f'<text x="{right}" y="20" text-anchor="end" fill="{TEXT_COLOR}">{updated}</text>')
+    if chart['empty']:
+        parts.append(f'<text x="{(left + right) / 2:.1f}" y="{(top + bottom) / 2:.1f}" '
+                     f'text-anchor="middle" fill="{TEXT_COLOR}">沒有數據</text>')
+    parts.append('</svg>')
+    return '\n'.join(parts).encode('utf-8')
+
+
+# ---------- PNG ----------
+
+# 5×7 點陣字型（每列 5 個像素，1 為前景）
+FONT = {
+    '0': '01110/10001/10011/10101/11001/10001/01110',
+    '1': '00100/01100/00100/00100/00100/00100/01110',
+    '2': '01110/10001/00001/00010/00100/01000/11111',
+    '3': '11110/00001/00001/01110/00001/00001/11110',
+    '4': '00010/00110/01010/10010/11111/00010/00010',
+    '5': '11111/10000/11110/00001/00001/10001/01110',
+    '6': '00110/01000/10000/11110/10001/10001/01110',
+    '7': '11111/00001/00010/00100/01000/01000/01000',
+    '8': '01110/10001/10001/01110/10001/10001/01110',
+    '9': '01110/10001/10001/01111/00001/00010/01100',
+    ':': '00000/01100/01100/00000/01100/01100/00000',
+    '.': '00000/00000/00000/00000/00000/01100/01100',
+    '-': '00000/00000/00000/11111/00000/00000/00000',
+    '/': '00001/00010/00010/00100/01000/01000/10000',
+    '%': '11001/11010/00010/00100/01000/01011/10011',
+    'C': '01110/10001/10000/10000/10000/10001/01110',
+    '°': '01100/10010/10010/01100/00000/00000/00000',
+    ' ': '00000/00000/00000/00000/00000/00000/00000',
+}
+GLYPH_WIDTH = 6  # 5 個像素加 1 個間隔
+GLYPH_HEIGHT = 7
+
+# 調色盤的顏色索引
+_BACKGROUND, _GRID, _TEXT, _TEMPERATURE, _HUMIDITY = range(5)
+PALETTE = (BACKGROUND, GRID_COLOR, TEXT_COLOR, TEMPERATURE_COLOR, HUMIDITY_COLOR)
+
+
+def _png_chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+
+class Canvas:
+    """
+    調色盤點陣圖（每個像素 1 byte 的顏色索引，0 為背景），可輸出 PNG
+
+    Args:
+        width: 寬度（像素）
+        height: 高度（像素）
+        palette: 顏色列表（'#rrggbb'）
+    """
+
+    def __init__(self, width, height, palette=PALETTE):
+        self.width = width
+        self.height = height
+        self.palette = palette
+        self.pixels = bytearray(width * height)
+
+    def plot(self, x, y, color):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.pixels[y * self.width + x] = color
+
+    def hline(self, x0, x1, y, color, dash=0):
+        """水平線（dash > 0 時為虛線）"""
+        if not 0 <= y < self.height:
+            return
+        for x in range(max(0, x0), min(self.width, x1 + 1)):
+            if not dash or (x // dash) % 2 == 0:
+                self.pixels[y * self.width + x] = color
+
+    def vline(self, x, y0, y1, color, dash=0):
+        """垂直線（dash > 0 時為虛線）"""
+        if not 0 <= x < self.width:
+            return
+        for y in range(max(0, y0), min(self.height, y1 + 1)):
+            if not dash or (y // dash) % 2 == 0:
+                self.pixels[y * self.width + x] = color
+
+    def line(self, x0, y0, x1, y1, color, thickness=2):
+        """Bresenham 直線（以 thickness × thickness 的方塊描繪）"""
+        dx, dy = abs(x1 - x0), -abs(y1 - y0)
+        sx, sy = (1 if x0 < x1 else -1), (1 if y0 < y1 else -1)
+        error = dx + dy
+        while True:
+            for ox in range(thickness):
+                for oy in range(thickness):
+                    self.plot(x0 + ox, y0 + oy, color)
+            if x0 == x1 and y0 == y1:
+                return
+            double = 2 * error
+            if double >= dy:
+                error += dy
+                x0 += sx
+            if double <= dx:
+                error += dx
+                y0 += sy
+
+    def text(self, x, y, text, color, align='left'):
+        """以 5×7 點陣字型繪製文字（y 為文字上緣；不支援的字元略過）"""
+        if align == 'right':
+            x -= len(text) * GLYPH_WIDTH
+        elif align == 'center':
+            x -= len(text) * GLYPH_WIDTH // 2
+        for i, char in enumerate(text):
+            glyph = FONT.get(char)
+            if glyph is None:
+                continue
+            for row, bits in enumerate(glyph.split('/')):
+                for column, bit in enumerate(bits):
+                    if bit == '1':
+                        self.plot(x + i * GLYPH_WIDTH + column, y + row, color)
+
+    def to_png(self, level=6):
+        """
+        編碼為 PNG（色彩類型 3：調色盤，每個像素 8 bits）
+
+        Returns:
+            bytes: PNG 檔案內容
+        """
+        width = self.width
+        raw = b''.join(b'\x00' + self.pixels[y * width:(y + 1) * width] for y in range(self.height))
+        palette = b''.join(bytes.fromhex(color[1:]) for color in self.palette)
+        header = struct.pack('>IIBBBBB', width, self.height, 8, 3, 0, 0, 0)
+        return (b'\x89PNG\r\n\x1a\n' + _png_chunk(b'IHDR', header) + _png_chunk(b'PLTE', palette) +
+                _png_chunk(b'IDAT', zlib.compress(raw, level)) + _png_chunk(b'IEND', b''))
+
+
+def render_png(rollups, tier, start, end, width=WIDTH, height=HEIGHT):
+    """
+    繪製 PNG 圖表（文字只有數字與時間）
+
+    Returns:
+        bytes: PNG 檔案內容
+    """
+    chart = layout(rollups, tier, start, end, width, height)
+    left, top, right, bottom = (round(v) for v in chart['plot'])
+    canvas = Canvas(width, height)
+
+    for y, _ in chart['temperature_ticks']:
+        canvas.hline(left, right, round(y), _GRID, dash=4)
+    for x, _ in chart['time_ticks']:
+        canvas.vline(round(x), top, bottom, _GRID, dash=4)
+    canvas.hline(left, right, top, _TEXT)
+    canvas.hline(left, right, bottom, _TEXT)
+    canvas.vline(left, top, bottom, _TEXT)
+    canvas.vline(right, top, bottom, _TEXT)
+
+    half = GLYPH_HEIGHT // 2
+    for y, label in chart['temperature_ticks']:
+        canvas.text(left - 4, round(y) - half, label, _TEMPERATURE, align='right')
+    for y, label in chart['humidity_ticks']:
+        canvas.text(right + 5, round(y) - half, label, _HUMIDITY)
+    for x, label in chart['time_ticks']:
+        canvas.text(round(x), bottom + 8, label, _TEXT, align='center')
+
+    for key, color in (('temperature', _TEMPERATURE), ('humidity', _HUMIDITY)):
+        for points in chart['series'][key]:
+            pixels = [(round(x), round(y)) for x, y in points]
+            for (x0, y0), (x1, y1) in zip(pixels, pixels[1:]):
+                canvas.line(x0, y0, x1, y1, color)
+
+    # 軸的單位與更新時間
+    canvas.text(left, 12, '°C', _TEMPERATURE)
+    canvas.text(right, 12, '%', _HUMIDITY, align='right')
+    canvas.text((left + right) // 2, 12, format_timestamp(end, '%Y-%m-%d %H:%M'), _TEXT, align='center')
+    return canvas.to_png()
+
+
+RENDERERS = {
+    'svg': (render_svg, SVG_MIME_TYPE),
+    'png': (render_png, PNG_MIME_TYPE),
+}
+
+
+# ---------- 快取 ----------
+
+class _CachedChart:
+    __slots__ = ('start', 'end', 'body', 'etag', 'stale')
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.body = None
+        self.etag = None
+        self.stale = False
+
+
+class ChartCache:
+    """
+    已繪製圖片的快取
+
+    每張圖片記錄它的時間範圍；note() 收到範圍內的新數據時標記為過期，
+    下次請求才重新繪製。同時有多個請求時只有一個請求繪製，其他請求等待後使用結果。
+
+    Args:
+        max_entries: 快取的圖片數上限
+    """
+
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self.builds = 0
+        self._entries = OrderedDict()  # key -> _CachedChart，依最近使用排序
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def note(self, timestamp):
+        """有一筆數據寫入（epoch 毫秒）：時間範圍包含它的圖片下次請求時重新繪製"""
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.start <= timestamp < entry.end:
+                    entry.stale = True
+
+    def _fresh(self, key, start):
+        """取得仍然有效的快取（需持有 _lock）"""
+        entry = self._entries.get(key)
+        if entry is None or entry.body is None or entry.stale or entry.start != start:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, key, start, end, build):
+        """
+        取得圖片，沒有有效的快取時呼叫 build() 繪製
+
+        Args:
+            key: 快取鍵（格式、解析度、範圍、尺寸等）
+            start: 圖片的時間範圍起點（epoch 毫秒）
+            end: 圖片的時間範圍終點（epoch 毫秒，不含）
+            build: 繪製函式 build() -> bytes
+
+        Returns:
+            tuple: (圖片內容, ETag（不含引號）, 是否使用快取)
+        """
+        with self._lock:
+            entry = self._fresh(key, start)
+        if entry is not None:
+            return entry.body, entry.etag, True
+
+        with self._build_lock:
+            with self._lock:
+                # 等待期間其他請求可能已經繪製完成
+                entry = self._fresh(key, start)
+                if entry is not None:
+                    return entry.body, entry.etag, True
+                # 先登記時間範圍再讀取數據：繪製期間寫入的數據會把這張圖片標記為過期
+                entry = _CachedChart(start, end)
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            body = build()
+            with self._lock:
+                self.builds += 1
+                entry.body = body
+                entry.etag = f'{zlib.crc32(body):08x}-{len(body)}'
+        return body, entry.etag, False
+
+
+CHARTS = ChartCache()
@@ -0,0 +1,213 @@
+"""
+下行控制指令
+將網頁的開關燈 / 調光指令發布到裝置專屬的主題，並以裝置回傳的確認（ack）量測來回時間
+
+    網頁 --> /api/devices/<id>/command 或 Socket.IO 'command'
+         --> MQTT devices/<id>/command --> Pico 執行
+         --> MQTT devices/<id>/ack     --> handle_ack() 記錄來回時間
+"""
+
+import json
+import threading
+import time
+import uuid
+
+import metrics
+from log_config import get_logger
+
+log = get_logger('commands')
+
+# 裝置訂閱的指令主題與回傳確認的主題
+COMMAND_TOPIC = 'devices/{device}/command'
+ACK_TOPIC = 'devices/{device}/ack'
+# 監控程式訂閱所有裝置的確認
+ACK_SUBSCRIPTION = 'devices/+/ack'
+
+# 超過這個時間沒有收到確認，視為逾時（秒）
+ACK_TIMEOUT = 5.0
+
+# 支援的指令：action -> 可用的 value
+LED_VALUES = ('on', 'off', 'toggle')
+PWM_MAX = 65535
+
+
+def validate_command(data):
+    """
+    檢查並正規化指令內容
+
+    Args:
+        data: {'action': 'led', 'value': 'on'} 或 {'action': 'pwm', 'value': 0~65535}
+
+    Returns:
+        dict: 只包含 action / value 的指令
+
+    Raises:
+        ValueError: 不支援的指令或數值
+    """
+    if not isinstance(data, dict):
+        raise ValueError('指令必須是 JSON 物件')
+    action = data.get('action')
+    value = data.get('value')
+    if action == 'led':
+        if value not in LED_VALUES:
+            raise ValueError(f'led 的 value 必須是 {", ".join(LED_VALUES)}')
+    elif action == 'pwm':
+        if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= PWM_MAX:
+            raise ValueError(f'pwm 的 value 必須是 0 ~ {PWM_MAX} 的整數')
+    else:
+        raise ValueError('action 必須是 led 或 pwm')
+    return {'action': action, 'value': value}
+
+
+def validate_device(device):
+    """
+    檢查裝置 id 能否直接放進 devices/<id>/command 主題
+
+    Args:
+        device: 裝置 id
+
+    Returns:
+        str: 裝置 id
+
+    Raises:
+        ValueError: 空字串，或包含主題分隔符號 / 萬用字元（/ + #）或 NUL
+    """
+    if not isinstance(device, str) or not device:
+        raise ValueError('缺少 device')
+    if any(ch in device for ch in '/+#\0'):
+        raise ValueError('device 不可包含 / + # 或 NUL 字元')
+    return device
+
+
+def device_from_topic(topic):
+    """從 devices/<id>/ack 取出裝置 id"""
+    parts = topic.split('/')
+    if len(parts) == 3 and parts[0] == 'devices':
+        return parts[1]
+    return None
+
+
+class CommandChannel:
+    """
+    指令發送與來回時間追蹤
+
+    Args:
+        publish: 發布函式 publish(topic, payload, qos)（MqttSession.publish）
+        on_ack: 收到確認後呼叫 on_ack(result)，用於推送到前端
+        timeout: 確認逾時（秒）
+    """
+
+    def __init__(self, publish, on_ack=None, timeout=ACK_TIMEOUT):
+        self.publish = publish
+        self.on_ack = on_ack
+        self.timeout = timeout
+        self.latency = metrics.LatencyWindow()
+        self.timeouts = 0
+        self._pending = {}  # 指令 id -> (裝置, action, 送出時間)
+        self._lock = threading.Lock()
+
+    def send(self, device, command):
+        """
+        發布指令到裝置
+
+        Args:
+            device: 裝置 id（即主題中的 <id>）
+            command: validate_command() 的結果
+
+        Returns:
+            dict: 加上 id 與 device 的指令
+
+        Raises:
+            ValueError: 裝置 id 不合法（validate_device）
+            ConnectionError: 發布失敗
+        """
+        validate_device(device)
+        self.expire()
+        command = dict(command, id=uuid.uuid4().hex[:12])
+        payload = json.dumps(command, separators=(',', ':'))
+        sent = time.perf_counter()
+        # QoS 0：指令過時就沒有意義，不需要 broker 保留重送
+        info = self.publish(COMMAND_TOPIC.format(device=device), payload, qos=0)
+        if getattr(info, 'rc', 0):
+            raise ConnectionError(f'指令發布失敗 (rc={info.rc})')
+        # 發布成功後才等待確認，失敗的指令不會在之後被算成逾時
+        with self._lock:
+            self._pending[command['id']] = (device, command['action'], sent)
+        metrics.COMMANDS_SENT.inc(device, command['action'])
+        command['device'] = device
+        return command
+
+    def handle_ack(self, topic, payload):
+        """
+        處理裝置的確認訊息（在 MQTT 執行緒中呼叫）
+
+        Returns:
+            dict: 包含 id / device / ok / rtt_ms 的結果；無法對應到指令或主題的裝置不符時回傳 None
+        """
+        received = time.perf_counter()
+        try:
+            ack = json.loads(payload)
+        except (ValueError, UnicodeDecodeError) as e:
+            log.warning('確認訊息格式錯誤: %s', e)
+            return None
+        if not isinstance(ack, dict):
+            return None
+        command_id = ack.get('id')
+        # 指令編號由 send() 產生；其他型別（list、dict 無法作為字典鍵）不可能對應到指令
+        if isinstance(command_id, bool) or not isinstance(command_id, (str, int)):
+            log.warning('確認訊息的 id 格式錯誤: %r', command_id)
+            return None
+
+        topic_device = device_from_topic(topic)
+        with self._lock:
+            pending = self._pending.get(command_id)
+            if pending is not None and pending[0] != topic_device:
+                # 從其他裝置的主題送來的確認：不能完成送給這台裝置的指令
+                log.warning('確認訊息的裝置不符 (topic=%s, 指令送往 %s, id=%s)',
+                            topic, pending[0], command_id)
+                return None
+            self._pending.pop(command_id, None)
+        if pending is None:
+            # 逾時後才到達，或其他監控程式送出的指令
+            return None
+
+        device, action, sent = pending
+        rtt = received - sent
+        ok = bool(ack.get('ok', True))
+        self.latency.add(rtt)
+        metrics.COMMAND_RTT_SECONDS.observe(rtt, device)
+        metrics.COMMAND_ACKS.inc(device, 'ok' if ok else 'error')
+
+        result = {
+            'id': command_id,
+            'device': device,
+            'action': action,
+            'ok': ok,
+            'state': ack.get('state'),
+            'error': ack.get('error'),
+            'rtt_ms': round(rtt * 1000, 1)
+        }
+        if self.on_ack is not None:
+            self.on_ack(result)
+        return result
+
+    def expire(self):
+        """移除逾時未確認的指令"""
+        deadline = time.perf_counter() - self.timeout
+        with self._lock:
+            expired = [(cid, item) for cid, item in self._pending.items() if item[2] < deadline]
+            for cid, _ in expired:
+                del self._pending[cid]
+        for cid, (device, action, _) in expired:
+            self.timeouts += 1
+            metrics.COMMAND_ACKS.inc(device, 'timeout')
+            log.warning('指令逾時未確認 (device=%s, action=%s, id=%s)', device, action, cid)
+
+    def stats(self):
+        """來回時間的百分位數與待確認數"""
+        self.expire()
+        result = self.latency.percentiles()
+        with self._lock:
+            result['pending'] = len(self._pending)
+        result['timeouts'] = self.timeouts
+        return result
@@ -0,0 +1,256 @@
+"""
+裝置總覽索引
+在記憶體中為每台裝置保留一筆摘要，每收到一筆數據以 O(1) 更新，/api/fleet 直接查詢，不讀取歷史數據：
+
+    最新數值      溫度 / 濕度 / 電燈狀態 / 取樣時間
+    最後收到時間  監控程式收到數據的時間（epoch 毫秒）
+    每分鐘筆數    由取樣間隔的移動平均推算
+    今日最小/最大  依取樣時間的本地日期，換日時重新計算
+    在線/離線      沒有收到數據超過 max(OFFLINE_AFTER, OFFLINE_INTERVALS × 平常的收到間隔)
+
+裝置依最後收到時間排序保存，查詢「已沉默 N 秒」的裝置只需從最舊的一端往後讀到不符合為止；
+排序取前 N 筆（例如最熱的 20 台）以 heapq 在摘要上選取。
+索引只在記憶體中，監控程式重新啟動後裝置於收到第一筆數據時重新出現。
+"""
+
+import heapq
+import threading
+from collections import OrderedDict
+
+import metrics
+from storage import FILL_MAX_GAP
+from timestamps import day_name, now_ms
+
+# 沒有收到數據超過這個時間（秒）視為離線（與補齊空白時間桶的最長缺口相同）
+OFFLINE_AFTER = FILL_MAX_GAP
+# 裝置平常的收到間隔較長時（例如低功耗節點批次回報），超過幾個間隔才視為離線
+OFFLINE_INTERVALS = 3
+# 間隔移動平均的權重（新間隔所佔比例）
+INTERVAL_ALPHA = 0.2
+
+# 可排序的欄位（silence 為已沉默的時間，即依最後收到時間由舊到新）
+SORT_FIELDS = ('device', 'temperature', 'humidity', 'last_seen', 'silence', 'rate_per_min',
+               'temperature_min', 'temperature_max', 'humidity_min', 'humidity_max')
+
+
+class DeviceSummary:
+    """一台裝置的摘要"""
+
+    __slots__ = ('device', 'temperature', 'humidity', 'light_status', 'timestamp', 'last_seen',
+                 'count', 'interval', 'arrival_interval', 'day',
+                 'temperature_min', 'temperature_max', 'humidity_min', 'humidity_max')
+
+    def __init__(self, device):
+        self.device = device
+        self.temperature = None
+        self.humidity = None
+        self.light_status = None
+        self.timestamp = None
+        self.last_seen = None
+        self.count = 0
+        self.interval = None          # 取樣間隔的移動平均（毫秒）
+        self.arrival_interval = None  # 收到間隔的移動平均（毫秒，同時收到的批次只算一次）
+        self.day = None
+        self.temperature_min = self.temperature_max = None
+        self.humidity_min = self.humidity_max = None
+
+    def is_online(self, now, offline_after=OFFLINE_AFTER):
+        """沉默時間是否在 max(offline_after 秒, OFFLINE_INTERVALS × 平常的收到間隔) 之內"""
+        limit = offline_after * 1000
+        if self.arrival_interval is not None:
+            limit = max(limit, OFFLINE_INTERVALS * self.arrival_interval)
+        return now - self.last_seen <= limit
+
+    def rate_per_min(self):
+        return round(60000 / self.interval, 2) if self.interval else None
+
+    def to_dict(self, now, offline_after=OFFLINE_AFTER):
+        silence = now - self.last_seen
+        return {
+            'device': self.device,
+            'online': self.is_online(now, offline_after),
+            'temperature': self.temperature,
+            'humidity': self.humidity,
+            'light_status': self.light_status,
+            'timestamp': self.timestamp,
+            'last_seen': self.last_seen,
+            'silence_s': round(silence / 1000, 1),
+            'rate_per_min': self.rate_per_min(),
+            'count': self.count,
+            'today': {
+                'day': self.day,
+                'temperature_min': self.temperature_min,
+                'temperature_max': self.temperature_max,
+                'humidity_min': self.humidity_min,
+                'humidity_max': self.humidity_max,
+            },
+        }
+
+
+def _ewma(previous, value):
+    return value if previous is None else previous + INTERVAL_ALPHA * (value - previous)
+
+
+def _sort_key(field):
+    if field == 'rate_per_min':
+        return lambda s: s.rate_per_min() or 0.0
+    if field == 'device':
+        return lambda s: s.device
+    # 尚無數值的裝置排在最後
+    return lambda s: (getattr(s, field) is not None, getattr(s, field) or 0)
+
+
+class DeviceIndex:
+    """
+    各裝置摘要的索引
+
+    Args:
+        offline_after: 視為離線的沉默時間（秒）
+    """
+
+    def __init__(self, offline_after=OFFLINE_AFTER):
+        self.offline_after = offline_after
+        self._devices = OrderedDict()  # 裝置名稱 -> DeviceSummary，依最後收到時間由舊到新
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._devices)
+
+    def __contains__(self, device):
+        with self._lock:
+            return device in self._devices
+
+    def label(self, device):
+        """監控指標的裝置標籤：索引中沒有的裝置（校時、診斷等訊息任意帶入的名稱）為 metrics.OTHER_LABEL"""
+        return device if device in self else metrics.OTHER_LABEL
+
+    def update(self, sample, now=None):
+        """
+        以一筆數據更新裝置摘要（O(1)）
+
+        Args:
+            sample: 接收流程儲存的數據（device / timestamp / temperature / humidity / light_status）
+            now: 收到時間（epoch 毫秒，預設現在）
+        """
+        now = now_ms() if now is None else now
+        timestamp = sample['timestamp']
+        temperature = sample['temperature']
+        humidity = sample['humidity']
+        day = day_name(timestamp)
+        with self._lock:
+            summary = self._devices.get(sample['device'])
+            if summary is None:
+                summary = self._devices[sample['device']] = DeviceSummary(sample['device'])
+            else:
+                self._devices.move_to_end(summary.device)
+                if timestamp > summary.timestamp:
+                    summary.interval = _ewma(summary.interval, timestamp - summary.timestamp)
+                if now > summary.last_seen:
+                    summary.arrival_interval = _ewma(summary.arrival_interval, now - summary.last_seen)
+            summary.count += 1
+            summary.last_seen = now
+
+            if summary.day is None or day > summary.day:
+                # 換日：重新計算今日最小/最大
+                summary.day = day
+                summary.temperature_min = summary.temperature_max = temperature
+                summary.humidity_min = summary.humidity_max = humidity
+            elif day == summary.day:
+                summary.temperature_min = min(summary.temperature_min, temperature)
+                summary.temperature_max = max(summary.temperature_max, temperature)
+                summary.humidity_min = min(summary.humidity_min, humidity)
+                summary.humidity_max = max(summary.humidity_max, humidity)
+
+            # 批次或延遲送達的舊數據只計入統計，不覆蓋最新數值
+            if summary.timestamp is None or timestamp >= summary.timestamp:
+                summary.timestamp = timestamp
+                summary.temperature = temperature
+                summary.humidity = humidity
+                summary.light_status = sample['light_status']
+
+    def get(self, device, now=None):
+        """取得一台裝置的摘要（不存在時回傳 None）"""
+        now = now_ms() if now is None else now
+        with self._lock:
+            summary = self._devices.get(device)
+            return None if summary is None else summary.to_dict(now, self.offline_after)
+
+    def _count_online(self, now):
+        """在線裝置數：最近 offline_after 秒內收到數據的一定在線，只需逐一判斷更早的裝置"""
+        recent = now - self.offline_after * 1000
+        count = 0
+        older = reversed(self._devices.values())
+        for summary in older:
+            if summary.last_seen < recent:
+                count += summary.is_online(now, self.offline_after)
+                break
+            count += 1
+        return count + sum(1 for s in older if s.is_online(now, self.offline_after))
+
+    def query(self, sort='device', descending=None, limit=100, state=None,
+              silent_for=None, match=None, now=None):
+        """
+        查詢裝置摘要
+
+        Args:
+            sort: 排序欄位（SORT_FIELDS）
+            descending: 是否由大到小（預設 device 由小到大，其他由大到小；silence 由大到小即沉默最久的在前）
+            limit: 最多回傳幾台（None 表示全部）
+            state: 'online' / 'offline' / None（全部）
+            silent_for: 只回傳至少沉默這麼多秒的裝置
+            match: 只回傳名稱包含這個字串的裝置
+            now: 目前時間（epoch 毫秒，測試用）
+
+        Returns:
+            dict: {'total', 'online', 'matched', 'devices': [摘要...]}
+
+        Raises:
+            ValueError: 不支援的排序欄位或狀態
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f'不支援的排序欄位: {sort}')
+        if state not in (None, 'online', 'offline'):
+            raise ValueError(f'不支援的狀態: {state}')
+        now = now_ms() if now is None else now
+        if descending is None:
+            descending = sort != 'device'
+        if limit is not None:
+            limit = max(0, limit)
+
+        with self._lock:
+            if silent_for is not None:
+                # 依最後收到時間由舊到新，遇到沉默時間不足的裝置即可停止
+                cutoff = now - silent_for * 1000
+                candidates = []
+                for summary in self._devices.values():
+                    if summary.last_seen > cutoff:
+                        break
+                    candidates.append(summary)
+            else:
+                candidates = self._devices.values()
+
+            online = self._count_online(now)
+            if state is not None:
+                wanted = state == 'online'
+                candidates = [s for s in candidates if s.is_online(now, self.offline_after) == wanted]
+            if match:
+                candidates = [s for s in candidates if match in s.device]
+            if not isinstance(candidates, list):
+                candidates = list(candidates)
+            matched = len(candidates)
+
+            if sort in ('silence', 'last_seen'):
+                # 已依最後收到時間排序，不需要重新排序
+                ordered = candidates if (sort == 'silence') == descending else candidates[::-1]
+                selected = ordered if limit is None else ordered[:limit]
+            elif limit is not None and limit < matched:
+                pick = heapq.nlargest if descending else heapq.nsmallest
+                selected = pick(limit, candidates, key=_sort_key(sort))
+            else:
+                selected = sorted(candidates, key=_sort_key(sort), reverse=descending)
+            devices = [s.to_dict(now, self.offline_after) for s in selected]
+
+        return {'total': len(self._devices), 'online': online, 'matched': matched, 'devices': devices}
+
+
+DEVICES = DeviceIndex()
@@ -0,0 +1,290 @@
+"""
+只接收數據的 MQTT 閘道（沒有網頁介面）
+與 app_flask.py 使用相同的接收流程（ingest.py）與數據分區（storage.py），
+但不載入 Flask / Socket.IO / Jinja，適合只需要保存數據的 Raspberry Pi Zero：
+
+    python gateway.py --broker localhost --data-dir data
+
+儀表板可以在另一台主機上以唯讀模式讀取同一個數據目錄（NFS、Samba 等共用目錄）：
+
+    python app_flask.py --dashboard-only --data-dir /mnt/sensor-data
+
+同一個數據目錄只能有一個寫入者：閘道負責寫入原始數據並執行 retention（彙總、壓縮、清除），
+唯讀模式的儀表板只讀取檔案。
+
+記憶體預算為 RSS_BUDGET_MB；每 STATS_INTERVAL 秒輸出一次接收速率、佇列深度與 RSS，
+超過預算時記錄警告。paho 在啟動時才匯入，/metrics 的 HTTP 服務（http.server）只在
+指定 --metrics-port 時才匯入。
+
+量測最大持續接收速率（不經 broker，直接送入接收流程並寫入指定目錄）：
+
+    python gateway.py --bench 100000 --data-dir /tmp/gateway-bench
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import threading
+import time
+
+import metrics
+import timesync
+from ingest import IngestPipeline
+from log_config import get_logger
+from readiness import Readiness, sd_notify
+from retention import RetentionWorker
+from storage import SensorStore
+from timestamps import now_ms
+
+log = get_logger('gateway')
+
+# MQTT 設定（與 app_flask.py 相同）
+MQTT_BROKER = "localhost"
+MQTT_PORT = 1883
+MQTT_TOPIC = "living_room/sensor"
+# 與監控程式不同的 client id：兩者可以同時連線，各自保留持久化 session
+MQTT_CLIENT_ID = f"mqtt-gateway-{socket.gethostname()}"
+MQTT_PROTOCOL = 5
+
+DATA_DIR = 'data'
+
+# 數據保留策略（與 app_flask.py 相同）
+RETENTION_POLICY = {
+    'raw': 7,
+    '1m': 90,
+    '1h': None,
+}
+
+# 接收佇列上限：每則訊息約 0.5 KB，2000 則約 1 MB
+QUEUE_SIZE = 2000
+
+# 記憶體預算（MB，常駐記憶體 RSS）
+RSS_BUDGET_MB = 24
+
+# 輸出統計的間隔（秒）
+STATS_INTERVAL = 60
+
+
+def rss_bytes():
+    """
+    目前程序的常駐記憶體（bytes）
+
+    Linux 上讀取 /proc/self/status 的 VmRSS；其他平台回傳 None。
+    """
+    try:
+        with open('/proc/self/status', 'rb') as f:
+            for line in f:
+                if line.startswith(b'VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class Gateway:
+    """
+    MQTT 接收閘道：訂閱感測器主題寫入數據分區，並回應裝置的校時請求
+
+    Args:
+        data_dir: 數據目錄
+        broker: Broker 位址
+        port: Broker 連接埠
+        topic: 感測器數據主題
+        client_id: 固定的 client id
+        retention: 是否執行數據保留工作（同一個數據目錄只能有一個閘道執行）
+    """
+
+    def __init__(self, data_dir=DATA_DIR, broker=MQTT_BROKER, port=MQTT_PORT, topic=MQTT_TOPIC,
+                 client_id=MQTT_CLIENT_ID, protocol=MQTT_PROTOCOL, retention=True,
+                 queue_size=QUEUE_SIZE):
+        self.broker = broker
+        self.port = port
+        self.topic = topic
+        self.client_id = client_id
+        self.protocol = protocol
+        self.store = SensorStore(data_dir)
+        self.ingest = IngestPipeline(self.store, maxsize=queue_size)
+        self.readiness = Readiness(['ingest'])
+        self.mqtt_session = None
+        self.retention_worker = RetentionWorker(self.store, RETENTION_POLICY) if retention else None
+        self._stop_event = threading.Event()
+
+    def on_message(self, topic, payload):
+        """MQTT 訊息回調：校時請求立即回應，其他訊息放入接收佇列"""
+        if timesync.is_request(topic):
+            timesync.handle_request(topic, payload, self.mqtt_session.publish,
+                                    label=self.ingest.device_label)
+            return
+        self.ingest.submit(topic, payload)
+
+    def start(self):
+        """啟動接收流程、MQTT 與數據保留工作"""
+        # paho 只在啟動時才需要，匯入本模組（量測、工具）時不載入
+        from mqtt_session import MqttSession
+
+        self.ingest.start()
+        self.readiness.mark('ingest')
+
+        self.mqtt_session = MqttSession(self.broker, self.port, self.client_id,
+                                        [self.topic, timesync.REQUEST_SUBSCRIPTION],
+                                        self.on_message, protocol=self.protocol)
+        self.mqtt_session.start()
+
+        if self.retention_worker is not None:
+            self.retention_worker.start()
+
+    def stop(self):
+        """中斷 MQTT、處理完佇列中的訊息後關閉分區檔案"""
+        self._stop_event.set()
+        if self.mqtt_session is not None:
+            self.mqtt_session.stop()
+        self.ingest.stop()
+        if self.retention_worker is not None:
+            self.retention_worker.stop()
+        self.store.close()
+
+    def run(self, stats_interval=STATS_INTERVAL):
+        """啟動後持續執行並定期輸出統計，直到收到 SIGINT / SIGTERM"""
+        signal.signal(signal.SIGTERM, lambda signum, frame: self._stop_event.set())
+        self.start()
+        received = metrics.MESSAGES_RECEIVED.get(self.topic)
+        try:
+            while not self._stop_event.wait(stats_interval):
+                total = metrics.MESSAGES_RECEIVED.get(self.topic)
+                self._report((total - received) / stats_interval)
+                received = total
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sd_notify('STOPPING=1')
+            print("🛑 停止閘道，處理佇列中的訊息...")
+            self.stop()
+
+    def _report(self, rate):
+        rss = rss_bytes()
+        rss_mb = rss / 1024 / 1024 if rss is not None else None
+        print(f"📊 {rate:.1f} 則/秒, 佇列 {self.ingest.qsize()}, "
+              f"MQTT {'已連線' if self.mqtt_session.connected else '未連線'}, "
+              f"RSS {f'{rss_mb:.1f} MB' if rss_mb is not None else '未知'}")
+        if rss_mb is not None and rss_mb > RSS_BUDGET_MB:
+            log.warning('RSS %.1f MB 超過預算 %d MB', rss_mb, RSS_BUDGET_MB)
+
+
+def serve_metrics(gateway, port):
+    """
+    在背景執行緒提供 /metrics、/healthz、/readyz（指定 --metrics-port 時才匯入 http.server）
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                self._send(200, metrics.REGISTRY.render(), metrics.CONTENT_TYPE)
+            elif self.path == '/healthz':
+                self._send(200, json.dumps({'status': 'ok'}), 'application/json')
+            elif self.path == '/readyz':
+                status = gateway.readiness.status()
+                status['queue_depth'] = gateway.ingest.qsize()
+                status['rss_bytes'] = rss_bytes()
+                self._send(200 if status['ready'] else 503, json.dumps(status), 'application/json')
+            else:
+                self._send(404, 'not found', 'text/plain')
+
+        def _send(self, code, body, content_type):
+            data = body.encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('0.0.0.0', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name='metrics-http').start()
+    return server
+
+
+def bench(data_dir, count, devices=10):
+    """
+    量測最大持續接收速率：盡快送入接收流程（佇列滿時等待），直到全部寫入數據分區
+
+    Args:
+        data_dir: 輸出目錄（必須是空的）
+        count: 訊息數
+        devices: 模擬的裝置數
+
+    Returns:
+        dict: {'messages', 'seconds', 'rate', 'rss_bytes'}
+    """
+    store = SensorStore(data_dir)
+    if store.list_partitions('raw'):
+        raise SystemExit(f"❌ {data_dir} 已有數據，請指定新的 --data-dir")
+    pipeline = IngestPipeline(store, maxsize=QUEUE_SIZE)
+    pipeline.start()
+
+    start_ms = now_ms() - count * 1000
+    started = time.perf_counter()
+    for i in range(count):
+        payload = json.dumps({
+            'device': f'bench-{i % devices}', 'seq': i // devices,
+            'ts': start_ms + i * 1000 // devices,
+            'temperature': round(20 + (i % 100) / 10, 1), 'humidity': round(50 + (i % 50) / 10, 1),
+            'light_status': '開' if i % 7 else '關',
+        }).encode('utf-8')
+        # 佇列滿時等待（不計為丟棄的訊息），量測的是接收流程能持續處理的速率
+        while pipeline.qsize() >= QUEUE_SIZE:
+            time.sleep(0.001)
+        pipeline.submit(MQTT_TOPIC, payload, start_ms + i * 1000 // devices)
+    pipeline.join()
+    seconds = time.perf_counter() - started
+    pipeline.stop()
+    store.close()
+    return {'messages': count, 'seconds': seconds, 'rate': count / seconds, 'rss_bytes': rss_bytes()}
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='只接收數據的 MQTT 閘道（沒有網頁介面）')
+    parser.add_argument('--broker', default=MQTT_BROKER)
+    parser.add_argument('--port', type=int, default=MQTT_PORT)
+    parser.add_argument('--topic', default=MQTT_TOPIC)
+    parser.add_argument('--client-id', default=MQTT_CLIENT_ID)
+    parser.add_argument('--protocol', type=int, choices=[4, 5], default=MQTT_PROTOCOL)
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--no-retention', action='store_true',
+                        help='不執行數據保留工作（由其他程式負責彙總與清除）')
+    parser.add_argument('--metrics-port', type=int, help='提供 /metrics、/healthz、/readyz 的連接埠')
+    parser.add_argument('--stats-interval', type=float, default=STATS_INTERVAL)
+    parser.add_argument('--bench', type=int, metavar='N',
+                        help='量測最大持續接收速率：直接送入 N 則訊息（不連線 broker）')
+    args = parser.parse_args()
+
+    if args.bench:
+        result = bench(args.data_dir, args.bench)
+        rss = result['rss_bytes']
+        print(f"⏱️  {result['messages']} 則 / {result['seconds']:.2f} 秒 = {result['rate']:.0f} 則/秒, "
+              f"RSS {f'{rss / 1024 / 1024:.1f} MB' if rss is not None else '未知'}")
+        return
+
+    print("=" * 60)
+    print(" MQTT 接收閘道")
+    print("=" * 60)
+    print(f" MQTT Broker: {args.broker}:{args.port}")
+    print(f" MQTT Topic: {args.topic}")
+    print(f" 數據目錄: {os.path.abspath(args.data_dir)}")
+    print(f" 記憶體預算: {RSS_BUDGET_MB} MB")
+    print("=" * 60)
+
+    gateway = Gateway(args.data_dir, args.broker, args.port, args.topic, args.client_id,
+                      args.protocol, retention=not args.no_retention)
+    if args.metrics_port:
+        serve_metrics(gateway, args.metrics_port)
+    gateway.run(args.stats_interval)
+
+
+if __name__ == '__main__':
+    main()
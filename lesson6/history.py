@@ -0,0 +1,435 @@
+"""
+歷史數據分析 API（NumPy / pandas）
+以 NumPy 陣列讀取原始數據分區，不需要逐筆解析 CSV 或建立字典：
+
+    import history
+
+    h = history.open('data')
+    frame = h.range('2025-11-01 00:00:00', '2025-12-01 00:00:00', device='pico_temp_sensor')
+    frame['temperature'].mean()         # NumPy 陣列
+    hourly = frame.resample('1h')       # 向量化降採樣（欄位與 1 小時彙總相同）
+    per_device = frame.aggregate()      # 各裝置的筆數、平均、最小、最大
+    df = frame.to_pandas()              # pandas DataFrame（需要安裝 pandas）
+
+第一次讀取已封存的分區時轉換為欄位式快取（data/cache/raw/YYYY-MM-DD.scol，格式見 packed.py），
+之後以 memory map 開啟，每個欄位直接是檔案內容上的 NumPy 陣列（不複製）；
+來源分區改變（例如收到延遲數據、重新壓縮）時自動重建。寫入中的分區（今天）每次直接讀取，不建立快取。
+快取可以隨時刪除，數據目錄唯讀時只在記憶體中轉換。
+
+numpy / pandas 是選用套件（pyproject.toml 的 analytics extra）：沒有安裝時仍可匯入這個模組，
+呼叫 open() 等分析 API 才拋出 ImportError；監控程式與 storage.py 的查詢不受影響。
+"""
+
+import io
+import json
+import mmap
+import os
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:
+    # numpy 是選用套件：監控程式不需要，只有使用這個分析 API 時才檢查
+    np = None
+
+import packed
+from log_config import get_logger
+from storage import CSV_EXT, LIGHT_ON_VALUES, SERIES_EXT, TIER_MS, SensorStore
+from timestamps import DAY_MS, from_datetime, local_day, now_ms, parse_timestamp
+
+log = get_logger('history')
+
+# 快取目錄（數據目錄下）與副檔名
+CACHE_DIR = os.path.join('cache', 'raw')
+SEGMENT_EXT = '.scol'
+
+# 快取分區的欄位（分類欄位以 uint16 索引儲存，字串放在欄位描述中）
+SEGMENT_COLUMNS = [
+    ('timestamp', 'i64'),
+    ('temperature', 'f64'),
+    ('humidity', 'f64'),
+    ('light_status', 'label16'),
+    ('device', 'label16'),
+]
+SEGMENT_VERSION = 1
+
+# 欄位型別 -> NumPy dtype（little-endian）
+DTYPES = {'i64': '<i8', 'f32': '<f4', 'f64': '<f8', 'u32': '<u4', 'u8': 'u1',
+          'label': 'u1', 'label16': '<u2'}
+
+# resample() 可用的時間桶名稱
+STEPS = {**TIER_MS, '1d': DAY_MS}
+
+
+def _to_ms(value):
+    """時間參數：epoch 毫秒、datetime 或 '%Y-%m-%d %H:%M:%S' 字串"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return from_datetime(value)
+    if isinstance(value, str):
+        return parse_timestamp(value)
+    return int(value)
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('history.py 需要 numpy，請先執行 pip install numpy（或 pip install -e ".[analytics]"）')
+
+
+def _local_offsets(timestamps):
+    """
+    每筆時間戳記的本地時間 UTC 偏移（毫秒）
+
+    與 storage.rollup_samples() 相同，依 timestamps.local_day 的分段取得偏移：
+    日光節約時間切換的那天分為切換前、後兩段。
+    """
+    if not len(timestamps):
+        return np.zeros(0, dtype=np.int64)
+    starts = []
+    offsets = []
+    ms = int(timestamps.min())
+    last = int(timestamps.max())
+    while True:
+        start, end, _, offset = local_day(ms)
+        starts.append(start)
+        offsets.append(offset)
+        if end > last:
+            break
+        ms = end
+    index = np.searchsorted(np.array(starts, dtype=np.int64), timestamps, side='right') - 1
+    return np.array(offsets, dtype=np.int64)[index]
+
+
+class Frame:
+    """
+    欄位名稱 -> NumPy 陣列（長度相同）
+
+    分類欄位（light_status、device）儲存為整數索引，字串表在 labels[欄位名稱]；
+    names(欄位) 取得字串陣列，to_pandas() 轉換為 Categorical。
+    """
+
+    def __init__(self, columns, labels=None):
+        self.columns = dict(columns)
+        self.labels = dict(labels or {})
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), ()))
+
+    def __repr__(self):
+        return f'<Frame {len(self)} 筆: {", ".join(self.columns)}>'
+
+    def keys(self):
+        return self.columns.keys()
+
+    def names(self, column):
+        """分類欄位的字串陣列（object dtype；沒有裝置名稱的數據為 None）"""
+        labels = np.array([label or None for label in self.labels[column]] or [None], dtype=object)
+        return labels[self.columns[column]]
+
+    @property
+    def light_on(self):
+        """每筆數據電燈是否開啟（bool 陣列）"""
+        on = [i for i, label in enumerate(self.labels.get('light_status', [])) if label in LIGHT_ON_VALUES]
+        return np.isin(self.columns['light_status'], on)
+
+    def slice(self, start, stop):
+        """取出連續的一段（NumPy view，不複製）"""
+        return Frame({name: values[start:stop] for name, values in self.columns.items()}, self.labels)
+
+    def take(self, selector):
+        """以 bool 遮罩或索引陣列取出部分數據（複製）"""
+        return Frame({name: values[selector] for name, values in self.columns.items()}, self.labels)
+
+    def resample(self, step):
+        """
+        依時間桶彙總（向量化，結果與 storage.rollup_samples() 相同）
+
+        Args:
+            step: '1m' / '1h' / '1d' 或毫秒；時間桶以本地時間對齊
+
+        Returns:
+            Frame: timestamp / count / temperature_avg / _min / _max /
+                   humidity_avg / _min / _max / light_ratio
+        """
+        step = STEPS.get(step, step)
+        timestamps = self.columns['timestamp']
+        buckets = timestamps - (timestamps + _local_offsets(timestamps)) % step
+        order = None
+        if len(buckets) > 1 and np.any(buckets[1:] < buckets[:-1]):
+            order = np.argsort(buckets, kind='stable')
+            buckets = buckets[order]
+        starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1]))) \
+            if len(buckets) else np.array([], dtype=np.intp)
+        counts = np.diff(np.append(starts, len(buckets)))
+
+        def column(values):
+            return values if order is None else values[order]
+
+        result = {'timestamp': buckets[starts], 'count': counts}
+        for name in ('temperature', 'humidity'):
+            values = column(self.columns[name])
+            if not len(starts):
+                for suffix in ('avg', 'min', 'max'):
+                    result[f'{name}_{suffix}'] = np.array([], dtype=np.float64)
+                continue
+            result[f'{name}_avg'] = np.add.reduceat(values, starts) / counts
+            result[f'{name}_min'] = np.minimum.reduceat(values, starts)
+            result[f'{name}_max'] = np.maximum.reduceat(values, starts)
+        light_on = column(self.light_on).astype(np.float64)
+        result['light_ratio'] = (np.add.reduceat(light_on, starts) / counts
+                                 if len(starts) else np.array([], dtype=np.float64))
+        return Frame(result)
+
+    def aggregate(self, by='device'):
+        """
+        依分類欄位統計（例如各裝置）
+
+        Returns:
+            Frame: by（索引，字串表在 labels）/ count / first / last（時間戳記）/
+                   temperature_avg / _min / _max / humidity_avg / _min / _max / light_ratio
+        """
+        codes, inverse = np.unique(self.columns[by], return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(codes))
+        result = {by: codes, 'count': counts}
+
+        def reduce(ufunc, values, initial):
+            out = np.full(len(codes), initial, dtype=values.dtype)
+            ufunc.at(out, inverse, values)
+            return out
+
+        timestamps = self.columns['timestamp']
+        result['first'] = reduce(np.minimum, timestamps, np.iinfo(np.int64).max)
+        result['last'] = reduce(np.maximum, timestamps, np.iinfo(np.int64).min)
+        for name in ('temperature', 'humidity'):
+            values = self.columns[name]
+            result[f'{name}_avg'] = np.bincount(inverse, weights=values, minlength=len(codes)) / counts
+            result[f'{name}_min'] = reduce(np.minimum, values, np.inf)
+            result[f'{name}_max'] = reduce(np.maximum, values, -np.inf)
+        result['light_ratio'] = np.bincount(inverse, weights=self.light_on, minlength=len(codes)) / counts
+        return Frame(result, {by: self.labels[by]})
+
+    def to_pandas(self):
+        """
+        轉換為 pandas DataFrame（索引為本地時間，分類欄位為 Categorical）
+
+        pandas 只在呼叫時才匯入；數值欄位會複製到 DataFrame 中。
+        """
+        import pandas as pd
+
+        data = {}
+        for name, values in self.columns.items():
+            if name in self.labels:
+                data[name] = pd.Categorical.from_codes(values.astype(np.int32), categories=self.labels[name])
+            else:
+                data[name] = values
+        index = None
+        if 'timestamp' in self.columns:
+            local = datetime.now().astimezone().tzinfo
+            index = pd.to_datetime(self.columns['timestamp'], unit='ms', utc=True).tz_convert(local)
+            index.name = 'time'
+        return pd.DataFrame(data, index=index)
+
+
+def concat(frames):
+    """合併多個 Frame（分類欄位的字串表合併後重新編號）"""
+    frames = [frame for frame in frames if len(frame)] or frames[:1]
+    if len(frames) == 1:
+        return frames[0]
+    first = frames[0]
+    columns = {}
+    labels = {}
+    for name in first.keys():
+        if name not in first.labels:
+            columns[name] = np.concatenate([frame[name] for frame in frames])
+            continue
+        merged = {}
+        pieces = []
+        for frame in frames:
+            mapping = np.array([merged.setdefault(label, len(merged)) for label in frame.labels[name]],
+                               dtype=np.uint32)
+            pieces.append(mapping[frame[name]])
+        codes = np.concatenate(pieces)
+        columns[name] = codes.astype(np.uint16) if len(merged) <= 65536 else codes
+        labels[name] = list(merged)
+    return Frame(columns, labels)
+
+
+def _empty_frame():
+    return Frame({name: np.array([], dtype=DTYPES[kind]) for name, kind in SEGMENT_COLUMNS},
+                 {name: [] for name, kind in SEGMENT_COLUMNS if kind in packed.LABEL_TYPES})
+
+
+def load_segment(buffer):
+    """
+    以欄位式格式的內容（bytes 或 mmap）建立 Frame，各欄位是 buffer 上的 view
+
+    Returns:
+        tuple: (Frame, meta)
+
+    Raises:
+        ValueError: 格式錯誤
+        ImportError: 沒有安裝 numpy
+    """
+    _require_numpy()
+    if len(buffer) < packed.HEADER.size:
+        raise ValueError('資料長度不足')
+    magic, count, length = packed.HEADER.unpack_from(buffer)
+    if magic != packed.MAGIC:
+        raise ValueError('不是欄位式二進位格式')
+    schema = json.loads(bytes(buffer[packed.HEADER.size:packed.HEADER.size + length]))
+    offset = packed.HEADER.size + length
+    columns = {}
+    labels = {}
+    for entry in schema['columns']:
+        dtype = np.dtype(DTYPES[entry['type']])
+        columns[entry['name']] = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+        if 'labels' in entry:
+            labels[entry['name']] = entry['labels']
+        size = dtype.itemsize * count
+        offset += size + (-size % packed.ALIGN)
+    return Frame(columns, labels), schema.get('meta')
+
+
+class History:
+    """
+    數據目錄的分析介面
+
+    Args:
+        data_dir: 數據目錄（與 app_flask.py 的 DATA_DIR 相同）
+        cache: 是否建立 memory map 快取
+    """
+
+    def __init__(self, data_dir='data', cache=True):
+        _require_numpy()
+        self.data_dir = data_dir
+        self.store = SensorStore(data_dir)
+        self.cache_dir = os.path.join(data_dir, CACHE_DIR) if cache else None
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            self.prune()
+
+    def partitions(self, start=None, end=None):
+        """時間範圍內的原始數據分區名稱"""
+        names = self.store.list_partitions('raw')
+        if start is not None:
+            first = self.store.partition_for('raw', start)
+            names = [name for name in names if name >= first]
+        if end is not None:
+            last = self.store.partition_for('raw', end)
+            names = [name for name in names if name <= last]
+        return names
+
+    def _signature(self, partition):
+        """來源檔案的 (副檔名, 大小, 修改時間)，用於判斷快取是否過期"""
+        signature = []
+        for ext in (SERIES_EXT, CSV_EXT):
+            path = self.store.partition_path('raw', partition, ext)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            signature.append([ext, stat.st_size, stat.st_mtime_ns])
+        return signature
+
+    def _build(self, partition, signature):
+        """讀取分區並轉換為欄位式格式（依時間排序）"""
+        rows = sorted(self.store.read_partition('raw', partition), key=lambda s: s['timestamp'])
+        meta = {'version': SEGMENT_VERSION, 'partition': partition, 'source': signature}
+        return packed.pack_columns(rows, SEGMENT_COLUMNS, meta)
+
+    def segment(self, partition):
+        """
+        讀取一個分區（已封存的分區以 memory map 開啟，欄位不複製）
+
+        Returns:
+            Frame: 依時間排序的原始數據
+        """
+        signature = self._signature(partition)
+        active = partition == self.store.partition_for('raw', now_ms())
+        if self.cache_dir is None or active:
+            return load_segment(self._build(partition, signature))[0]
+
+        path = os.path.join(self.cache_dir, partition + SEGMENT_EXT)
+        try:
+            with io.open(path, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            frame, meta = load_segment(buffer)
+            if meta == {'version': SEGMENT_VERSION, 'partition': partition, 'source': signature}:
+                return frame
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            # 不完整或損壞的快取：重新建立
+            log.warning('分析快取無法讀取，重新建立 %s: %s', path, e)
+
+        data = self._build(partition, signature)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = path + '.tmp'
+            with io.open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            log.warning('無法寫入分析快取 %s: %s', path, e)
+        return load_segment(data)[0]
+
+    def segments(self, start=None, end=None, device=None):
+        """
+        逐一讀取時間範圍內的分區（每個分區一個 Frame，沒有篩選裝置時為 memory map 上的 view）
+
+        Yields:
+            tuple: (分區名稱, Frame)
+        """
+        start = _to_ms(start)
+        end = _to_ms(end)
+        for partition in self.partitions(start, end):
+            frame = self.segment(partition)
+            timestamps = frame['timestamp']
+            low = 0 if start is None else np.searchsorted(timestamps, start, 'left')
+            high = len(timestamps) if end is None else np.searchsorted(timestamps, end, 'left')
+            frame = frame.slice(low, high)
+            if device is not None:
+                labels = frame.labels['device']
+                if device not in labels:
+                    continue
+                frame = frame.take(frame['device'] == labels.index(device))
+            if len(frame):
+                yield partition, frame
+
+    def range(self, start=None, end=None, device=None):
+        """
+        讀取時間範圍內的原始數據
+
+        Args:
+            start: 起始時間（含；epoch 毫秒、datetime 或 '%Y-%m-%d %H:%M:%S'，None 表示不限）
+            end: 結束時間（不含）
+            device: 只取這台裝置的數據（None 表示全部）
+
+        Returns:
+            Frame: timestamp（epoch 毫秒）/ temperature / humidity / light_status / device；
+                   只跨一個分區且不篩選裝置時不複製數據
+        """
+        frames = [frame for _, frame in self.segments(start, end, device)]
+        return concat(frames) if frames else _empty_frame()
+
+    def prune(self):
+        """刪除來源分區已不存在的快取"""
+        partitions = set(self.store.list_partitions('raw'))
+        for filename in os.listdir(self.cache_dir):
+            name, ext = os.path.splitext(filename)
+            if ext == SEGMENT_EXT and name not in partitions:
+                try:
+                    os.remove(os.path.join(self.cache_dir, filename))
+                except OSError:
+                    pass
+
+
+def open(data_dir='data', cache=True):
+    """開啟數據目錄（見 History）"""
+    return History(data_dir, cache)
@@ -0,0 +1,481 @@
+"""
+MQTT 訊息接收流程
+MQTT 回調只負責將訊息放入佇列，由背景執行緒解析、寫入數據分區並通知前端
+
+    MQTT 執行緒 --submit()--> 佇列 --> 背景執行緒: 解析 -> 儲存 -> on_sample()
+"""
+
+import json
+import math
+import queue
+import threading
+import time
+from datetime import datetime
+
+import metrics
+from latency import TRACKER
+from log_config import get_logger, SampledLogger
+from timestamps import from_datetime, now_ms
+
+log = get_logger('ingest')
+sampled_log = SampledLogger(log)
+
+# 佇列上限：broker 短時間大量補送時避免記憶體無限成長
+QUEUE_SIZE = 10000
+
+# 裝置訊息中代表序號的欄位名稱
+SEQ_FIELDS = ('seq', 'msg_id', 'message_id')
+
+# 裝置時間與收到時間相差超過這個秒數時，視為裝置尚未校時，改用收到的時間
+MAX_CLOCK_SKEW = 300
+
+
+# 批次訊息中讀值 age 的上限（秒）：超過時視為格式錯誤，避免回推出遠離收到時間的取樣時間
+# （pico/duty_cycle.py 最多緩衝 MAX_BUFFER = 120 筆，取樣間隔 1 小時也在範圍內）
+MAX_BATCH_AGE = 7 * 24 * 3600
+
+# 電燈狀態字串的長度上限（字元）
+LIGHT_STATUS_MAX = 32
+
+# 裝置第一筆訊息缺少欄位時使用的預設值
+SAMPLE_DEFAULTS = {
+    'light_status': '未知',
+    'temperature': 0.0,
+    'humidity': 0.0,
+}
+
+
+def decode_payload(payload):
+    """
+    解析感測器 JSON 訊息
+
+    裝置採用例外回報（數值超過門檻才發布）時，訊息可能只包含有變化的欄位，
+    缺少的數值欄位回傳 None，由 IngestPipeline 沿用該裝置上一筆的值。
+
+    低功耗裝置批次回報時，訊息帶有 samples 列表（每筆含 age：發布前幾秒取樣），
+    解析結果放在 batch，並附上各工作週期的清醒時間 awake_ms。
+
+    裝置的取樣時間可放在 ts（epoch 毫秒）或 timestamp（ISO 8601 字串），
+    解析為 captured_at（epoch 毫秒）；沒有或無法解析時為 None。
+
+    Args:
+        payload: MQTT 訊息內容（bytes 或 str）
+
+    Returns:
+        dict: 包含 light_status / temperature / humidity / device / seq / boot / heartbeat /
+              batch / awake_ms / captured_at 的字典
+
+    Raises:
+        ValueError: 內容不是 JSON 物件、device 或 light_status 格式錯誤、批次讀值的 age 超出範圍，
+            或數值欄位無法轉換（包含 NaN、Infinity 與超出範圍的數值）
+    """
+    if isinstance(payload, bytes):
+        payload = payload.decode('utf-8')
+    data_dict = json.loads(payload)
+    if not isinstance(data_dict, dict):
+        raise ValueError('訊息內容必須是 JSON 物件')
+
+    sample = _decode_values(data_dict)
+    sample.update({
+        'device': _device_name(data_dict.get('device')),
+        'seq': _first_of(data_dict, SEQ_FIELDS),
+        'boot': data_dict.get('boot'),
+        'heartbeat': bool(data_dict.get('heartbeat')),
+        'batch': None,
+        'awake_ms': [_finite(ms) for ms in data_dict.get('awake_ms') or ()],
+        'captured_at': _capture_time(data_dict)
+    })
+
+    samples = data_dict.get('samples')
+    if samples is not None:
+        if not isinstance(samples, list) or not all(isinstance(s, dict) for s in samples):
+            raise ValueError('samples 必須是 JSON 物件列表')
+        batch = []
+        for entry in samples:
+            values = _decode_values(entry)
+            age = _finite(entry.get('age', 0))
+            if not 0 <= age <= MAX_BATCH_AGE:
+                raise ValueError(f'age 必須介於 0 ~ {MAX_BATCH_AGE} 秒: {age!r}')
+            values['age'] = age
+            batch.append(values)
+        sample['batch'] = batch
+    return sample
+
+
+def decode_button_event(payload):
+    """
+    解析按鈕事件訊息（lesson8/lesson18_3.py 發送）
+
+    Returns:
+        dict: 包含 device / button / event / led / ticks_us 的字典
+
+    Raises:
+        ValueError: 內容不是 JSON 物件或缺少 event 欄位
+    """
+    if isinstance(payload, bytes):
+        payload = payload.decode('utf-8')
+    data_dict = json.loads(payload)
+    if not isinstance(data_dict, dict) or 'event' not in data_dict:
+        raise ValueError('按鈕事件必須是包含 event 的 JSON 物件')
+    return {
+        'device': _device_name(data_dict.get('device')),
+        'button': data_dict.get('button'),
+        'event': str(data_dict['event']),
+        'led': data_dict.get('led'),
+        'ticks_us': data_dict.get('ticks_us')
+    }
+
+
+# 裝置診斷訊息的數值欄位（pico/telemetry.py 的 LoopDiagnostics）
+DIAGNOSTIC_FIELDS = ('mem_free', 'mem_min_free', 'gc_collections', 'gc_auto',
+                     'gc_max_us', 'loop_max_us', 'loops')
+# 診斷數值的上限（不含）：超過的值視為格式錯誤，不寫入監控指標
+DIAGNOSTIC_MAX = 2 ** 53
+
+
+def decode_diagnostics(payload):
+    """
+    解析裝置診斷訊息（devices/<id>/diag）
+
+    Returns:
+        dict: DIAGNOSTIC_FIELDS 的整數值（缺少的欄位為 None）與 device（字串或 None）
+
+    Raises:
+        ValueError: 內容不是 JSON 物件、device 格式錯誤，或數值欄位不是範圍內的非負整數
+    """
+    if isinstance(payload, bytes):
+        payload = payload.decode('utf-8')
+    data_dict = json.loads(payload)
+    if not isinstance(data_dict, dict):
+        raise ValueError('診斷訊息必須是 JSON 物件')
+    result = {'device': _device_name(data_dict.get('device'))}
+    for key in DIAGNOSTIC_FIELDS:
+        value = data_dict.get(key)
+        result[key] = None if value is None else _counter_value(key, value)
+    return result
+
+
+def _counter_value(key, value):
+    """
+    診斷欄位的數值：非負整數（整數值的浮點數也接受）且小於 DIAGNOSTIC_MAX
+
+    Raises:
+        ValueError: 不是數字、不是整數值、NaN / Infinity 或超出範圍
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f'{key} 必須是數字: {value!r}')
+    if isinstance(value, float):
+        if not _finite(value).is_integer():
+            raise ValueError(f'{key} 必須是整數: {value!r}')
+        value = int(value)
+    if not 0 <= value < DIAGNOSTIC_MAX:
+        raise ValueError(f'{key} 超出範圍: {value!r}')
+    return value
+
+
+def _device_name(value):
+    """
+    裝置名稱一律以字串處理（整數 id 轉為字串），裝置總覽的搜尋、排序與延遲統計才能比較
+
+    Returns:
+        str: 裝置名稱；未提供時回傳 None
+
+    Raises:
+        ValueError: 不是字串或整數（例如列表、物件、布林）
+    """
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, int) and not isinstance(value, bool):
+        return str(value)
+    raise ValueError(f'device 必須是字串或整數: {value!r}')
+
+
+def _capture_time(data_dict):
+    """取得裝置的取樣時間（epoch 毫秒）"""
+    ts = data_dict.get('ts')
+    if isinstance(ts, (int, float)) and not isinstance(ts, bool):
+        try:
+            return int(_finite(ts))
+        except ValueError:
+            return None
+    timestamp = data_dict.get('timestamp')
+    if isinstance(timestamp, str):
+        try:
+            return from_datetime(datetime.fromisoformat(timestamp))
+        except ValueError:
+            return None
+    return None
+
+
+def _decode_values(data_dict):
+    """解析數值欄位，缺少的欄位回傳 None"""
+    temperature = _first_of(data_dict, ('temperature', 'temp'))
+    humidity = _first_of(data_dict, ('humidity', 'humi'))
+    return {
+        'light_status': _light_status(_first_of(data_dict, ('light_status', 'light'))),
+        'temperature': None if temperature is None else _finite(temperature),
+        'humidity': None if humidity is None else _finite(humidity)
+    }
+
+
+def _light_status(value):
+    """
+    電燈狀態必須是不含控制字元的短字串
+
+    列表等其他型別在記憶體中與寫入 CSV 後的值不同；換行字元會讓 CSV 欄位跨行，
+    tail_lines / read_appended 逐行讀取時會讀錯。
+
+    Returns:
+        str: 電燈狀態；未提供時回傳 None
+
+    Raises:
+        ValueError: 不是字串、包含控制字元或超過 LIGHT_STATUS_MAX 個字元
+    """
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f'light_status 必須是字串: {value!r}')
+    if len(value) > LIGHT_STATUS_MAX:
+        raise ValueError(f'light_status 超過 {LIGHT_STATUS_MAX} 個字元')
+    if any(ord(ch) < 32 or ord(ch) == 127 for ch in value):
+        raise ValueError(f'light_status 不可包含控制字元: {value!r}')
+    return value
+
+
+def _finite(value):
+    """
+    轉換為有限的浮點數
+
+    Raises:
+        ValueError: 無法轉換、NaN / Infinity（JSON 的 1e400 解析為 Infinity）或超出浮點數範圍
+    """
+    try:
+        number = float(value)
+    except OverflowError:
+        raise ValueError(f'數值超出範圍: {value!r}') from None
+    if not math.isfinite(number):
+        raise ValueError(f'數值必須是有限的數字: {value!r}')
+    return number
+
+
+def _first_of(data_dict, keys):
+    """回傳第一個存在的欄位值"""
+    for key in keys:
+        if key in data_dict:
+            return data_dict[key]
+    return None
+
+
+class SequenceTracker:
+    """
+    依裝置序號去除重複訊息
+
+    QoS 1 保證「至少一次」送達，broker 重啟或重新連線後可能重送同一則訊息。
+    每個裝置記錄最大序號與最近 window 個序號的位元遮罩，可容忍亂序送達。
+    裝置可在訊息中附帶 boot（每次開機隨機產生），開機後序號重新計算；
+    沒有 boot 時，序號大幅倒退也視為裝置重新開機。
+    """
+
+    def __init__(self, window=64):
+        self.window = window
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def is_duplicate(self, device, seq, boot=None):
+        """
+        檢查並記錄序號
+
+        Returns:
+            bool: 該裝置已處理過此序號時回傳 True
+        """
+        with self._lock:
+            state = self._state.get(device)
+            if state is None or state[2] != boot:
+                self._state[device] = [seq, 1, boot]
+                return False
+
+            highest, seen, _ = state
+            if seq > highest:
+                shift = seq - highest
+                seen = ((seen << shift) | 1) & ((1 << self.window) - 1) if shift < self.window else 1
+                self._state[device] = [seq, seen, boot]
+                return False
+
+            offset = highest - seq
+            if offset >= self.window:
+                # 序號倒退太多：裝置重新開機
+                self._state[device] = [seq, 1, boot]
+                return False
+            if seen & (1 << offset):
+                return True
+            state[1] = seen | (1 << offset)
+            return False
+
+
+class IngestPipeline:
+    """
+    非阻塞的訊息接收流程
+
+    Args:
+        store: SensorStore 物件
+        on_sample: 每筆數據儲存後呼叫的函式 on_sample(sample)
+    """
+
+    def __init__(self, store, on_sample=None, maxsize=QUEUE_SIZE):
+        self.store = store
+        self.on_sample = on_sample
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self.sequences = SequenceTracker()
+        self._last = {}  # 裝置 -> 上一筆數據，用於補齊沒有變化的欄位
+        metrics.INGEST_QUEUE_DEPTH.set_function(self.qsize)
+
+    def submit(self, topic, payload, received_at=None):
+        """
+        放入一則訊息（在 MQTT 執行緒中呼叫，不會阻塞）
+
+        Args:
+            topic: MQTT 主題
+            payload: 訊息內容
+            received_at: 收到時間（epoch 毫秒，預設現在）
+
+        Returns:
+            bool: 佇列已滿而丟棄時回傳 False
+        """
+        metrics.MESSAGES_RECEIVED.inc(topic)
+        received_at = received_at or now_ms()
+        try:
+            self._queue.put_nowait((topic, payload, received_at))
+            return True
+        except queue.Full:
+            metrics.MESSAGES_REJECTED.inc(metrics.REJECT_QUEUE_FULL)
+            sampled_log.warning('queue_full', '⚠️  接收佇列已滿，丟棄訊息 (topic=%s)', topic)
+            return False
+
+    def device_label(self, device):
+        """監控指標的裝置標籤：還沒有儲存過數據的裝置為 metrics.OTHER_LABEL"""
+        return device if device in self._last else metrics.OTHER_LABEL
+
+    def qsize(self):
+        """佇列中尚未處理的訊息數"""
+        return self._queue.qsize()
+
+    def start(self):
+        """啟動背景處理執行緒"""
+        self._thread = threading.Thread(target=self._run, daemon=True, name='ingest')
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """處理完佇列中的訊息後停止"""
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def join(self):
+        """等待佇列中的訊息全部處理完畢"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self.process(*item)
+            except Exception as e:
+                # 任何一則訊息的錯誤都不能讓接收執行緒結束，否則佇列填滿後不再儲存數據
+                metrics.MESSAGES_REJECTED.inc(metrics.REJECT_PROCESS)
+                sampled_log.exception('process_error', '處理訊息時發生錯誤，丟棄訊息: %s (topic=%s)', e, item[0])
+            finally:
+                self._queue.task_done()
+
+    def process(self, topic, payload, received_at):
+        """
+        解析並儲存一則訊息
+
+        Returns:
+            dict: 儲存的數據（批次訊息回傳最後一筆）；解析失敗或重複訊息回傳 None
+        """
+        ingest_at = time.time()
+        start = time.perf_counter()
+        try:
+            sample = decode_payload(payload)
+        except (ValueError, TypeError, OverflowError, UnicodeDecodeError) as e:
+            metrics.MESSAGES_REJECTED.inc(metrics.REJECT_DECODE)
+            sampled_log.warning('decode_error', '處理訊息錯誤: %s (topic=%s)', e, topic)
+            return None
+        metrics.DECODE_SECONDS.observe(time.perf_counter() - start, topic)
+        metrics.MESSAGES_DECODED.inc(topic)
+        sampled_log.debug('message', '📨 收到訊息: %s', payload)
+
+        # 未提供裝置名稱時以主題區分來源
+        if sample['device'] is None:
+            sample['device'] = topic
+        seq = sample.pop('seq')
+        boot = sample.pop('boot')
+        batch = sample.pop('batch')
+        awake_ms = sample.pop('awake_ms')
+        captured_at = sample.pop('captured_at')
+        if isinstance(seq, int) and self.sequences.is_duplicate(sample['device'], seq, boot):
+            metrics.INGEST_DUPLICATES.inc(sample['device'])
+            sampled_log.info('duplicate', '略過重複訊息 (device=%s, seq=%s)', sample['device'], seq)
+            return None
+
+        if sample.pop('heartbeat'):
+            metrics.INGEST_HEARTBEATS.inc(sample['device'])
+        for ms in awake_ms:
+            metrics.DEVICE_AWAKE_SECONDS.observe(ms / 1000, sample['device'])
+
+        if batch is None:
+            device = sample['device']
+            TRACKER.record(device, 'broker_to_ingest', ingest_at - received_at / 1000)
+            sampled_at = received_at
+            if captured_at is not None:
+                skew = received_at - captured_at
+                if abs(skew) <= MAX_CLOCK_SKEW * 1000:
+                    # 已校時的裝置：以取樣時間為準，並記錄感測到 broker 的延遲
+                    TRACKER.record(device, 'sensor_to_broker', skew / 1000)
+                    sampled_at = captured_at
+                else:
+                    sampled_log.info('clock_skew', '裝置時間誤差過大，改用收到的時間 (device=%s, 誤差 %.1f 秒)',
+                                     device, skew / 1000)
+            stored = self._store(sample, sampled_at)
+            TRACKER.record(device, 'ingest_to_emit', time.time() - ingest_at)
+            return stored
+
+        # 批次訊息：依 age 回推每筆的取樣時間，逐筆儲存
+        stored = None
+        for entry in batch:
+            age = entry.pop('age')
+            item = dict(sample)
+            item.update(entry)
+            stored = self._store(item, received_at - round(age * 1000))
+        return stored
+
+    def _store(self, sample, sampled_at):
+        """補齊欄位後寫入數據分區並通知前端（sampled_at 為 epoch 毫秒）"""
+        self._fill_unchanged(sample)
+
+        sample['timestamp'] = sampled_at
+
+        try:
+            with metrics.STORAGE_WRITE_SECONDS.time():
+                self.store.append(sample)
+        except (OSError, ValueError) as e:
+            # ValueError：時間戳記無法轉換為本地日期（分區名稱）
+            log.error('寫入數據分區失敗: %s', e)
+
+        if self.on_sample is not None:
+            try:
+                self.on_sample(sample)
+            except Exception as e:
+                log.exception('處理數據時發生錯誤: %s', e)
+        return sample
+
+    def _fill_unchanged(self, sample):
+        """訊息中缺少的欄位視為「沒有變化」，沿用該裝置上一筆的值"""
+        last = self._last.get(sample['device'], SAMPLE_DEFAULTS)
+        for key, value in last.items():
+            if sample[key] is None:
+                sample[key] = value
+        self._last[sample['device']] = {key: sample[key] for key in SAMPLE_DEFAULTS}
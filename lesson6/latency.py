@@ -0,0 +1,55 @@
+"""
+端到端延遲追蹤
+將一筆數據從感測到顯示在瀏覽器的時間拆成四個階段，依裝置分別記錄：
+
+    sensor_to_broker   裝置取樣時間 (ts) -> 監控程式的 MQTT 執行緒收到訊息
+                       （需要裝置先完成校時，見 timesync.py）
+    broker_to_ingest   MQTT 執行緒收到 -> 背景執行緒開始處理（佇列等待時間）
+    ingest_to_emit     開始處理 -> 解析、寫入分區並推送到瀏覽器完成
+    emit_to_ack        推送 -> 瀏覽器回傳 data_ack
+
+各階段記錄到 /metrics 的 latency_stage_seconds，並保留最近的數值供 /api/latency 計算百分位數。
+"""
+
+import threading
+
+import metrics
+
+STAGES = ('sensor_to_broker', 'broker_to_ingest', 'ingest_to_emit', 'emit_to_ack')
+
+
+class LatencyTracker:
+    """依 (裝置, 階段) 記錄延遲"""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def record(self, device, stage, seconds):
+        """記錄一筆延遲（負值來自時鐘誤差，以 0 計算）"""
+        seconds = max(0.0, seconds)
+        metrics.LATENCY_STAGE_SECONDS.observe(seconds, device, stage)
+        key = (device, stage)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                window = self._windows[key] = metrics.LatencyWindow(self.window)
+        window.add(seconds)
+
+    def summary(self):
+        """
+        各裝置各階段的百分位數
+
+        Returns:
+            dict: {裝置: {階段: {'count', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms'}}}
+        """
+        with self._lock:
+            items = list(self._windows.items())
+        result = {}
+        for (device, stage), window in sorted(items):
+            result.setdefault(device, {})[stage] = window.percentiles()
+        return result
+
+
+TRACKER = LatencyTracker()
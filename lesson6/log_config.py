@@ -0,0 +1,65 @@
+"""
+日誌設定
+以環境變數控制日誌等級，並提供「抽樣」日誌，避免每則訊息都寫入 stdout / journal
+
+環境變數：
+    LOG_LEVEL         日誌等級（DEBUG / INFO / WARNING，預設 INFO）
+    LOG_SAMPLE_EVERY  抽樣日誌每幾筆輸出一次（預設 100）
+"""
+
+import logging
+import os
+import threading
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+
+def get_logger(name='monitor'):
+    """取得已設定等級與格式的 logger"""
+    root = logging.getLogger()
+    if not root.handlers:
+        logging.basicConfig(format=LOG_FORMAT)
+    logger = logging.getLogger(name)
+    logger.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    return logger
+
+
+class SampledLogger:
+    """
+    抽樣日誌：同一個 key 每 N 筆只輸出一次
+
+    使用方式：
+        log = SampledLogger(get_logger('ingest'))
+        log.info('message', '收到訊息: %s', payload)
+    """
+
+    def __init__(self, logger, every=None):
+        self.logger = logger
+        self.every = every or int(os.environ.get('LOG_SAMPLE_EVERY', '100'))
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def log(self, level, key, msg, *args, exc_info=False):
+        """依抽樣頻率輸出日誌（第 1 筆與之後每 N 筆）"""
+        if not self.logger.isEnabledFor(level):
+            return
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % self.every == 0:
+            if count:
+                msg = f'{msg} (已略過 {self.every - 1} 筆)'
+            self.logger.log(level, msg, *args, exc_info=exc_info)
+
+    def debug(self, key, msg, *args):
+        self.log(logging.DEBUG, key, msg, *args)
+
+    def info(self, key, msg, *args):
+        self.log(logging.INFO, key, msg, *args)
+
+    def warning(self, key, msg, *args):
+        self.log(logging.WARNING, key, msg, *args)
+
+    def exception(self, key, msg, *args):
+        """ERROR 等級並附上例外的 traceback（在 except 區塊中呼叫）"""
+        self.log(logging.ERROR, key, msg, *args, exc_info=True)
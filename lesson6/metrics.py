@@ -0,0 +1,328 @@
+"""
+Prometheus 格式的監控指標
+提供 Counter / Gauge / Histogram 三種指標，並輸出 /metrics 所需的文字格式
+
+不依賴 prometheus_client，所有指標皆為執行緒安全。
+"""
+
+import bisect
+import threading
+import time
+from collections import deque
+
+# 預設的延遲直方圖區間（秒）
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_labels(label_names, label_values, extra=None):
+    """將標籤轉換為 {name="value",...} 格式"""
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return '{' + body + '}'
+
+
+def _format_value(value):
+    """數值輸出格式（整數不帶小數點）"""
+    if isinstance(value, float) and value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """指標基底類別，處理標籤與註冊"""
+
+    kind = ''
+
+    def __init__(self, name, documentation, labels=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        # 沒有標籤的指標一開始就輸出 0
+        if not self.label_names:
+            self._values[()] = self._initial()
+        (registry or REGISTRY).register(self)
+
+    def _initial(self):
+        return 0
+
+    def _key(self, label_values):
+        if len(label_values) != len(self.label_names):
+            raise ValueError(f'{self.name} 需要標籤 {self.label_names}')
+        return tuple(str(v) for v in label_values)
+
+    def render(self):
+        """輸出 Prometheus 文字格式"""
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        labels = _format_labels(self.label_names, key)
+        return [f'{self.name}{labels} {_format_value(value)}']
+
+
+class Counter(_Metric):
+    """只會增加的計數器"""
+
+    kind = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        key = self._key(label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, *label_values):
+        return self._values.get(self._key(label_values), 0)
+
+
+class Gauge(_Metric):
+    """可增可減的量測值"""
+
+    kind = 'gauge'
+
+    def set_function(self, function):
+        """輸出指標時才呼叫 function() 取值（只適用於沒有標籤的指標）"""
+        self._function = function
+
+    def render(self):
+        function = getattr(self, '_function', None)
+        if function is not None:
+            self.set(function())
+        return super().render()
+
+    def set(self, value, *label_values):
+        key = self._key(label_values)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *label_values, amount=1):
+        key = self._key(label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def get(self, *label_values):
+        return self._values.get(self._key(label_values), 0)
+
+
+class Histogram(_Metric):
+    """
+    直方圖（累積區間計數 + 總和 + 筆數）
+
+    使用方式：
+        DECODE_SECONDS.observe(0.0012, 'living_room/sensor')
+        with DECODE_SECONDS.time('living_room/sensor'):
+            ...
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS,
+                 registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labels, registry)
+
+    def _initial(self):
+        return [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+    def observe(self, value, *label_values):
+        key = self._key(label_values)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = self._initial()
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *label_values):
+        """以 with 區塊量測執行時間"""
+        return _Timer(self, label_values)
+
+    def count(self, *label_values):
+        state = self._values.get(self._key(label_values))
+        return state[2] if state else 0
+
+    def _render_value(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.label_names, key, ('le', _format_value(bound)))
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.label_names, key)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class _Timer:
+    """Histogram.time() 使用的計時器"""
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+        return False
+
+
+class Registry:
+    """指標註冊表"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        """輸出所有指標的 Prometheus 文字格式"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class LatencyWindow:
+    """
+    最近 N 筆延遲的百分位數
+
+    Histogram 的區間是固定的，適合長期趨勢；這裡保留最近的原始數值，
+    用於 API 直接回傳 p50 / p90 / p99 等精確百分位數。
+    """
+
+    def __init__(self, size=1000):
+        self._values = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._values.append(seconds)
+
+    def percentiles(self, points=(50, 90, 99)):
+        """
+        計算百分位數
+
+        Returns:
+            dict: {'count': 筆數, 'p50_ms': ..., 'max_ms': ...}，沒有數據時百分位數為 None
+        """
+        with self._lock:
+            values = sorted(self._values)
+        result = {'count': len(values)}
+        for point in points:
+            key = f'p{point}_ms'
+            if not values:
+                result[key] = None
+                continue
+            index = min(len(values) - 1, int(len(values) * point / 100))
+            result[key] = round(values[index] * 1000, 3)
+        result['max_ms'] = round(values[-1] * 1000, 3) if values else None
+        return result
+
+
+REGISTRY = Registry()
+
+# 裝置名稱來自客戶端時，不認識的裝置一律以這個標籤記錄，避免任意名稱建立無限多的時間序列
+OTHER_LABEL = 'other'
+
+# Prometheus 文字格式的 Content-Type
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# ---------- 監控應用程式使用的指標 ----------
+
+MESSAGES_RECEIVED = Counter(
+    'mqtt_messages_received_total', '收到的 MQTT 訊息數', ['topic'])
+MESSAGES_DECODED = Counter(
+    'mqtt_messages_decoded_total', '成功解析的 MQTT 訊息數', ['topic'])
+# 丟棄訊息的原因（MESSAGES_REJECTED 的 reason 標籤只使用這些值，不以主題作為標籤）
+REJECT_DECODE = 'decode_error'      # 內容格式錯誤
+REJECT_QUEUE_FULL = 'queue_full'    # 接收佇列已滿
+REJECT_PROCESS = 'process_error'    # 處理時發生未預期的錯誤
+REJECT_CALLBACK = 'callback_error'  # MQTT 回調拋出例外
+
+MESSAGES_REJECTED = Counter(
+    'mqtt_messages_rejected_total', '丟棄的 MQTT 訊息數（依原因）', ['reason'])
+MQTT_RECONNECTS = Counter(
+    'mqtt_reconnects_total', 'MQTT 重新連線次數')
+MQTT_REDELIVERIES = Counter(
+    'mqtt_redeliveries_total', 'broker 重送（DUP 旗標）的訊息數（依訂閱的主題）', ['subscription'])
+INGEST_DUPLICATES = Counter(
+    'ingest_duplicates_total', '依裝置序號判定為重複而略過的訊息數', ['device'])
+BUTTON_EVENTS = Counter(
+    'button_events_total', '收到的按鈕事件數', ['device', 'event'])
+COMMANDS_SENT = Counter(
+    'commands_sent_total', '送到裝置的控制指令數', ['device', 'action'])
+COMMAND_ACKS = Counter(
+    'command_acks_total', '控制指令的結果（ok / error / timeout）', ['device', 'result'])
+TIME_SYNC_REQUESTS = Counter(
+    'time_sync_requests_total', '裝置的校時請求數', ['device'])
+INGEST_HEARTBEATS = Counter(
+    'ingest_heartbeats_total', '數據沒有變化時裝置送出的心跳訊息數', ['device'])
+CHART_REQUESTS = Counter(
+    'chart_requests_total', '伺服器端圖表的請求數（cache = hit / miss）', ['format', 'cache'])
+
+DECODE_SECONDS = Histogram(
+    'ingest_decode_seconds', '訊息解析時間', ['topic'])
+STORAGE_WRITE_SECONDS = Histogram(
+    'storage_write_seconds', '寫入數據分區的時間')
+EMIT_SECONDS = Histogram(
+    'socketio_emit_seconds', 'Socket.IO 推送時間', ['event'])
+COMMAND_RTT_SECONDS = Histogram(
+    'command_rtt_seconds', '控制指令從送出到收到裝置確認的時間', ['device'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+LATENCY_STAGE_SECONDS = Histogram(
+    'latency_stage_seconds', '數據從感測到瀏覽器各階段的延遲', ['device', 'stage'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0))
+TIME_SYNC_DELAY_SECONDS = Histogram(
+    'time_sync_delay_seconds', '裝置回報的校時來回延遲', ['device'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+DEVICE_AWAKE_SECONDS = Histogram(
+    'device_awake_seconds', '低功耗裝置每個工作週期的清醒時間', ['device'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+
+INGEST_QUEUE_DEPTH = Gauge(
+    'ingest_queue_depth', '等待處理的訊息數')
+MQTT_CONNECTED = Gauge(
+    'mqtt_connected', 'MQTT 是否已連線（1 = 已連線）')
+SOCKETIO_CLIENTS = Gauge(
+    'socketio_connected_clients', '目前連線的瀏覽器數')
+DEVICE_MEM_FREE_BYTES = Gauge(
+    'device_mem_free_bytes', '裝置回報的 gc.mem_free()（current / min）', ['device', 'kind'])
+DEVICE_GC_COLLECTIONS = Gauge(
+    'device_gc_collections', '裝置開機以來的記憶體回收次數（explicit / auto）', ['device', 'kind'])
+DEVICE_GC_MAX_SECONDS = Gauge(
+    'device_gc_max_seconds', '裝置上一期最長的主動回收時間', ['device'])
+DEVICE_LOOP_MAX_SECONDS = Gauge(
+    'device_loop_max_seconds', '裝置上一期最長的主迴圈時間', ['device'])
+STARTUP_SECONDS = Gauge(
+    'startup_seconds', '程序啟動到各啟動項目完成的秒數（history / ingest / ready）', ['phase'])
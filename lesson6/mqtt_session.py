@@ -0,0 +1,187 @@
+"""
+MQTT 連線管理
+負責連線、斷線偵測與自動重新連線（指數退避 + 隨機抖動），並使用持久化 session，
+讓 broker 在短暫斷線期間保留 QoS 1 訊息，重新連線後補送
+
+    session = MqttSession('localhost', 1883, 'mqtt-monitor', ['living_room/sensor'], on_message)
+    session.start()
+"""
+
+import random
+import threading
+
+import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+import metrics
+from log_config import get_logger
+
+log = get_logger('mqtt')
+
+# 斷線期間 broker 保留 session（訂閱與未送達的 QoS 1 訊息）的秒數
+SESSION_EXPIRY = 3600
+
+# broker 同時送給我們、尚未確認的 QoS 1 訊息上限
+MAX_INFLIGHT = 100
+
+# 重新連線的退避時間（秒）
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """
+    計算第 attempt 次重試前的等待時間（full jitter 指數退避）
+
+    在 0 ~ min(cap, base * 2^attempt) 之間隨機取值，
+    避免多個客戶端在 broker 重啟後同時重新連線。
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class MqttSession:
+    """
+    具自動重新連線的 MQTT 訂閱者
+
+    Args:
+        broker: Broker 位址
+        port: Broker 連接埠
+        client_id: 固定的 client id（持久化 session 需要）
+        topics: 要訂閱的主題列表
+        on_message: 收到訊息時呼叫 on_message(topic, payload)
+        protocol: 5 使用 MQTT v5 session expiry，4 使用 v3.1.1 clean_session=False
+    """
+
+    def __init__(self, broker, port, client_id, topics, on_message,
+                 protocol=5, keepalive=60, session_expiry=SESSION_EXPIRY,
+                 max_inflight=MAX_INFLIGHT):
+        self.broker = broker
+        self.port = port
+        self.topics = list(topics)
+        self.on_message = on_message
+        self.protocol = protocol
+        self.connected = False
+        self._attempt = 0
+        self._connect_count = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        if protocol == 5:
+            self.client = mqtt.Client(
+                callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+                client_id=client_id,
+                protocol=mqtt.MQTTv5
+            )
+            self.client.max_inflight_messages_set(max_inflight)
+            properties = Properties(PacketTypes.CONNECT)
+            properties.SessionExpiryInterval = session_expiry
+            properties.ReceiveMaximum = max_inflight
+            self.client.connect_async(broker, port, keepalive,
+                                      clean_start=False, properties=properties)
+        else:
+            self.client = mqtt.Client(
+                callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+                client_id=client_id,
+                clean_session=False,
+                protocol=mqtt.MQTTv311
+            )
+            self.client.max_inflight_messages_set(max_inflight)
+            self.client.connect_async(broker, port, keepalive)
+
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
+        metrics.MQTT_CONNECTED.set_function(lambda: 1 if self.connected else 0)
+
+    def start(self):
+        """在背景執行緒中連線並持續處理訊息"""
+        self._thread = threading.Thread(target=self._run, daemon=True, name='mqtt')
+        self._thread.start()
+
+    def stop(self):
+        """中斷連線並停止背景執行緒"""
+        self._stop_event.set()
+        self.client.disconnect()
+        if self._thread is not None:
+            self._thread.join(5)
+
+    def publish(self, topic, payload, qos=1):
+        """發布訊息（未連線時由 paho 暫存，連線後送出）"""
+        return self.client.publish(topic, payload, qos=qos)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.client.reconnect()
+            except OSError as e:
+                self._wait_backoff(f"MQTT 連線失敗: {e}")
+                continue
+
+            # 處理網路事件，直到連線中斷
+            while not self._stop_event.is_set():
+                try:
+                    rc = self.client.loop(timeout=1.0)
+                except Exception as e:
+                    # paho 會把回調中的例外從 loop() 拋出；不能讓執行緒結束，中斷後重新連線
+                    log.exception("MQTT 處理網路事件時發生錯誤: %s", e)
+                    self.client.disconnect()
+                    break
+                if rc != mqtt.MQTT_ERR_SUCCESS:
+                    break
+
+            if not self._stop_event.is_set():
+                self.connected = False
+                self._wait_backoff("MQTT 連線中斷")
+
+    def subscription_for(self, topic):
+        """
+        主題所屬的訂閱（監控指標的標籤）
+
+        萬用字元訂閱（例如 devices/+/ack）下的主題由客戶端決定，直接作為標籤會讓時間序列無限增加；
+        以訂閱的主題代表，數量固定。沒有符合的訂閱時回傳 'other'。
+        """
+        for subscription in self.topics:
+            if mqtt.topic_matches_sub(subscription, topic):
+                return subscription
+        return 'other'
+
+    def _wait_backoff(self, reason):
+        """等待退避時間後再重試"""
+        delay = backoff_delay(self._attempt)
+        self._attempt += 1
+        log.warning("%s，%.1f 秒後重試 (第 %d 次)", reason, delay, self._attempt)
+        self._stop_event.wait(delay)
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            log.error("❌ MQTT 連線失敗: %s", reason_code)
+            self.connected = False
+            return
+
+        self.connected = True
+        self._attempt = 0
+        if self._connect_count:
+            metrics.MQTT_RECONNECTS.inc()
+        self._connect_count += 1
+        log.info("✅ MQTT 連線成功 (session_present=%s)", flags.session_present)
+
+        # 重新訂閱不會影響已存在的 session，確保 broker 端 session 過期後仍能收到訊息
+        for topic in self.topics:
+            client.subscribe(topic, qos=1)
+            log.info("✅ 已訂閱主題: %s", topic)
+
+    def _on_disconnect(self, client, userdata, disconnect_flags, reason_code, properties):
+        self.connected = False
+        if not self._stop_event.is_set():
+            log.warning("⚠️  MQTT 已斷線: %s", reason_code)
+
+    def _on_message(self, client, userdata, message):
+        if message.dup:
+            metrics.MQTT_REDELIVERIES.inc(self.subscription_for(message.topic))
+        try:
+            self.on_message(message.topic, message.payload)
+        except Exception as e:
+            # 單一訊息的錯誤只丟棄該訊息，MQTT 執行緒繼續處理後續訊息
+            metrics.MESSAGES_REJECTED.inc(metrics.REJECT_CALLBACK)
+            log.exception("處理 MQTT 訊息時發生錯誤，丟棄訊息: %s (topic=%s)", e, message.topic)
@@ -0,0 +1,241 @@
+"""
+緊湊的二進位編碼（瀏覽器可選用，預設仍為 JSON）
+
+歷史數據：欄位式（columnar）格式，每個欄位是一段連續的 little-endian 陣列，
+瀏覽器直接以 BigInt64Array / Float32Array / Uint8Array 包裝，不需要逐筆解析：
+
+    0   'SCOL'                      魔術字
+    4   uint32 筆數 n
+    8   uint32 欄位描述長度 L
+    12  欄位描述 JSON（以空白補齊到 8 的倍數）
+        {"columns": [{"name": "timestamp", "type": "i64"},
+                     {"name": "light_status", "type": "label", "labels": ["開", "關"]}, ...]}
+    ... 依序為各欄位的陣列，每段起點對齊 8 bytes
+
+    欄位型別：i64 (int64)、f32 / f64 (float32 / float64，None 為 NaN)、u32 (uint32)、
+             u8 (uint8)、label / label16（uint8 / uint16 索引，字串放在 labels，最多 256 / 65536 種）
+
+    同一格式也用於 history.py 的分析快取（numpy 以 memory map 直接讀取各欄位），
+    欄位描述可附加 meta 物件記錄額外資訊。
+
+即時數據（Socket.IO new_data）：固定長度的單筆格式
+
+    0   int64 timestamp   8  int64 emitted_at   16 float32 temperature   20 float32 humidity
+    24  uint8 電燈狀態代碼（LIGHT_CODES 的索引，255 表示其他字串，接在裝置名稱之後）
+    25  uint8 裝置名稱長度，之後為 UTF-8 裝置名稱（與其他電燈狀態字串：uint8 長度 + UTF-8）
+"""
+
+import json
+import math
+import struct
+import sys
+from array import array
+
+# HTTP 內容類型（Accept 標頭協商）
+MIME_TYPE = 'application/vnd.sensor.columns'
+
+MAGIC = b'SCOL'
+HEADER = struct.Struct('<4sII')
+ALIGN = 8
+
+# 欄位型別 -> array 型別代碼
+TYPECODES = {'i64': 'q', 'f32': 'f', 'f64': 'd', 'u32': 'I', 'u8': 'B', 'label': 'B', 'label16': 'H'}
+LABEL_TYPES = ('label', 'label16')
+
+# 原始數據與彙總數據的欄位
+RAW_COLUMNS = [
+    ('timestamp', 'i64'),
+    ('temperature', 'f32'),
+    ('humidity', 'f32'),
+    ('light_status', 'label'),
+    ('device', 'label16'),
+]
+ROLLUP_COLUMNS = [
+    ('timestamp', 'i64'),
+    ('count', 'u32'),
+    ('temperature_avg', 'f32'),
+    ('temperature_min', 'f32'),
+    ('temperature_max', 'f32'),
+    ('humidity_avg', 'f32'),
+    ('humidity_min', 'f32'),
+    ('humidity_max', 'f32'),
+    ('light_ratio', 'f32'),
+    ('filled', 'u8'),
+]
+
+# 即時數據的電燈狀態代碼
+LIGHT_CODES = ('未知', '開', '關', 'on', 'off')
+LIGHT_OTHER = 255
+LIVE_FRAME = struct.Struct('<qqffBB')
+
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+
+def _padding(length):
+    return -length % ALIGN
+
+
+def _column(rows, name, kind):
+    """取出一個欄位並轉換為 array（label 欄位同時回傳字串表）"""
+    if kind in LABEL_TYPES:
+        labels = {}
+        codes = array(TYPECODES[kind])
+        limit = 256 ** codes.itemsize
+        for row in rows:
+            value = row.get(name)
+            value = '' if value is None else str(value)
+            code = labels.setdefault(value, len(labels))
+            if code >= limit:
+                raise ValueError(f'{name} 超過 {limit} 種不同的值')
+            codes.append(code)
+        return codes, list(labels)
+    if kind in ('f32', 'f64'):
+        nan = math.nan
+        values = array(TYPECODES[kind], [nan if row.get(name) is None else row[name] for row in rows])
+    else:
+        values = array(TYPECODES[kind], [int(row.get(name) or 0) for row in rows])
+    return values, None
+
+
+def pack_columns(rows, columns, meta=None):
+    """
+    將字典列表編碼為欄位式二進位格式
+
+    Args:
+        rows: 字典列表（例如 store.recent() 或 read_rollups() 的結果）
+        columns: (欄位名稱, 型別) 列表，例如 RAW_COLUMNS
+        meta: 附加在欄位描述中的資訊（可省略）
+
+    Returns:
+        bytes: 編碼後的內容
+
+    Raises:
+        ValueError: label 欄位超過可表示的種類數
+    """
+    schema = []
+    arrays = []
+    for name, kind in columns:
+        values, labels = _column(rows, name, kind)
+        entry = {'name': name, 'type': kind}
+        if labels is not None:
+            entry['labels'] = labels
+        schema.append(entry)
+        if _BIG_ENDIAN and values.itemsize > 1:
+            values.byteswap()
+        arrays.append(values)
+
+    description = {'columns': schema}
+    if meta is not None:
+        description['meta'] = meta
+    description = json.dumps(description, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    description += b' ' * _padding(HEADER.size + len(description))
+    parts = [HEADER.pack(MAGIC, len(rows), len(description)), description]
+    for values in arrays:
+        data = values.tobytes()
+        parts.append(data)
+        parts.append(b'\0' * _padding(len(data)))
+    return b''.join(parts)
+
+
+def unpack_columns(data):
+    """
+    解碼欄位式二進位格式（與瀏覽器端 decodeColumns() 相同，供工具與檢查使用）
+
+    Returns:
+        list: 字典列表（f32 欄位的 NaN 轉回 None，label 欄位轉回字串）
+
+    Raises:
+        ValueError: 格式錯誤
+    """
+    data = memoryview(data)
+    if len(data) < HEADER.size:
+        raise ValueError('資料長度不足')
+    magic, count, length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('不是欄位式二進位格式')
+    schema = json.loads(bytes(data[HEADER.size:HEADER.size + length]))
+    offset = HEADER.size + length
+    columns = []
+    for entry in schema['columns']:
+        values = array(TYPECODES[entry['type']])
+        size = values.itemsize * count
+        if offset + size > len(data):
+            raise ValueError('資料長度不足')
+        values.frombytes(data[offset:offset + size])
+        if _BIG_ENDIAN and values.itemsize > 1:
+            values.byteswap()
+        offset += size + _padding(size)
+        if entry['type'] in LABEL_TYPES:
+            labels = entry['labels']
+            values = [labels[code] for code in values]
+        elif entry['type'] in ('f32', 'f64'):
+            values = [None if math.isnan(v) else v for v in values]
+        columns.append((entry['name'], values))
+    return [{name: values[i] for name, values in columns} for i in range(count)]
+
+
+def _short_text(value, limit=255):
+    """
+    UTF-8 編碼並截斷為最多 limit bytes（長度以 1 byte 記錄）
+
+    只在字元邊界截斷：切在多位元組字元中間時捨棄不完整的字元，瀏覽器的 TextDecoder 不會出現亂碼。
+    """
+    data = str(value).encode('utf-8')
+    if len(data) <= limit:
+        return data
+    return data[:limit].decode('utf-8', 'ignore').encode('utf-8')
+
+
+def _float32(value):
+    """
+    轉換為 float32 可表示的數值（None 為 NaN）
+
+    超出 float32 範圍的有限數值變為 ±inf，與 pack_columns() 中 array('f') 的結果相同；
+    struct 遇到這種數值會拋出 OverflowError。
+    """
+    if value is None:
+        return math.nan
+    return array('f', [value])[0]
+
+
+def pack_sample(sample, emitted_at):
+    """
+    將一筆即時數據編碼為固定長度的二進位格式（Socket.IO new_data）
+
+    Args:
+        sample: 數據字典（timestamp / temperature / humidity / light_status / device）
+        emitted_at: 推送時間（epoch 毫秒）
+
+    Returns:
+        bytes: 編碼後的內容
+    """
+    device = _short_text(sample.get('device') or '')
+    light = sample.get('light_status')
+    code = LIGHT_CODES.index(light) if light in LIGHT_CODES else LIGHT_OTHER
+    frame = LIVE_FRAME.pack(int(sample.get('timestamp') or 0), int(emitted_at),
+                            _float32(sample.get('temperature')), _float32(sample.get('humidity')),
+                            code, len(device)) + device
+    if code == LIGHT_OTHER:
+        text = _short_text(light or '')
+        frame += bytes([len(text)]) + text
+    return frame
+
+
+def unpack_sample(data):
+    """解碼 pack_sample() 的結果（供工具與檢查使用）"""
+    timestamp, emitted_at, temperature, humidity, code, length = LIVE_FRAME.unpack_from(data)
+    offset = LIVE_FRAME.size
+    device = bytes(data[offset:offset + length]).decode('utf-8')
+    offset += length
+    if code == LIGHT_OTHER:
+        light = bytes(data[offset + 1:offset + 1 + data[offset]]).decode('utf-8')
+    else:
+        light = LIGHT_CODES[code]
+    return {
+        'timestamp': timestamp,
+        'emitted_at': emitted_at,
+        'temperature': None if math.isnan(temperature) else temperature,
+        'humidity': None if math.isnan(humidity) else humidity,
+        'light_status': light,
+        'device': device,
+    }
@@ -4,12 +4,17 @@
 1. 連線 WiFi
 2. 控制 Pico 內建 LED 閃爍 (模擬開關燈)
 3. 將燈的狀態 ("開"/"關") 發送到 MQTT Broker
+4. 接收監控網頁的開關燈指令 (devices/pico_led_control/command)，收到指令後停止自動閃爍
 """
 
 import time
 import machine
 import json
+import random
 import wifi_connect
+from publish_policy import DeadbandPolicy, REASON_HEARTBEAT
+from remote_control import RemoteControl
+from time_sync import TimeSync
 from secrets import MQTT_BROKER, MQTT_PORT
 
 # 嘗試匯入 MQTT 套件，如果沒有則自動安裝
@@ -26,55 +31,116 @@ except ImportError:
 
 # 設定
 TOPIC = "客廳/感測器"
+# 每次開機隨機產生，監控端以 (device, boot, msg_id) 判斷重複訊息
+BOOT_ID = random.getrandbits(16)
 CLIENT_ID = "pico_led_control"
 LED_PIN = "LED"  # Pico W 使用 "LED"
+# 網頁「遠端控制」輸入的裝置 id
+DEVICE_ID = CLIENT_ID
+TOGGLE_INTERVAL_MS = 2000  # 自動閃爍間隔
+LOOP_INTERVAL_MS = 20      # 主迴圈間隔，決定指令的反應時間
 
 # 初始化 LED
 led = machine.Pin(LED_PIN, machine.Pin.OUT)
 
+def mqtt_connect(client):
+    """連線 MQTT，成功回傳 True"""
+    try:
+        client.connect()
+        print("✅ MQTT 連線成功")
+        return True
+    except OSError as e:
+        print(f"❌ MQTT 連線失敗: {e}")
+        return False
+
 def main():
-    # 1. 連線 WiFi
-    wlan = wifi_connect.connect_wifi()
-    if not wlan:
+    # 1. 連線 WiFi（啟動時等待連線，之後由 wifi.poll() 在背景重新連線）
+    wifi = wifi_connect.get_manager()
+    if not wifi_connect.connect_wifi():
         return
 
     # 2. 連線 MQTT
     print(f"📡 正在連線到 MQTT Broker: {MQTT_BROKER}...")
-    try:
-        client = MQTTClient(CLIENT_ID, MQTT_BROKER, port=MQTT_PORT)
-        client.connect()
-        print("✅ MQTT 連線成功")
-    except Exception as e:
-        print(f"❌ MQTT 連線失敗: {e}")
+    client = MQTTClient(CLIENT_ID, MQTT_BROKER, port=MQTT_PORT)
+    remote = RemoteControl(client, DEVICE_ID, led=led)
+    # 向監控程式校時，數據附上取樣時間 ts（需在設定其他 MQTT 回呼之後建立）
+    sync = TimeSync(client, CLIENT_ID)
+    mqtt_ok = mqtt_connect(client)
+    if not mqtt_ok:
         print("請檢查 secrets.py 中的 IP 設定是否正確")
         return
+    remote.subscribe()
+    print(f"🎛️ 等待遠端指令: {remote.topic.decode()}")
 
     print("🚀 開始執行 LED 閃爍與回報...")
 
     # 3. 主迴圈
+    # 燈的狀態改變才發布；狀態不變時每 60 秒送一次心跳
+    policy = DeadbandPolicy(heartbeat=60)
     count = 0
+    manual = False  # 收到遠端指令後改由網頁控制，停止自動閃爍
+    last_toggle = time.ticks_ms()
     try:
         while True:
-            # 切換 LED 狀態
-            led.toggle()
+            # 處理 WiFi 事件：斷線後由管理器快速重新連線，連上後重新連線 MQTT
+            event = wifi.poll()
+            if event == wifi_connect.EVENT_DISCONNECTED:
+                print("⚠️ WiFi 中斷，重新連線中...")
+                mqtt_ok = False
+            elif event == wifi_connect.EVENT_CONNECTED:
+                print(f"✅ WiFi 已重新連線 ({wifi.last_join_ms} ms)")
+                mqtt_ok = mqtt_connect(client)
+                if mqtt_ok:
+                    remote.subscribe()
+
+            # 檢查遠端指令（非阻塞）
+            if mqtt_ok:
+                try:
+                    if remote.poll():
+                        manual = True
+                except OSError as e:
+                    print(f"接收指令失敗: {e}")
+                    mqtt_ok = wifi.connected and mqtt_connect(client)
+                    if mqtt_ok:
+                        remote.subscribe()
+
+            # 自動切換 LED 狀態
+            now = time.ticks_ms()
+            if not manual and time.ticks_diff(now, last_toggle) >= TOGGLE_INTERVAL_MS:
+                led.toggle()
+                last_toggle = now
 
             # 取得目前狀態
             is_on = led.value() == 1
             status_text = "開" if is_on else "關"
 
-            # 準備傳送的資料
-            payload = {
-                "light_status": status_text,
-                "device": "Pico W (App 1)",
-                "msg_id": count
-            }
+            reading = {"light_status": status_text}
+            reason = policy.check(reading)
 
             # 發送 MQTT 訊息
-            print(f"發送: LED {status_text}")
-            client.publish(TOPIC, json.dumps(payload))
+            if reason and mqtt_ok:
+                payload = {
+                    "light_status": status_text,
+                    "device": "Pico W (App 1)",
+                    "msg_id": count,
+                    "boot": BOOT_ID,
+                    "heartbeat": reason == REASON_HEARTBEAT
+                }
+                print(f"發送: LED {status_text}")
+                try:
+                    # 取樣時間（epoch 毫秒），監控端用來量測延遲
+                    if sync.maybe_resync():
+                        payload["ts"] = sync.now_ms()
+                    client.publish(TOPIC, json.dumps(payload))
+                    policy.sent(reading)
+                    count += 1
+                except OSError as e:
+                    print(f"發布失敗: {e}")
+                    mqtt_ok = wifi.connected and mqtt_connect(client)
+                    if mqtt_ok:
+                        remote.subscribe()
 
-            count += 1
-            time.sleep(2)  # 每 2 秒切換一次
+            time.sleep_ms(LOOP_INTERVAL_MS)
 
     except KeyboardInterrupt:
         print("\n程式停止")
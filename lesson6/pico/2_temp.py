@@ -4,14 +4,17 @@
 1. 連線 WiFi
 2. 讀取 Pico 內建溫度感測器
 3. 將溫度數據發送到 MQTT Broker
+4. 主迴圈避免配置記憶體（整數運算 + PayloadEncoder），定期發布記憶體與迴圈時間診斷
 注意: Pico 內建只有溫度感測器，沒有濕度感測器。此範例將模擬濕度數據。
 """
 
 import time
 import machine
-import json
 import random
 import wifi_connect
+from publish_policy import DeadbandPolicy, REASON_HEARTBEAT
+from telemetry import LoopDiagnostics, PayloadEncoder
+from time_sync import TimeSync
 from secrets import MQTT_BROKER, MQTT_PORT
 
 # 嘗試匯入 MQTT 套件
@@ -27,64 +30,125 @@ except ImportError:
         raise Exception("無網路連線，無法安裝必要套件")
 
 # 設定
-TOPIC = "客廳/感測器"
+TOPIC = "客廳/感測器".encode()  # 預先編碼，發布時不必再轉換
+DEVICE = b"Pico W (App 2)"
+# 每次開機隨機產生，監控端以 (device, boot, msg_id) 判斷重複訊息
+BOOT_ID = random.getrandbits(16)
 CLIENT_ID = "pico_temp_sensor"
+SAMPLE_INTERVAL = 5   # 每 5 秒讀取一次
+HEARTBEAT = 60        # 數值沒有變化時，每 60 秒送一次心跳
+VERBOSE = False       # 每次發布都印出數值（print 會配置記憶體，長時間執行時請關閉）
 
 # 初始化內建溫度感測器 (ADC 4)
 sensor_temp = machine.ADC(4)
-conversion_factor = 3.3 / (65535)
 
 def read_temperature():
-    """讀取內建溫度"""
-    reading = sensor_temp.read_u16() * conversion_factor
-    # 溫度計算公式: 27 - (voltage - 0.706)/0.001721
-    temperature = 27 - (reading - 0.706) / 0.001721
-    return round(temperature, 1)
+    """讀取內建溫度（單位 0.1°C 的整數，只用 small int 運算，不配置記憶體）"""
+    # ADC 有效解析度為 12 位元；電壓以 0.1 mV 為單位: raw * 3.3V / 4096
+    voltage = (sensor_temp.read_u16() >> 4) * 33000 // 4096
+    # 溫度計算公式: 27 - (voltage - 0.706)/0.001721，放大 10 倍並四捨五入
+    return 270 - ((voltage - 7060) * 1000 + 860) // 1721
+
+def mqtt_connect(client):
+    """連線 MQTT，成功回傳 True"""
+    try:
+        client.connect()
+        print("✅ MQTT 連線成功")
+        return True
+    except OSError as e:
+        print(f"❌ MQTT 連線失敗: {e}")
+        return False
 
 def main():
-    # 1. 連線 WiFi
-    wlan = wifi_connect.connect_wifi()
-    if not wlan:
+    # 1. 連線 WiFi（啟動時等待連線，之後由 wifi.poll() 在背景重新連線）
+    wifi = wifi_connect.get_manager()
+    if not wifi_connect.connect_wifi():
         return
 
     # 2. 連線 MQTT
     print(f"📡 正在連線到 MQTT Broker: {MQTT_BROKER}...")
-    try:
-        client = MQTTClient(CLIENT_ID, MQTT_BROKER, port=MQTT_PORT)
-        client.connect()
-        print("✅ MQTT 連線成功")
-    except Exception as e:
-        print(f"❌ MQTT 連線失敗: {e}")
+    client = MQTTClient(CLIENT_ID, MQTT_BROKER, port=MQTT_PORT)
+    # 向監控程式校時，數據附上取樣時間 ts
+    sync = TimeSync(client, CLIENT_ID)
+    mqtt_ok = mqtt_connect(client)
+    if not mqtt_ok:
         return
 
     print("🚀 開始讀取溫度並回報...")
 
     # 3. 主迴圈
+    # 只有溫度變化超過 0.3°C 或濕度變化超過 2% 才發布，否則只送心跳（數值單位為 0.1）
+    policy = DeadbandPolicy({"temperature": 3, "humidity": 20}, heartbeat=HEARTBEAT)
+    encoder = PayloadEncoder()
+    diag = LoopDiagnostics(CLIENT_ID)
+    reading = {"temperature": 0, "humidity": 0}  # 重複使用，不在迴圈中建立字典
     count = 0
+    humi = 600
+    next_sample = time.ticks_ms()
     try:
         while True:
+            diag.loop_start()
+
+            # 處理 WiFi 事件：斷線後由管理器快速重新連線，連上後重新連線 MQTT
+            event = wifi.poll()
+            if event == wifi_connect.EVENT_DISCONNECTED:
+                print("⚠️ WiFi 中斷，重新連線中...")
+                mqtt_ok = False
+            elif event == wifi_connect.EVENT_CONNECTED:
+                print(f"✅ WiFi 已重新連線 ({wifi.last_join_ms} ms)")
+                mqtt_ok = mqtt_connect(client)
+
             # 讀取溫度
             temp = read_temperature()
 
             # 模擬濕度 (因為 Pico 只有溫度感測器)
-            # 產生 50% ~ 70% 之間的隨機值
-            humi = round(random.uniform(50, 70), 1)
-
-            # 準備傳送的資料
-            payload = {
-                "temperature": temp,
-                "humidity": humi,
-                "device": "Pico W (App 2)",
-                "msg_id": count
-            }
-
-            # 發送 MQTT 訊息
-            json_str = json.dumps(payload)
-            print(f"發送: 溫度={temp}°C, 濕度={humi}%")
-            client.publish(TOPIC, json_str)
-
-            count += 1
-            time.sleep(5)  # 每 5 秒更新一次
+            # 在 50% ~ 70% 之間緩慢隨機漂移（每次 ±0.5%），模擬真實房間
+            humi = min(700, max(500, humi + random.getrandbits(4) % 11 - 5))
+
+            reading["temperature"] = temp
+            reading["humidity"] = humi
+            reason = policy.check(reading)
+
+            # 發送 MQTT 訊息（數值沒有明顯變化時略過）
+            if reason and mqtt_ok:
+                if VERBOSE:
+                    print("發送", reason, temp, humi)
+                try:
+                    # 校時（每 10 分鐘一次）會配置記憶體，在編碼訊息之前處理
+                    synced = sync.maybe_resync()
+                    encoder.begin()
+                    encoder.put_fixed(b"temperature", temp, 1)
+                    encoder.put_fixed(b"humidity", humi, 1)
+                    encoder.put_str(b"device", DEVICE)
+                    encoder.put_int(b"msg_id", count)
+                    encoder.put_int(b"boot", BOOT_ID)
+                    encoder.put_bool(b"heartbeat", reason == REASON_HEARTBEAT)
+                    # 取樣時間（epoch 毫秒），監控端用來量測延遲
+                    if synced:
+                        sync.write_ts(encoder)
+                    client.publish(TOPIC, encoder.end())
+                    policy.sent(reading)
+                    count += 1
+                except OSError as e:
+                    print(f"發布失敗: {e}")
+                    mqtt_ok = wifi.connected and mqtt_connect(client)
+
+            diag.loop_end()
+            # 在等待下一次取樣前主動回收，回收停頓不會落在取樣途中
+            diag.collect()
+            if diag.due() and mqtt_ok:
+                try:
+                    client.publish(diag.topic, diag.encode(encoder))
+                except OSError as e:
+                    print(f"診斷發布失敗: {e}")
+
+            # 依固定時間表取樣，迴圈本身的耗時不會累積成漂移
+            next_sample = time.ticks_add(next_sample, SAMPLE_INTERVAL * 1000)
+            wait = time.ticks_diff(next_sample, time.ticks_ms())
+            if wait > 0:
+                time.sleep_ms(wait)
+            else:
+                next_sample = time.ticks_ms()
 
     except KeyboardInterrupt:
         print("\n程式停止")
@@ -3,13 +3,16 @@
 功能:
 1. 同時執行 LED 閃爍與溫度讀取
 2. 將所有狀態整合在一個 MQTT 訊息中發送
+3. 主迴圈避免配置記憶體（整數運算 + PayloadEncoder），定期發布記憶體與迴圈時間診斷
 """
 
 import time
 import machine
-import json
 import random
 import wifi_connect
+from publish_policy import DeadbandPolicy, REASON_HEARTBEAT
+from telemetry import LoopDiagnostics, PayloadEncoder
+from time_sync import TimeSync
 from secrets import MQTT_BROKER, MQTT_PORT
 
 # 嘗試匯入 MQTT 套件
@@ -25,81 +28,150 @@ except ImportError:
         raise Exception("無網路連線，無法安裝必要套件")
 
 # 設定
-TOPIC = "客廳/感測器"
+TOPIC = "客廳/感測器".encode()  # 預先編碼，發布時不必再轉換
 CLIENT_ID = "pico_integrated"
+DEVICE = b"Pico W (App 3)"
 LED_PIN = "LED"
+VERBOSE = False  # 印出 LED 切換與發布內容（print 會配置記憶體，長時間執行時請關閉）
+
+# 燈的狀態：reading 使用字串比較變化，訊息使用預先編碼的 bytes
+LIGHT_ON = "開"
+LIGHT_OFF = "關"
+LIGHT_BYTES = {LIGHT_ON: LIGHT_ON.encode(), LIGHT_OFF: LIGHT_OFF.encode()}
 
 # 硬體初始化
 led = machine.Pin(LED_PIN, machine.Pin.OUT)
 sensor_temp = machine.ADC(4)
-conversion_factor = 3.3 / (65535)
 
 def read_temperature():
-    """讀取內建溫度"""
-    reading = sensor_temp.read_u16() * conversion_factor
-    temperature = 27 - (reading - 0.706) / 0.001721
-    return round(temperature, 1)
+    """讀取內建溫度（單位 0.1°C 的整數，只用 small int 運算，不配置記憶體）"""
+    voltage = (sensor_temp.read_u16() >> 4) * 33000 // 4096  # 0.1 mV
+    return 270 - ((voltage - 7060) * 1000 + 860) // 1721
+
+def mqtt_connect(client):
+    """連線 MQTT，成功回傳 True"""
+    try:
+        client.connect()
+        print("✅ MQTT 連線成功")
+        return True
+    except OSError as e:
+        print(f"❌ MQTT 連線失敗: {e}")
+        return False
 
 def main():
-    # 1. 連線 WiFi
-    wlan = wifi_connect.connect_wifi()
-    if not wlan:
+    # 1. 連線 WiFi（啟動時等待連線，之後由 wifi.poll() 在背景重新連線）
+    wifi = wifi_connect.get_manager()
+    if not wifi_connect.connect_wifi():
         return
 
     # 2. 連線 MQTT
     print(f"📡 正在連線到 MQTT Broker: {MQTT_BROKER}...")
-    try:
-        client = MQTTClient(CLIENT_ID, MQTT_BROKER, port=MQTT_PORT)
-        client.connect()
-        print("✅ MQTT 連線成功")
-    except Exception as e:
-        print(f"❌ MQTT 連線失敗: {e}")
+    client = MQTTClient(CLIENT_ID, MQTT_BROKER, port=MQTT_PORT)
+    # 向監控程式校時，數據附上取樣時間 ts
+    sync = TimeSync(client, CLIENT_ID)
+    mqtt_ok = mqtt_connect(client)
+    if not mqtt_ok:
         return
 
     print("🚀 開始執行整合應用程式...")
 
     # 3. 主迴圈
-    # 為了同時處理 LED 閃爍(快)和溫度上傳(慢)，我們使用非同步的概念或簡單的計時器
-    last_publish_time = 0
-    publish_interval = 5  # 每 5 秒上傳一次數據
+    # 為了同時處理 LED 閃爍(快)和溫度上傳(慢)，以 ticks_ms() 計時（small int，不配置記憶體）
+    publish_interval = 5000  # 每 5 秒檢查一次數據（毫秒）
+    last_publish_time = time.ticks_add(time.ticks_ms(), -publish_interval)
 
-    led_interval = 2      # 每 2 秒切換一次 LED
-    last_led_time = 0
+    # 溫濕度超過門檻或燈的狀態改變才上傳；沒有變化時每 60 秒送一次心跳（數值單位為 0.1）
+    policy = DeadbandPolicy({"temperature": 3, "humidity": 20}, heartbeat=60)
+    encoder = PayloadEncoder()
+    diag = LoopDiagnostics(CLIENT_ID)
+    reading = {"temperature": 0, "humidity": 0, "light_status": LIGHT_OFF}
+    humi = 600
 
-    start_time = time.time()
+    led_interval = 2000      # 每 2 秒切換一次 LED（毫秒）
+    last_led_time = time.ticks_ms()
+
+    # 開機時間以秒累加：ticks_ms() 約 12 天溢位一次，不能直接相減
+    uptime = 0
+    uptime_ms = 0
+    last_tick = time.ticks_ms()
 
     try:
         while True:
-            current_time = time.time()
+            diag.loop_start()
+            sampled = False
+            current_time = time.ticks_ms()
+            uptime_ms += time.ticks_diff(current_time, last_tick)
+            last_tick = current_time
+            if uptime_ms >= 1000:
+                uptime += uptime_ms // 1000
+                uptime_ms %= 1000
+
+            # 處理 WiFi 事件（不會阻塞迴圈）
+            event = wifi.poll()
+            if event == wifi_connect.EVENT_DISCONNECTED:
+                print("⚠️ WiFi 中斷，重新連線中...")
+                mqtt_ok = False
+            elif event == wifi_connect.EVENT_CONNECTED:
+                print(f"✅ WiFi 已重新連線 ({wifi.last_join_ms} ms)")
+                mqtt_ok = mqtt_connect(client)
 
             # 處理 LED (模擬工作狀態指示燈)
-            if current_time - last_led_time >= led_interval:
+            if time.ticks_diff(current_time, last_led_time) >= led_interval:
                 led.toggle()
-                last_led_time = current_time
-                print(f"[{current_time}] LED 切換")
-
-            # 處理數據上傳
-            if current_time - last_publish_time >= publish_interval:
-                # 收集所有數據
+                last_led_time = time.ticks_add(last_led_time, led_interval)
+                if VERBOSE:
+                    print(uptime, "LED 切換")
+
+            # 處理數據上傳（離線時略過，不卡住迴圈）
+            if time.ticks_diff(current_time, last_publish_time) >= publish_interval and mqtt_ok:
+                sampled = True
+                # 收集所有數據（更新同一個字典，不在迴圈中建立新物件）
                 temp = read_temperature()
-                humi = round(random.uniform(50, 70), 1)
-                is_on = led.value() == 1
-
-                payload = {
-                    "temperature": temp,
-                    "humidity": humi,
-                    "light_status": "開" if is_on else "關",
-                    "device": "Pico W (App 3)",
-                    "uptime": current_time - start_time
-                }
-
-                print(f"[{current_time}] 發送整合數據: {payload}")
-                client.publish(TOPIC, json.dumps(payload))
-
-                last_publish_time = current_time
+                humi = min(700, max(500, humi + random.getrandbits(4) % 11 - 5))
+                reading["temperature"] = temp
+                reading["humidity"] = humi
+                reading["light_status"] = LIGHT_ON if led.value() == 1 else LIGHT_OFF
+                reason = policy.check(reading)
+
+                if reason:
+                    if VERBOSE:
+                        print(uptime, "發送整合數據", reason, temp, humi, reading["light_status"])
+                    try:
+                        # 校時（每 10 分鐘一次）會配置記憶體，在編碼訊息之前處理
+                        synced = sync.maybe_resync()
+                        encoder.begin()
+                        encoder.put_fixed(b"temperature", temp, 1)
+                        encoder.put_fixed(b"humidity", humi, 1)
+                        encoder.put_str(b"light_status", LIGHT_BYTES[reading["light_status"]])
+                        encoder.put_str(b"device", DEVICE)
+                        encoder.put_int(b"uptime", uptime)
+                        encoder.put_bool(b"heartbeat", reason == REASON_HEARTBEAT)
+                        # 取樣時間（epoch 毫秒），監控端用來量測延遲
+                        if synced:
+                            sync.write_ts(encoder)
+                        client.publish(TOPIC, encoder.end())
+                        policy.sent(reading)
+                    except OSError as e:
+                        print(f"發布失敗: {e}")
+                        mqtt_ok = wifi.connected and mqtt_connect(client)
+
+                last_publish_time = time.ticks_add(last_publish_time, publish_interval)
+                if time.ticks_diff(current_time, last_publish_time) >= publish_interval:
+                    # 離線或停頓太久：不補發，從現在重新計時
+                    last_publish_time = current_time
+
+            diag.loop_end()
+            if sampled:
+                # 取樣後到下一次取樣之間有 5 秒空閒，在這裡主動回收
+                diag.collect()
+            if diag.due() and mqtt_ok:
+                try:
+                    client.publish(diag.topic, diag.encode(encoder))
+                except OSError as e:
+                    print(f"診斷發布失敗: {e}")
 
             # 短暫暫停避免 CPU 滿載，但不能太長以免錯過時間點
-            time.sleep(0.1)
+            time.sleep_ms(100)
 
     except KeyboardInterrupt:
         print("\n程式停止")
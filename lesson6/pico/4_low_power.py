@@ -0,0 +1,99 @@
+"""
+範例 4: 低功耗批次回報 (使用電池的節點)
+功能:
+1. 每隔 SAMPLE_INTERVAL 秒醒來讀取溫度 (濕度為模擬數據)
+2. 讀值先存入緩衝區 (deepsleep 時存在 RTC 記憶體或 flash)
+3. 每 BATCH_SIZE 筆才開啟 WiFi，一次發布整批數據後關閉 WiFi
+4. 取樣之間使用 lightsleep / deepsleep，並回報每個週期的清醒時間
+注意: 使用 deepsleep 時醒來會重新開機，請將本檔案存成 main.py 才會自動執行
+"""
+
+import machine
+import json
+import random
+import wifi_connect
+from duty_cycle import DutyCycle, SLEEP_LIGHT
+from secrets import MQTT_BROKER, MQTT_PORT
+
+from umqtt.simple import MQTTClient
+
+# 設定
+TOPIC = "客廳/感測器"
+CLIENT_ID = "pico_low_power"
+DEVICE = "Pico W (App 4)"
+SAMPLE_INTERVAL = 60   # 每 60 秒取樣一次
+BATCH_SIZE = 10        # 每 10 筆 (約 10 分鐘) 開啟 WiFi 發布一次
+SLEEP_MODE = SLEEP_LIGHT  # 改為 SLEEP_DEEP (需從 duty_cycle 匯入) 最省電，但每次醒來都會重新開機
+WIFI_TIMEOUT_MS = 10000   # 發布時等待 WiFi 連線的上限
+
+# 初始化內建溫度感測器 (ADC 4)
+sensor_temp = machine.ADC(4)
+conversion_factor = 3.3 / (65535)
+
+
+def read_temperature():
+    """讀取內建溫度"""
+    reading = sensor_temp.read_u16() * conversion_factor
+    # 溫度計算公式: 27 - (voltage - 0.706)/0.001721
+    temperature = 27 - (reading - 0.706) / 0.001721
+    return round(temperature, 1)
+
+
+def publish_batch(payload):
+    """
+    開啟 WiFi、發布一批數據後關閉 WiFi
+
+    Returns:
+        bool: 是否發布成功 (失敗時數據留在緩衝區，下次再送)
+    """
+    wifi = wifi_connect.get_manager()
+    if not wifi.wait(WIFI_TIMEOUT_MS):
+        print("❌ WiFi 連線失敗，數據保留到下次發布")
+        wifi.stop()
+        return False
+    print(f"✅ WiFi 已連線 ({wifi.last_join_ms} ms)")
+
+    client = MQTTClient(CLIENT_ID, MQTT_BROKER, port=MQTT_PORT)
+    try:
+        client.connect()
+        client.publish(TOPIC, json.dumps(payload))
+        client.disconnect()
+        print(f"📤 已發布 {len(payload['samples'])} 筆數據")
+        return True
+    except OSError as e:
+        print(f"❌ 發布失敗: {e}")
+        return False
+    finally:
+        # 關閉無線電，睡眠期間不耗電
+        wifi.stop()
+
+
+def main():
+    cycle = DutyCycle(SAMPLE_INTERVAL, BATCH_SIZE, SLEEP_MODE, boot=random.getrandbits(16))
+    print(f"🔋 低功耗模式: 每 {SAMPLE_INTERVAL} 秒取樣，每 {BATCH_SIZE} 筆發布一次 ({SLEEP_MODE}sleep)")
+
+    # 濕度模擬值：deepsleep 重新開機後沿用上一筆
+    samples = cycle.state.samples
+    humi = samples[-1]["humidity"] if samples else 60.0
+
+    while True:
+        cycle.begin()
+
+        temp = read_temperature()
+        humi = round(min(70, max(50, humi + random.uniform(-0.5, 0.5))), 1)
+        cycle.add({"temperature": temp, "humidity": humi})
+        print(f"取樣: 溫度={temp}°C, 濕度={humi}%")
+
+        if cycle.batch_ready():
+            if publish_batch(cycle.batch_payload(device=DEVICE)):
+                cycle.published()
+
+        # deepsleep 時不會返回，醒來後從頭執行
+        cycle.sleep()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n程式停止")
@@ -0,0 +1,202 @@
+"""
+低功耗工作週期（duty cycle）工具
+適用於使用電池的 Pico W 節點：
+
+    醒來 -> 取樣 -> 存入緩衝區 -> (每 N 筆) 開啟 WiFi 批次發布 -> 關閉 WiFi -> 睡眠
+
+- 取樣之間使用 machine.lightsleep（RAM 保留）或 machine.deepsleep（重新開機）
+- deepsleep 後 RAM 會清空，緩衝區與週期狀態存在 RTC 記憶體（若晶片支援）或 flash 檔案
+- 每個週期量測「清醒時間」，隨下一批數據一起回報，用來調整電池壽命與數據延遲
+"""
+import json
+import machine
+import time
+
+# 睡眠模式
+SLEEP_LIGHT = "light"
+SLEEP_DEEP = "deep"
+
+# flash 上的狀態檔（沒有 RTC 記憶體時使用）
+STATE_FILE = "duty_state.json"
+
+# 緩衝區上限：WiFi 長時間連不上時丟棄最舊的數據，避免檔案無限成長
+MAX_BUFFER = 120
+
+
+class CycleState:
+    """
+    跨睡眠保存的週期狀態
+
+    內容：
+        samples: 尚未發布的讀值（每筆為 dict）
+        awake_ms: 上次發布後每個週期的清醒時間（毫秒）
+        batch: 已發布的批次序號
+        boot: 開機識別（deepsleep 重新開機後沿用，序號才能延續）
+
+    lightsleep 時只保存在 RAM；deepsleep 時優先寫入 RTC 記憶體，
+    不支援時（例如 RP2040）改寫入 flash 檔案。
+    """
+
+    def __init__(self, persistent):
+        self.persistent = persistent
+        self._rtc = None
+        if persistent:
+            rtc = machine.RTC()
+            if hasattr(rtc, "memory"):
+                self._rtc = rtc
+        self.data = self._load() if persistent else None
+        if not self.data:
+            self.data = {"samples": [], "awake_ms": [], "batch": 0, "boot": None}
+
+    @property
+    def samples(self):
+        return self.data["samples"]
+
+    def add_sample(self, reading):
+        """加入一筆讀值（超過上限時丟棄最舊的）"""
+        samples = self.data["samples"]
+        samples.append(reading)
+        if len(samples) > MAX_BUFFER:
+            del samples[0]
+
+    def add_awake(self, awake_ms):
+        """記錄一個週期的清醒時間"""
+        awake = self.data["awake_ms"]
+        awake.append(awake_ms)
+        if len(awake) > MAX_BUFFER:
+            del awake[0]
+
+    def clear(self):
+        """批次發布成功後清空緩衝區"""
+        self.data["samples"] = []
+        self.data["awake_ms"] = []
+        self.data["batch"] += 1
+
+    def save(self):
+        """睡眠前保存（lightsleep 不需要寫入，減少 flash 磨損）"""
+        if not self.persistent:
+            return
+        raw = json.dumps(self.data)
+        if self._rtc is not None:
+            self._rtc.memory(raw.encode())
+            return
+        try:
+            with open(STATE_FILE, "w") as f:
+                f.write(raw)
+        except OSError as e:
+            print(f"⚠️ 無法保存週期狀態: {e}")
+
+    def _load(self):
+        try:
+            if self._rtc is not None:
+                raw = self._rtc.memory()
+            else:
+                with open(STATE_FILE) as f:
+                    raw = f.read()
+            return json.loads(raw) if raw else None
+        except (OSError, ValueError):
+            return None
+
+
+def sleep(ms, mode=SLEEP_LIGHT):
+    """
+    進入睡眠
+
+    SLEEP_LIGHT: 時脈暫停、RAM 保留，醒來後從下一行繼續執行
+    SLEEP_DEEP: 醒來時重新開機，從 main.py 開頭重新執行（此函式不會返回）
+    """
+    if mode == SLEEP_DEEP:
+        machine.deepsleep(ms)
+    else:
+        machine.lightsleep(ms)
+
+
+class DutyCycle:
+    """
+    工作週期控制
+
+    使用方式：
+        cycle = DutyCycle(interval=60, batch_size=10, mode=SLEEP_DEEP)
+        while True:
+            cycle.begin()
+            cycle.add(read_sensor())
+            if cycle.batch_ready():
+                if publish(cycle.batch_payload()):
+                    cycle.published()
+            cycle.sleep()   # deepsleep 時不會返回
+
+    Args:
+        interval: 取樣間隔（秒）
+        batch_size: 每累積幾筆開啟一次 WiFi 發布
+        mode: SLEEP_LIGHT 或 SLEEP_DEEP
+        boot: 開機識別（第一次啟動時使用，deepsleep 重新開機後沿用保存的值）
+    """
+
+    def __init__(self, interval=60, batch_size=10, mode=SLEEP_LIGHT, boot=None):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.mode = mode
+        self.state = CycleState(persistent=mode == SLEEP_DEEP)
+        if self.state.data["boot"] is None:
+            self.state.data["boot"] = boot
+        self._started = time.ticks_ms()
+
+    @property
+    def boot(self):
+        return self.state.data["boot"]
+
+    def begin(self):
+        """週期開始（醒來時呼叫）"""
+        self._started = time.ticks_ms()
+
+    def add(self, reading):
+        """存入一筆讀值"""
+        self.state.add_sample(reading)
+
+    def batch_ready(self):
+        """緩衝區是否已累積 batch_size 筆"""
+        return len(self.state.samples) >= self.batch_size
+
+    def batch_payload(self, **extra):
+        """
+        建立批次發布的訊息
+
+        每筆讀值的 age 為「發布前幾秒取樣」，監控端以收到訊息的時間回推取樣時間
+        （裝置沒有校時，無法提供絕對時間）。
+        """
+        samples = self.state.samples
+        last = len(samples) - 1
+        batch = []
+        for index, reading in enumerate(samples):
+            entry = dict(reading)
+            entry["age"] = (last - index) * self.interval
+            batch.append(entry)
+        payload = {
+            "samples": batch,
+            "interval": self.interval,
+            "awake_ms": list(self.state.data["awake_ms"]),
+            "seq": self.state.data["batch"],
+            "boot": self.boot
+        }
+        payload.update(extra)
+        return payload
+
+    def published(self):
+        """批次發布成功"""
+        self.state.clear()
+
+    def awake_ms(self):
+        """本週期目前為止的清醒時間（毫秒）"""
+        if self.mode == SLEEP_DEEP:
+            # deepsleep 醒來即重新開機，ticks_ms 從開機開始計算，包含開機時間
+            return time.ticks_ms()
+        return time.ticks_diff(time.ticks_ms(), self._started)
+
+    def sleep(self):
+        """記錄清醒時間、保存狀態並睡到下一次取樣"""
+        awake = self.awake_ms()
+        self.state.add_awake(awake)
+        self.state.save()
+        print(f"💤 清醒 {awake} ms，睡眠 {self.interval} 秒 (緩衝 {len(self.state.samples)} 筆)")
+        sleep_ms = max(0, self.interval * 1000 - awake)
+        sleep(sleep_ms, self.mode)
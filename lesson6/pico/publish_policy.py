@@ -0,0 +1,94 @@
+"""
+發布策略：例外回報（Deadband）+ 心跳
+只有數值變化超過設定的門檻、或狀態改變時才發布；
+長時間沒有變化時，每隔一段時間送出心跳，讓監控端知道裝置仍在線上。
+
+本檔案在 lesson6/pico 與 lesson7 中內容相同，請一起修改。
+"""
+import time
+
+# 預設門檻：溫度變化 0.3°C、濕度變化 2% 才發布
+DEFAULT_DEADBANDS = {
+    "temperature": 0.3,
+    "humidity": 2.0,
+}
+
+# 預設心跳間隔（秒）
+DEFAULT_HEARTBEAT = 60
+
+# check() 回傳的發布原因
+REASON_FIRST = "first"
+REASON_CHANGE = "change"
+REASON_HEARTBEAT = "heartbeat"
+
+
+class DeadbandPolicy:
+    """
+    例外回報策略
+
+    使用方式：
+        policy = DeadbandPolicy(heartbeat=60)
+        reading = {"temperature": 25.1, "humidity": 60.2, "light_status": "開"}
+        reason = policy.check(reading)
+        if reason:
+            payload = dict(reading)
+            payload["heartbeat"] = reason == REASON_HEARTBEAT
+            client.publish(TOPIC, json.dumps(payload))
+            policy.sent(reading)
+
+    Args:
+        deadbands: 欄位 -> 門檻；數值欄位變化超過門檻才發布，
+                   不在字典中的欄位（例如 light_status）只要改變就發布
+        heartbeat: 心跳間隔（秒），0 表示不送心跳
+    """
+
+    def __init__(self, deadbands=None, heartbeat=DEFAULT_HEARTBEAT):
+        self.deadbands = DEFAULT_DEADBANDS if deadbands is None else deadbands
+        self.heartbeat_ms = int(heartbeat * 1000)
+        self.last = None
+        self.last_sent_ms = 0
+        self.published = 0
+        self.suppressed = 0
+
+    def check(self, reading, now_ms=None):
+        """
+        判斷這筆讀值是否需要發布
+
+        Returns:
+            str: REASON_FIRST / REASON_CHANGE / REASON_HEARTBEAT，不需要發布時回傳 None
+        """
+        if now_ms is None:
+            now_ms = time.ticks_ms()
+        if self.last is None:
+            return REASON_FIRST
+        if self.changed(reading):
+            return REASON_CHANGE
+        if self.heartbeat_ms and time.ticks_diff(now_ms, self.last_sent_ms) >= self.heartbeat_ms:
+            return REASON_HEARTBEAT
+        self.suppressed += 1
+        return None
+
+    def changed(self, reading):
+        """與上次發布的值相比，是否有欄位超過門檻"""
+        # 直接迭代字典（不呼叫 items()）：MicroPython 的 items() 每次都在 heap 建立 view 物件
+        for key in reading:
+            if key not in self.last:
+                return True
+            value = reading[key]
+            previous = self.last[key]
+            band = self.deadbands.get(key)
+            if band is None:
+                if value != previous:
+                    return True
+            elif abs(value - previous) >= band:
+                return True
+        return False
+
+    def sent(self, reading, now_ms=None):
+        """記錄已發布的讀值（發布成功後呼叫；重複使用同一個字典，不配置記憶體）"""
+        if self.last is None:
+            self.last = dict(reading)
+        else:
+            self.last.update(reading)
+        self.last_sent_ms = time.ticks_ms() if now_ms is None else now_ms
+        self.published += 1
@@ -0,0 +1,102 @@
+"""
+遠端控制：接收監控網頁送來的指令
+訂閱 devices/<裝置 id>/command，執行 LED / PWM 指令後回傳確認到 devices/<裝置 id>/ack
+
+    指令: {"id": "a1b2c3", "action": "led", "value": "on" | "off" | "toggle"}
+          {"id": "a1b2c3", "action": "pwm", "value": 0 ~ 65535}
+    確認: {"id": "a1b2c3", "ok": true, "state": "開"}
+
+使用 check_msg() 以非阻塞方式檢查新指令，請在主迴圈中經常呼叫 poll()（例如每 20 ms），
+指令從網頁到 LED 的反應時間主要取決於呼叫間隔。
+"""
+import json
+
+COMMAND_TOPIC = "devices/{}/command"
+ACK_TOPIC = "devices/{}/ack"
+
+
+class RemoteControl:
+    """
+    MQTT 指令接收器
+
+    Args:
+        client: umqtt.simple 的 MQTTClient
+        device_id: 裝置 id（與網頁上輸入的相同）
+        led: machine.Pin，處理 led 指令
+        pwm: machine.PWM，處理 pwm 指令
+    """
+
+    def __init__(self, client, device_id, led=None, pwm=None):
+        self.client = client
+        self.device_id = device_id
+        self.led = led
+        self.pwm = pwm
+        self.topic = COMMAND_TOPIC.format(device_id).encode()
+        self.ack_topic = ACK_TOPIC.format(device_id).encode()
+        self.received = 0
+        self._acks = []
+        client.set_callback(self._on_message)
+
+    def subscribe(self):
+        """訂閱指令主題（每次 MQTT 連線成功後呼叫）"""
+        self.client.subscribe(self.topic)
+
+    def poll(self):
+        """
+        檢查並執行新指令（不會阻塞），再送出確認
+
+        Returns:
+            int: 本次執行的指令數
+
+        Raises:
+            OSError: MQTT 連線中斷
+        """
+        count = self.received
+        self.client.check_msg()
+        # 在 check_msg() 之外發布確認，避免在回呼中寫入 socket
+        while self._acks:
+            self.client.publish(self.ack_topic, json.dumps(self._acks.pop(0)))
+        return self.received - count
+
+    def _on_message(self, topic, msg):
+        if topic != self.topic:
+            return
+        command = None
+        try:
+            command = json.loads(msg)
+            state = self.apply(command["action"], command.get("value"))
+            ack = {"id": command.get("id"), "ok": True, "state": state}
+        except (ValueError, KeyError, TypeError) as e:
+            ack = {"id": None, "ok": False, "error": str(e)}
+            if isinstance(command, dict):
+                ack["id"] = command.get("id")
+        self.received += 1
+        self._acks.append(ack)
+
+    def apply(self, action, value):
+        """
+        執行指令
+
+        Returns:
+            執行後的狀態（LED 為 "開"/"關"，PWM 為 duty）
+
+        Raises:
+            ValueError: 不支援的指令
+        """
+        if action == "led" and self.led is not None:
+            if value == "on":
+                self.led.value(1)
+            elif value == "off":
+                self.led.value(0)
+            elif value == "toggle":
+                self.led.toggle()
+            else:
+                raise ValueError("led 指令只接受 on / off / toggle")
+            return "開" if self.led.value() else "關"
+        if action == "pwm" and self.pwm is not None:
+            duty = int(value)
+            if not 0 <= duty <= 65535:
+                raise ValueError("pwm 指令的範圍是 0 ~ 65535")
+            self.pwm.duty_u16(duty)
+            return duty
+        raise ValueError("不支援的指令: {}".format(action))
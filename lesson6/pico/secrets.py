@@ -7,6 +7,13 @@ Secrets 設定檔
 SSID = "Your_WiFi_Name"
 PASSWORD = "Your_WiFi_Password"
 
+# 選填：固定 IP (ip, 子網路遮罩, 閘道, DNS)，可省略 DHCP 加快重新連線
+# 例如: ("192.168.1.50", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+# 設為 None 時使用 DHCP，並自動快取上次取得的 IP
+WIFI_STATIC_IP = None
+# 選填：WiFi 省電模式（False = 延遲最低，True = 較省電）
+WIFI_POWER_SAVE = False
+
 # MQTT Broker 設定
 # 請使用 'hostname -I' 在 Raspberry Pi 上查詢 IP
 # 例如: "192.168.1.100"
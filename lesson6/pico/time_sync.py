@@ -0,0 +1,130 @@
+"""
+MQTT 校時
+向監控程式發送 NTP 式的校時請求，之後以 ticks_ms() 推算目前時間（epoch 毫秒），
+讓數據附上取樣時間 ts，監控端可量測「感測 -> broker」的延遲並以取樣時間儲存
+
+    sync = TimeSync(client, "pico_temp_sensor")
+    sync.sync()                      # 連線 MQTT 後呼叫（最多阻塞 timeout_ms）
+    payload["ts"] = sync.now_ms()    # 尚未校時時回傳 None
+    sync.write_ts(encoder)           # 或寫入 telemetry.PayloadEncoder（不配置記憶體）
+    sync.maybe_resync()              # 在主迴圈中呼叫，每 RESYNC_INTERVAL_MS 重新校時
+"""
+import json
+import time
+
+REQUEST_TOPIC = "devices/{}/time/request"
+RESPONSE_TOPIC = "devices/{}/time/response"
+
+# 每次校時的請求次數（取來回延遲最小的一次）
+SYNC_ROUNDS = 3
+# 重新校時間隔：修正晶振漂移，並避免 ticks_diff 超出範圍
+RESYNC_INTERVAL_MS = 10 * 60 * 1000
+# 校時失敗後的重試間隔
+RETRY_INTERVAL_MS = 30 * 1000
+
+
+class TimeSync:
+    """
+    以 MQTT 向監控程式校時
+
+    會以 set_callback 接手 MQTT 訊息回呼，非校時回應的訊息轉交給原本的回呼
+    （例如 RemoteControl），因此請在其他模組設定回呼之後再建立。
+    """
+
+    def __init__(self, client, device_id):
+        self.client = client
+        self.request_topic = REQUEST_TOPIC.format(device_id).encode()
+        self.response_topic = RESPONSE_TOPIC.format(device_id).encode()
+        self.base_epoch_ms = None  # 校時當下的 epoch 毫秒
+        self.base_ticks = 0        # 校時當下的 ticks_ms()
+        # epoch 毫秒超過 small int 範圍，拆成兩段讓 write_ts() 不必配置長整數
+        self._base_high = 0
+        self._base_low = 0
+        self.delay_ms = None       # 最近一次校時的來回延遲
+        self._last_attempt = None
+        self._next = getattr(client, "cb", None)
+        self._responses = []
+        client.set_callback(self._on_message)
+
+    @property
+    def synced(self):
+        return self.base_epoch_ms is not None
+
+    def now_ms(self):
+        """目前時間（epoch 毫秒），尚未校時時回傳 None"""
+        if self.base_epoch_ms is None:
+            return None
+        return self.base_epoch_ms + time.ticks_diff(time.ticks_ms(), self.base_ticks)
+
+    def write_ts(self, encoder, key=b"ts"):
+        """
+        將目前時間（epoch 毫秒）寫入 PayloadEncoder，不配置記憶體
+
+        Returns:
+            bool: 尚未校時時不寫入，回傳 False
+        """
+        if self.base_epoch_ms is None:
+            return False
+        low = self._base_low + time.ticks_diff(time.ticks_ms(), self.base_ticks)
+        encoder.put_split(key, self._base_high + low // 1000000, low % 1000000, 6)
+        return True
+
+    def sync(self, rounds=SYNC_ROUNDS, timeout_ms=500):
+        """
+        校時（每 MQTT 連線成功後呼叫一次）
+
+        Returns:
+            bool: 是否成功
+
+        Raises:
+            OSError: MQTT 連線中斷
+        """
+        self._last_attempt = time.ticks_ms()
+        self.client.subscribe(self.response_topic)
+        best = None
+        for _ in range(rounds):
+            self._responses = []
+            request = {"t0": time.ticks_ms()}
+            if self.delay_ms is not None:
+                request["delay_ms"] = self.delay_ms
+            self.client.publish(self.request_topic, json.dumps(request))
+
+            deadline = time.ticks_add(time.ticks_ms(), timeout_ms)
+            while not self._responses and time.ticks_diff(deadline, time.ticks_ms()) > 0:
+                self.client.check_msg()
+                time.sleep_ms(1)
+            for t3, response in self._responses:
+                if response.get("t0") != request["t0"]:
+                    continue
+                # 來回延遲扣除監控程式的處理時間
+                delay = time.ticks_diff(t3, request["t0"]) - (response["t2"] - response["t1"])
+                if best is None or delay < best[0]:
+                    best = (delay, t3, response["t2"])
+
+        if best is None:
+            print("⚠️ 校時失敗，數據將不附取樣時間")
+            return False
+        delay, t3, t2 = best
+        self.delay_ms = delay
+        self.base_ticks = t3
+        self.base_epoch_ms = t2 + delay // 2
+        self._base_high, self._base_low = divmod(self.base_epoch_ms, 1000000)
+        print(f"🕒 校時完成 (來回延遲 {delay} ms)")
+        return True
+
+    def maybe_resync(self):
+        """距離上次校時超過 RESYNC_INTERVAL_MS（失敗時 RETRY_INTERVAL_MS）時重新校時"""
+        interval = RESYNC_INTERVAL_MS if self.synced else RETRY_INTERVAL_MS
+        if (self._last_attempt is not None
+                and time.ticks_diff(time.ticks_ms(), self._last_attempt) < interval):
+            return self.synced
+        return self.sync()
+
+    def _on_message(self, topic, msg):
+        if topic == self.response_topic:
+            try:
+                self._responses.append((time.ticks_ms(), json.loads(msg)))
+            except ValueError:
+                pass
+        elif self._next is not None:
+            self._next(topic, msg)
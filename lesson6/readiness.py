@@ -0,0 +1,163 @@
+"""
+啟動狀態與就緒檢查
+記錄冷啟動各階段的時間，全部項目完成（或失敗）時通知 systemd（Type=notify）
+
+    /healthz  程序存活（HTTP 可以回應即為存活）
+    /readyz   歷史數據已載入、接收流程已啟動，儀表板可以正常顯示
+
+    readiness = Readiness(['history', 'ingest'])
+    readiness.mark('history')   # 每個項目完成時呼叫
+    readiness.fail('history', e)  # 項目失敗時呼叫
+    readiness.ready             # 全部完成後為 True，並送出 READY=1
+
+有項目失敗時，其他項目都結束後仍送出 READY=1 並以 STATUS 顯示失敗原因（/readyz 維持 503），
+避免 systemd 等到 TimeoutStartSec 後反覆重新啟動；無法繼續執行的失敗由呼叫端以非 0 結束程序。
+"""
+
+import os
+import socket
+import threading
+import time
+
+import metrics
+from log_config import get_logger
+
+log = get_logger('readiness')
+
+# 冷啟動預算（秒）：從程序啟動到就緒，超過時記錄警告
+COLD_START_BUDGET = 1.0
+
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+# 無法讀取 /proc 時，以匯入本模組的時間作為程序啟動時間
+_FALLBACK_START = time.monotonic()
+
+
+def process_uptime():
+    """
+    程序已執行的秒數（包含 Python 直譯器啟動與匯入模組的時間）
+
+    Linux 上由 /proc 取得程序的啟動時間，其他平台從匯入本模組時開始計算。
+    """
+    try:
+        with open('/proc/self/stat', 'rb') as f:
+            # 程序名稱可能含有空白，從最後一個 ')' 之後開始切割；第 22 個欄位為啟動時間
+            fields = f.read().rsplit(b')', 1)[1].split()
+        with open('/proc/uptime', 'rb') as f:
+            system_uptime = float(f.read().split()[0])
+        return max(0.0, system_uptime - int(fields[19]) / _CLOCK_TICKS)
+    except (OSError, IndexError, ValueError):
+        return time.monotonic() - _FALLBACK_START
+
+
+def sd_notify(*states):
+    """
+    通知 systemd 服務狀態（例如 'READY=1'、'STATUS=...'）
+
+    沒有 NOTIFY_SOCKET 環境變數時（非 systemd 啟動或 Type 不是 notify）不做任何事。
+
+    Returns:
+        bool: 是否已送出
+    """
+    address = os.environ.get('NOTIFY_SOCKET')
+    if not address:
+        return False
+    if address.startswith('@'):
+        # 抽象命名空間的 socket
+        address = '\0' + address[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.connect(address)
+            sock.sendall('\n'.join(states).encode('utf-8'))
+        return True
+    except OSError as e:
+        log.warning('無法通知 systemd: %s', e)
+        return False
+
+
+class Readiness:
+    """
+    啟動項目的完成狀態
+
+    Args:
+        checks: 就緒前必須完成的項目名稱
+        budget: 冷啟動預算（秒）
+    """
+
+    def __init__(self, checks, budget=COLD_START_BUDGET):
+        self.checks = list(checks)
+        self.budget = budget
+        self.timings = {}  # 項目 -> 完成時的程序執行秒數
+        self.errors = {}   # 項目 -> 失敗原因
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def require(self, check):
+        """加入就緒前必須完成的項目（例如由主程式啟動的 HTTP 服務）"""
+        with self._lock:
+            if check not in self.checks:
+                self.checks.append(check)
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def mark(self, check):
+        """項目完成；最後一個項目完成時通知 systemd"""
+        uptime = process_uptime()
+        with self._lock:
+            if check in self.timings:
+                return
+            self.timings[check] = uptime
+            self.errors.pop(check, None)
+            metrics.STARTUP_SECONDS.set(uptime, check)
+            done = all(name in self.timings for name in self.checks) and not self._ready.is_set()
+            if done:
+                self._ready.set()
+            degraded = not done and self._settled()
+        if done:
+            self._on_ready(uptime)
+        elif degraded:
+            self._on_degraded()
+
+    def fail(self, check, error):
+        """項目失敗（維持未就緒，/readyz 會顯示原因）"""
+        with self._lock:
+            self.errors[check] = str(error)
+            degraded = self._settled()
+        if degraded:
+            self._on_degraded()
+        else:
+            sd_notify(f'STATUS=❌ {check}: {error}')
+
+    def wait(self, timeout=None):
+        """等待全部項目完成"""
+        return self._ready.wait(timeout)
+
+    def status(self):
+        """/readyz 的回應內容"""
+        with self._lock:
+            return {
+                'ready': self._ready.is_set(),
+                'checks': {name: name in self.timings for name in self.checks},
+                'startup_ms': {name: round(seconds * 1000) for name, seconds in self.timings.items()},
+                'errors': dict(self.errors),
+                'budget_ms': round(self.budget * 1000),
+            }
+
+    def _settled(self):
+        """每個項目都已完成或失敗（需持有 _lock）"""
+        return all(name in self.timings or name in self.errors for name in self.checks)
+
+    def _on_degraded(self):
+        with self._lock:
+            errors = '; '.join(f'{name}: {error}' for name, error in self.errors.items())
+        log.warning('啟動完成但未就緒: %s', errors)
+        sd_notify('READY=1', f'STATUS=⚠️ 未就緒（{errors}）')
+
+    def _on_ready(self, uptime):
+        metrics.STARTUP_SECONDS.set(uptime, 'ready')
+        if uptime > self.budget:
+            log.warning('冷啟動 %.0f ms，超過預算 %.0f ms', uptime * 1000, self.budget * 1000)
+        else:
+            log.info('🚀 冷啟動 %.0f ms（預算 %.0f ms）', uptime * 1000, self.budget * 1000)
+        sd_notify('READY=1', f'STATUS=就緒（冷啟動 {uptime * 1000:.0f} ms）')
@@ -0,0 +1,384 @@
+"""
+感測器數據重播工具
+將已記錄的 CSV（sensor_data.csv 或 data/raw/ 分區，包含壓縮後的 .tsz）或 MQTT 擷取檔重新送入系統，
+依原始時間間隔乘上速度倍數播放，並可檢查儲存結果是否與來源一致
+
+使用方式：
+    # 記錄 broker 上的訊息為擷取檔（JSON Lines）
+    python replay.py record capture.jsonl --topic living_room/sensor
+
+    # 以 100 倍速重播到 broker（由執行中的 app_flask.py 接收）
+    python replay.py play sensor_data.csv --speed 100 --target broker
+
+    # 盡快直接送入接收流程（不經 broker），寫到獨立目錄並檢查結果
+    python replay.py play data/raw --speed 0 --target direct --data-dir replay_data --verify
+"""
+
+import argparse
+import base64
+import csv
+import json
+import os
+import random
+import time
+
+import series
+from storage import CSV_EXT, SERIES_EXT, SensorStore, parse_raw_row
+from timestamps import day_name, now_ms
+
+# MQTT 設定（與 app_flask.py 相同）
+BROKER = "localhost"
+PORT = 1883
+TOPIC = "living_room/sensor"
+
+REPLAY_DEVICE = "replay"
+
+
+# ---------- 讀取來源 ----------
+
+def _source_files(path):
+    """
+    展開來源路徑：單一檔案或分區目錄
+
+    同一天的分區可能同時有壓縮檔案與 CSV（壓縮後才寫入的延遲數據），
+    與 SensorStore.read_partition 相同，先讀壓縮檔案再讀 CSV。
+    """
+    if not os.path.isdir(path):
+        return [path]
+    names = [name for name in os.listdir(path) if name.endswith((CSV_EXT, SERIES_EXT))]
+    names.sort(key=lambda name: (os.path.splitext(name)[0], not name.endswith(SERIES_EXT)))
+    return [os.path.join(path, name) for name in names]
+
+
+def read_raw_samples(path):
+    """
+    讀取原始數據（CSV 或壓縮檔案）
+
+    Yields:
+        dict: parse_raw_row 格式的原始數據
+    """
+    for filename in _source_files(path):
+        if filename.endswith(SERIES_EXT):
+            yield from series.read_series(filename)
+            continue
+        with open(filename, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                yield parse_raw_row(row)
+
+
+def read_csv_events(path, topic=TOPIC):
+    """
+    讀取 CSV / 壓縮檔案的原始數據，轉換為重播事件
+
+    保留來源的裝置名稱（沒有裝置欄位的舊數據使用 REPLAY_DEVICE），
+    序號依裝置分別遞增，多台裝置的數據不會被接收端當成重複訊息。
+
+    Yields:
+        tuple: (原始時間 epoch 秒, 主題, payload bytes)
+    """
+    boot = random.getrandbits(16)
+    sequences = {}
+    for sample in read_raw_samples(path):
+        device = sample.get('device') or REPLAY_DEVICE
+        seq = sequences.get(device, 0)
+        sequences[device] = seq + 1
+        payload = {
+            'light_status': sample['light_status'],
+            'temperature': sample['temperature'],
+            'humidity': sample['humidity'],
+            'device': device,
+            'seq': seq,
+            'boot': boot
+        }
+        yield (sample['timestamp'] / 1000, topic,
+               json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+
+
+def read_capture_events(path):
+    """
+    讀取 MQTT 擷取檔（record 指令的輸出，每行一個 JSON）
+
+    Yields:
+        tuple: (原始時間 epoch 秒, 主題, payload bytes)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if 'payload_b64' in event:
+                payload = base64.b64decode(event['payload_b64'])
+            else:
+                payload = event['payload'].encode('utf-8')
+            yield event['t'], event['topic'], payload
+
+
+def read_events(path, topic=TOPIC):
+    """依副檔名選擇讀取方式"""
+    if path.endswith('.jsonl'):
+        return read_capture_events(path)
+    return read_csv_events(path, topic)
+
+
+# ---------- 重播 ----------
+
+def replay(events, send, speed=1.0):
+    """
+    依原始時間間隔重播事件
+
+    Args:
+        events: (epoch 秒, 主題, payload) 的可迭代物件
+        send: 送出函式 send(topic, payload, original_time)
+        speed: 速度倍數，0 表示盡快送出
+
+    Returns:
+        dict: 筆數、耗時、最大落後時間等統計
+    """
+    count = 0
+    max_lag = 0.0
+    first_time = None
+    start = time.perf_counter()
+
+    for original_time, topic, payload in events:
+        if first_time is None:
+            first_time = original_time
+        if speed > 0:
+            target = start + (original_time - first_time) / speed
+            delay = target - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+        send(topic, payload, original_time)
+        count += 1
+
+    elapsed = time.perf_counter() - start
+    return {
+        'count': count,
+        'elapsed': elapsed,
+        'rate': count / elapsed if elapsed > 0 else 0.0,
+        'max_lag': max_lag
+    }
+
+
+def broker_sender(broker=BROKER, port=PORT):
+    """建立發布到 MQTT broker 的送出函式"""
+    import paho.mqtt.client as mqtt
+
+    client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    client.connect(broker, port, 60)
+    client.loop_start()
+
+    def send(topic, payload, original_time):
+        client.publish(topic, payload, qos=1)
+
+    def close():
+        # 等待 QoS 1 訊息全部送出
+        while client.want_write():
+            time.sleep(0.01)
+        client.loop_stop()
+        client.disconnect()
+
+    return send, close
+
+
+def direct_sender(data_dir):
+    """
+    建立直接送入接收流程的送出函式（不經 broker）
+
+    時間戳記使用來源的原始時間，儲存結果可與來源逐筆比對。
+    """
+    from ingest import IngestPipeline
+
+    store = SensorStore(data_dir)
+    if store.list_partitions('raw'):
+        raise SystemExit(f"❌ {data_dir} 已有數據，請指定新的 --data-dir 以便比對結果")
+    pipeline = IngestPipeline(store)
+    pipeline.start()
+
+    def send(topic, payload, original_time):
+        while not pipeline.submit(topic, payload, round(original_time * 1000)):
+            time.sleep(0.001)
+
+    def close():
+        pipeline.join()
+        pipeline.stop()
+        store.close()
+
+    return send, close
+
+
+# ---------- 檢查結果 ----------
+
+def verify(source_path, data_dir, since, check_timestamps):
+    """
+    比對來源與儲存結果
+
+    Args:
+        source_path: 重播來源（CSV 或擷取檔）
+        data_dir: 接收端的數據目錄
+        since: 只比對這個時間之後儲存的數據（epoch 毫秒，None 表示全部）
+        check_timestamps: 是否比對時間戳記（direct 模式才會保留原始時間）
+
+    Returns:
+        list: 不一致的說明（空列表表示完全一致）
+    """
+    from ingest import MAX_CLOCK_SKEW, SAMPLE_DEFAULTS, decode_payload
+
+    expected = []
+    last = {}
+    for original_time, topic, payload in read_events(source_path):
+        try:
+            sample = decode_payload(payload)
+        except ValueError:
+            continue
+        # 與接收流程相同：批次訊息依 age 展開，缺少的欄位沿用該裝置上一筆的值
+        device = sample['device'] or topic
+        previous = last.setdefault(device, dict(SAMPLE_DEFAULTS))
+        for entry in sample['batch'] or [dict(sample, age=0)]:
+            entry['device'] = device
+            for key in SAMPLE_DEFAULTS:
+                if entry[key] is None:
+                    entry[key] = previous[key]
+                previous[key] = entry[key]
+            received_at = round(original_time * 1000)
+            captured_at = sample['captured_at']
+            if (sample['batch'] is None and captured_at is not None
+                    and abs(received_at - captured_at) <= MAX_CLOCK_SKEW * 1000):
+                # 已校時的裝置以取樣時間儲存
+                entry['timestamp'] = captured_at
+            else:
+                entry['timestamp'] = received_at - round(entry['age'] * 1000)
+            expected.append(entry)
+
+    store = SensorStore(data_dir)
+    stored = []
+    for partition in store.list_partitions('raw'):
+        if since and partition < day_name(since):
+            continue
+        for sample in store.read_partition('raw', partition):
+            if not since or sample['timestamp'] >= since:
+                stored.append(sample)
+
+    keys = ['device', 'light_status', 'temperature', 'humidity']
+    if check_timestamps:
+        keys.append('timestamp')
+
+    problems = []
+    if len(stored) != len(expected):
+        problems.append(f'筆數不同: 來源 {len(expected)} 筆, 儲存 {len(stored)} 筆')
+    for index, (want, got) in enumerate(zip(expected, stored)):
+        for key in keys:
+            if want[key] != got[key]:
+                problems.append(f'第 {index + 1} 筆 {key} 不同: 來源 {want[key]!r}, 儲存 {got[key]!r}')
+                break
+        if len(problems) >= 10:
+            break
+    return problems
+
+
+# ---------- 記錄 ----------
+
+def record(path, topic=TOPIC, broker=BROKER, port=PORT):
+    """訂閱主題並將收到的訊息附加到擷取檔，按 Ctrl+C 結束"""
+    import paho.mqtt.client as mqtt
+
+    f = open(path, 'a', encoding='utf-8')
+    count = 0
+
+    def on_connect(client, userdata, flags, reason_code, properties):
+        client.subscribe(topic, qos=1)
+        print(f"✅ 已訂閱主題: {topic}")
+
+    def on_message(client, userdata, message):
+        nonlocal count
+        event = {'t': time.time(), 'topic': message.topic}
+        try:
+            event['payload'] = message.payload.decode('utf-8')
+        except UnicodeDecodeError:
+            event['payload_b64'] = base64.b64encode(message.payload).decode('ascii')
+        f.write(json.dumps(event, ensure_ascii=False) + '\n')
+        f.flush()
+        count += 1
+
+    client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(broker, port, 60)
+    try:
+        client.loop_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.disconnect()
+        f.close()
+        print(f"\n✅ 已記錄 {count} 則訊息到 {path}")
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='感測器數據重播工具')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    play_parser = sub.add_parser('play', help='重播 CSV 或擷取檔')
+    play_parser.add_argument('source', help='CSV 檔、data/raw 分區目錄或 .jsonl 擷取檔')
+    play_parser.add_argument('--speed', type=float, default=1.0,
+                             help='速度倍數（1 = 原速，100 = 100 倍速，0 = 盡快）')
+    play_parser.add_argument('--target', choices=['broker', 'direct'], default='broker')
+    play_parser.add_argument('--broker', default=BROKER)
+    play_parser.add_argument('--port', type=int, default=PORT)
+    play_parser.add_argument('--data-dir', default='replay_data',
+                             help='direct 模式的輸出目錄；broker 模式 --verify 時為監控程式的數據目錄')
+    play_parser.add_argument('--verify', action='store_true', help='重播後比對儲存結果')
+
+    record_parser = sub.add_parser('record', help='記錄 MQTT 訊息為擷取檔')
+    record_parser.add_argument('output', help='輸出的 .jsonl 檔')
+    record_parser.add_argument('--topic', default=TOPIC)
+    record_parser.add_argument('--broker', default=BROKER)
+    record_parser.add_argument('--port', type=int, default=PORT)
+
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.output, args.topic, args.broker, args.port)
+        return
+
+    print("=" * 60)
+    print(" 感測器數據重播")
+    print("=" * 60)
+    print(f" 來源: {args.source}")
+    print(f" 目標: {args.target}")
+    print(f" 速度: {'盡快' if args.speed <= 0 else f'{args.speed:g}x'}")
+    print("=" * 60)
+
+    started_at = now_ms()
+    if args.target == 'broker':
+        send, close = broker_sender(args.broker, args.port)
+    else:
+        send, close = direct_sender(args.data_dir)
+
+    try:
+        result = replay(read_events(args.source), send, args.speed)
+    finally:
+        close()
+
+    print(f"✅ 已重播 {result['count']} 筆, 耗時 {result['elapsed']:.2f} 秒 "
+          f"({result['rate']:.0f} 筆/秒), 最大落後 {result['max_lag'] * 1000:.1f} ms")
+
+    if args.verify:
+        if args.target == 'broker':
+            # 等待監控程式處理完畢
+            time.sleep(2)
+        direct = args.target == 'direct'
+        problems = verify(args.source, args.data_dir,
+                          None if direct else started_at, check_timestamps=direct)
+        if problems:
+            print("❌ 儲存結果與來源不一致:")
+            for problem in problems:
+                print(f"   - {problem}")
+        else:
+            print("✅ 儲存結果與來源一致")
+
+
+if __name__ == "__main__":
+    main()
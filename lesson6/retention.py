@@ -0,0 +1,202 @@
+"""
+數據保留與自動降採樣
+背景執行緒定期將舊的原始數據分區彙總為 1 分鐘 / 1 小時層級，
+將已封存的原始數據分區壓縮（series.py），並刪除過期的分區
+
+預設保留策略：
+    原始數據     保留 7 天
+    1 分鐘彙總   保留 90 天
+    1 小時彙總   永久保留
+"""
+
+import os
+import threading
+
+from storage import TIER_PARTITION_KEY, merge_rollups, rollup_samples
+from timestamps import DAY_MS, MINUTE_MS, day_name, now_ms
+
+# 保留策略：層級 -> 保留天數（None 表示永久保留）
+DEFAULT_RETENTION = {
+    'raw': 7,
+    '1m': 90,
+    '1h': None,
+}
+
+# 分區結束後需再等待多久才視為「已封存」，避免與跨日寫入衝突
+# （低功耗節點批次回報時，數據最多會延遲一個批次週期才寫入）
+SEAL_GRACE_MS = 30 * MINUTE_MS
+
+# 背景工作執行間隔（秒）
+COMPACT_INTERVAL = 3600
+
+
+def compact_partition(store, day, merge=False):
+    """
+    將一天的原始數據彙總為 1 分鐘與 1 小時層級
+
+    先合併 1 小時彙總，最後才寫入 1 分鐘分區；1 分鐘分區存在即代表
+    該日已完成彙總，即使中途中斷，重新執行也會得到相同結果。
+
+    Args:
+        store: SensorStore 物件
+        day: 日期分區名稱（YYYY-MM-DD）
+        merge: 原始數據只有延遲數據（完整的原始數據已過期刪除）時為 True，
+            與既有的 1 分鐘彙總合併，而不是覆寫
+
+    Returns:
+        int: 本次彙總的原始數據筆數
+    """
+    samples = store.read_partition('raw', day)
+    minute_rollups = rollup_samples(samples, '1m')
+    if merge:
+        minute_rollups = merge_rollups(store.read_partition('1m', day) + minute_rollups, '1m')
+
+    # 合併到當月的 1 小時分區（覆寫同一小時的舊值，可重複執行）
+    month = day[:TIER_PARTITION_KEY['1h']]
+    hourly = {r['timestamp']: r for r in store.read_partition('1h', month)}
+    for rollup in merge_rollups(minute_rollups, '1h'):
+        hourly[rollup['timestamp']] = rollup
+    store.write_rollups('1h', month, [hourly[key] for key in sorted(hourly)])
+
+    store.write_rollups('1m', day, minute_rollups)
+    return len(samples)
+
+
+def merge_late_hours(store, day):
+    """
+    1 分鐘彙總已過期刪除、1 小時彙總仍保留的日期又收到延遲數據時，
+    將 CSV 中的延遲數據以筆數加權合併到既有的 1 小時時間桶
+
+    不能用 compact_partition()：它以原始數據重新計算並覆寫 1 小時時間桶，
+    這時原始數據只剩延遲數據，會蓋掉永久保留的每小時歷史。
+    合併後寫入 1 分鐘分區標記為已彙總，CSV 接著照常壓縮或刪除，不會重複合併。
+
+    Returns:
+        int: 本次合併的延遲數據筆數
+    """
+    samples, _ = store.read_appended(day, 0)
+    minute_rollups = rollup_samples(samples, '1m')
+
+    month = day[:TIER_PARTITION_KEY['1h']]
+    hourly = {r['timestamp']: r for r in store.read_partition('1h', month)}
+    for rollup in merge_rollups(minute_rollups, '1h'):
+        existing = hourly.get(rollup['timestamp'])
+        hourly[rollup['timestamp']] = (rollup if existing is None
+                                       else merge_rollups([existing, rollup], '1h')[0])
+    store.write_rollups('1h', month, [hourly[key] for key in sorted(hourly)])
+
+    store.write_rollups('1m', day, minute_rollups)
+    return len(samples)
+
+
+def _has_hourly(store, day):
+    """1 小時彙總中是否已有這一天的時間桶"""
+    month = day[:TIER_PARTITION_KEY['1h']]
+    return any(store.partition_for('raw', r['timestamp']) == day
+               for r in store.read_partition('1h', month))
+
+
+def run_retention(store, policy=None, now=None):
+    """
+    執行一次彙總、壓縮與清除
+
+    Args:
+        store: SensorStore 物件
+        policy: 保留策略字典（預設 DEFAULT_RETENTION）
+        now: 目前時間（epoch 毫秒，測試用，預設現在）
+
+    Returns:
+        dict: 本次彙總、壓縮與刪除的分區
+    """
+    policy = policy or DEFAULT_RETENTION
+    now = now or now_ms()
+    sealed_before = day_name(now - SEAL_GRACE_MS)
+    result = {'compacted': [], 'compressed': [], 'deleted': []}
+
+    raw_days = policy.get('raw')
+    raw_cutoff = store.partition_for('raw', now - raw_days * DAY_MS) if raw_days is not None else None
+    minute_days = policy.get('1m')
+    minute_cutoff = (store.partition_for('1m', now - minute_days * DAY_MS)
+                     if minute_days is not None else None)
+
+    # 1. 彙總已封存、尚未彙總的原始數據分區；已彙總後又收到延遲數據的分區重新彙總
+    compacted = set(store.list_partitions('1m'))
+    for day in store.list_partitions('raw'):
+        if day >= sealed_before:
+            continue
+        try:
+            if (day not in compacted and minute_cutoff is not None and day < minute_cutoff
+                    and _has_hourly(store, day)):
+                # 1 分鐘彙總已過期刪除：只把 CSV 中的延遲數據合併到既有的 1 小時彙總
+                if not os.path.exists(store.partition_path('raw', day)):
+                    continue
+                merge_late_hours(store, day)
+            elif day not in compacted or store.has_late_data(day):
+                compact_partition(store, day)
+            elif (raw_cutoff is not None and day < raw_cutoff
+                  and os.path.exists(store.partition_path('raw', day))):
+                # 原始數據已過期刪除，只剩延遲數據：合併到既有的彙總
+                compact_partition(store, day, merge=True)
+            else:
+                continue
+        except Exception as e:
+            # 單一分區失敗不影響其他分區的彙總、壓縮與清除
+            print(f"⚠️  彙總分區 {day} 時發生錯誤: {e}")
+            continue
+        result['compacted'].append(('raw', day))
+
+    # 2. 已彙總的原始數據分區由 CSV 轉換為壓縮格式（包含壓縮後才寫入的延遲數據）
+    compacted = set(store.list_partitions('1m'))
+    for day in store.list_partitions('raw'):
+        if (day < sealed_before and day in compacted
+                and os.path.exists(store.partition_path('raw', day))):
+            try:
+                before, after = store.compress_partition(day)
+            except Exception as e:
+                print(f"⚠️  壓縮分區 {day} 時發生錯誤: {e}")
+                continue
+            result['compressed'].append(('raw', day, before, after))
+
+    # 3. 刪除過期分區（原始數據必須已彙總才刪除）
+    for tier, keep_days in policy.items():
+        if keep_days is None:
+            continue
+        cutoff = store.partition_for(tier, now - keep_days * DAY_MS)
+        for partition in store.list_partitions(tier):
+            if partition >= cutoff:
+                continue
+            if tier == 'raw' and partition not in compacted:
+                continue
+            store.delete_partition(tier, partition)
+            result['deleted'].append((tier, partition))
+
+    return result
+
+
+class RetentionWorker(threading.Thread):
+    """定期執行 run_retention 的背景執行緒"""
+
+    def __init__(self, store, policy=None, interval=COMPACT_INTERVAL):
+        super().__init__(daemon=True, name='retention')
+        self.store = store
+        self.policy = policy or DEFAULT_RETENTION
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                result = run_retention(self.store, self.policy)
+                if result['compacted'] or result['compressed'] or result['deleted']:
+                    before = sum(entry[2] for entry in result['compressed'])
+                    after = sum(entry[3] for entry in result['compressed'])
+                    print(f"🗜️  數據整理完成: 彙總 {len(result['compacted'])} 個分區, "
+                          f"壓縮 {len(result['compressed'])} 個分區 ({before} -> {after} bytes), "
+                          f"刪除 {len(result['deleted'])} 個分區")
+            except Exception as e:
+                print(f"⚠️  數據整理時發生錯誤: {e}")
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        """停止背景工作"""
+        self._stop_event.set()
@@ -0,0 +1,320 @@
+"""
+原始數據的壓縮時間序列格式（.tsz）
+已封存的原始數據分區由 CSV（每筆約 30 bytes）轉換為這個格式，由 retention.py 在彙總後執行
+
+每個欄位先轉換為變化量再壓縮，數值變化緩慢時大部分是 0：
+    時間戳記   delta-of-delta（固定取樣間隔時全為 0）
+    溫度/濕度  放大為整數（依數值的小數位數，例如 23.8 -> 238）後取差值
+    電燈狀態   run-length（狀態與連續筆數）
+    裝置       名稱表與每筆的索引
+整數陣列依數值範圍選用 int8 / int16 / int32 / int64，每個區塊再以 zlib 壓縮
+
+檔案結構：
+    'TSZ1'
+    區塊 0 .. 區塊 k-1        每個區塊最多 BLOCK_SIZE 筆，各自獨立壓縮
+    區塊索引                  每個區塊一筆 BLOCK_ENTRY（首筆時間、末筆時間、筆數、位置、長度）
+    BLOCK_FOOTER             區塊數、索引位置、'TSZ1'
+
+讀取時間範圍時先讀取檔尾的索引，只解壓縮與範圍重疊的區塊。
+"""
+
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections import namedtuple
+from itertools import accumulate
+
+MAGIC = b'TSZ1'
+BLOCK_ENTRY = struct.Struct('<qqIQI')
+BLOCK_FOOTER = struct.Struct('<IQ4s')
+
+# 每個區塊的筆數（每秒一筆時約 1 小時）
+BLOCK_SIZE = 4096
+
+# 浮點數放大為整數時最多嘗試的小數位數；超過時該欄位以 float64 原樣儲存
+MAX_DECIMALS = 6
+RAW_FLOAT = 255
+
+COMPRESS_LEVEL = 6
+
+_INT_TYPES = (('b', -2 ** 7, 2 ** 7), ('h', -2 ** 15, 2 ** 15),
+              ('i', -2 ** 31, 2 ** 31), ('q', -2 ** 63, 2 ** 63))
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+BlockInfo = namedtuple('BlockInfo', 'first last count offset length')
+
+
+# ---------- 欄位編碼 ----------
+
+def _pack_array(values, typecode):
+    """typecode（1 byte）+ 長度 + little-endian 內容"""
+    data = array(typecode, values)
+    if _BIG_ENDIAN and data.itemsize > 1:
+        data.byteswap()
+    return typecode.encode('ascii') + struct.pack('<I', len(data)) + data.tobytes()
+
+
+def _pack_ints(values):
+    """以能容納全部數值的最小整數型別儲存"""
+    low = min(values, default=0)
+    high = max(values, default=0)
+    for typecode, minimum, limit in _INT_TYPES:
+        if minimum <= low and high < limit:
+            return _pack_array(values, typecode)
+    raise ValueError('整數超出 int64 範圍')
+
+
+def _fits_int64(values):
+    """數值是否都能以 int64 儲存"""
+    return all(-2 ** 63 <= v < 2 ** 63 for v in values)
+
+
+def _unpack_array(data, offset):
+    """解碼 _pack_array() 的結果，回傳 (array, 下一個位置)"""
+    typecode = chr(data[offset])
+    (length,) = struct.unpack_from('<I', data, offset + 1)
+    values = array(typecode)
+    start = offset + 5
+    end = start + length * values.itemsize
+    values.frombytes(data[start:end])
+    if _BIG_ENDIAN and values.itemsize > 1:
+        values.byteswap()
+    return values, end
+
+
+def _decimals(values):
+    """找出能把所有數值無誤差放大為 int64 整數的最少小數位數（找不到時回傳 None）"""
+    for decimals in range(MAX_DECIMALS + 1):
+        scale = 10 ** decimals
+        if all(abs(v * scale) < 2 ** 63 and round(v * scale) / scale == v for v in values):
+            return decimals
+    return None
+
+
+def _pack_floats(values):
+    """浮點數欄位：放大為整數後儲存首筆與差值（數值或差值超出 int64 時以 float64 原樣儲存）"""
+    decimals = _decimals(values)
+    if decimals is None:
+        return bytes([RAW_FLOAT]) + _pack_array(values, 'd')
+    scale = 10 ** decimals
+    scaled = [round(v * scale) for v in values]
+    deltas = [b - a for a, b in zip(scaled, scaled[1:])]
+    if not _fits_int64(deltas):
+        return bytes([RAW_FLOAT]) + _pack_array(values, 'd')
+    return bytes([decimals]) + struct.pack('<q', scaled[0]) + _pack_ints(deltas)
+
+
+def _unpack_floats(data, offset):
+    decimals = data[offset]
+    if decimals == RAW_FLOAT:
+        values, offset = _unpack_array(data, offset + 1)
+        return list(values), offset
+    (first,) = struct.unpack_from('<q', data, offset + 1)
+    deltas, offset = _unpack_array(data, offset + 9)
+    scale = 10 ** decimals
+    if decimals == 0:
+        return [float(v) for v in accumulate(deltas, initial=first)], offset
+    return [v / scale for v in accumulate(deltas, initial=first)], offset
+
+
+def _pack_labels(labels):
+    """字串表：數量 + 每個字串（長度 + UTF-8）"""
+    parts = [struct.pack('<H', len(labels))]
+    for label in labels:
+        text = label.encode('utf-8')
+        parts.append(struct.pack('<H', len(text)) + text)
+    return b''.join(parts)
+
+
+def _unpack_labels(data, offset):
+    (count,) = struct.unpack_from('<H', data, offset)
+    offset += 2
+    labels = []
+    for _ in range(count):
+        (length,) = struct.unpack_from('<H', data, offset)
+        offset += 2
+        labels.append(data[offset:offset + length].decode('utf-8'))
+        offset += length
+    return labels, offset
+
+
+def encode_block(samples):
+    """
+    將一段依時間排序的原始數據編碼為一個區塊（已壓縮）
+
+    Args:
+        samples: 原始數據字典列表（timestamp / light_status / temperature / humidity / device）
+
+    Returns:
+        bytes: 壓縮後的區塊
+    """
+    timestamps = [s['timestamp'] for s in samples]
+    deltas = [b - a for a, b in zip(timestamps, timestamps[1:])]
+    second_order = deltas[:1] + [b - a for a, b in zip(deltas, deltas[1:])]
+
+    labels = {}
+    codes = []
+    runs = []
+    for sample in samples:
+        code = labels.setdefault(sample['light_status'], len(labels))
+        if codes and codes[-1] == code:
+            runs[-1] += 1
+        else:
+            codes.append(code)
+            runs.append(1)
+
+    devices = {}
+    device_codes = [devices.setdefault(s.get('device') or '', len(devices)) for s in samples]
+
+    parts = [
+        struct.pack('<Iq', len(samples), timestamps[0]), _pack_labels(list(labels)),
+        _pack_ints(second_order),
+        _pack_floats([float(s['temperature']) for s in samples]),
+        _pack_floats([float(s['humidity']) for s in samples]),
+        _pack_ints(codes), _pack_ints(runs),
+        _pack_labels(list(devices)), _pack_ints(device_codes),
+    ]
+    return zlib.compress(b''.join(parts), COMPRESS_LEVEL)
+
+
+def decode_block(block):
+    """
+    解碼 encode_block() 的結果
+
+    Returns:
+        list: 原始數據字典列表
+    """
+    data = zlib.decompress(block)
+    count, first = struct.unpack_from('<Iq', data)
+    labels, offset = _unpack_labels(data, struct.calcsize('<Iq'))
+
+    second_order, offset = _unpack_array(data, offset)
+    timestamps = list(accumulate(accumulate(second_order), initial=first))
+    temperatures, offset = _unpack_floats(data, offset)
+    humidities, offset = _unpack_floats(data, offset)
+    codes, offset = _unpack_array(data, offset)
+    runs, offset = _unpack_array(data, offset)
+    lights = []
+    for code, run in zip(codes, runs):
+        lights.extend([labels[code]] * run)
+    if offset < len(data):
+        device_labels, offset = _unpack_labels(data, offset)
+        device_codes, offset = _unpack_array(data, offset)
+        devices = [device_labels[code] or None for code in device_codes]
+    else:
+        # 沒有裝置欄位的舊區塊
+        devices = [None] * count
+
+    return [
+        {'timestamp': timestamps[i], 'light_status': lights[i],
+         'temperature': temperatures[i], 'humidity': humidities[i], 'device': devices[i]}
+        for i in range(count)
+    ]
+
+
+# ---------- 檔案 ----------
+
+def write_series(path, samples, block_size=BLOCK_SIZE):
+    """
+    以原子方式寫入（覆寫）壓縮檔案
+
+    Args:
+        path: 檔案路徑
+        samples: 原始數據字典列表（會依時間戳記排序）
+        block_size: 每個區塊的筆數
+
+    Returns:
+        int: 檔案大小（bytes）
+    """
+    samples = sorted(samples, key=lambda s: s['timestamp'])
+    temp_path = path + '.tmp'
+    index = []
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(MAGIC)
+            for start in range(0, len(samples), block_size):
+                chunk = samples[start:start + block_size]
+                block = encode_block(chunk)
+                index.append(BLOCK_ENTRY.pack(chunk[0]['timestamp'], chunk[-1]['timestamp'],
+                                              len(chunk), f.tell(), len(block)))
+                f.write(block)
+            index_offset = f.tell()
+            f.write(b''.join(index))
+            f.write(BLOCK_FOOTER.pack(len(index), index_offset, MAGIC))
+            size = f.tell()
+        os.replace(temp_path, path)
+    except BaseException:
+        # 編碼或寫入失敗時不留下暫存檔
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return size
+
+
+def read_index(f):
+    """
+    讀取已開啟檔案的區塊索引
+
+    Returns:
+        list: BlockInfo 列表（依時間排序）
+
+    Raises:
+        ValueError: 不是壓縮檔案或檔案不完整
+    """
+    f.seek(0, os.SEEK_END)
+    if f.tell() < len(MAGIC) + BLOCK_FOOTER.size:
+        raise ValueError('檔案不完整')
+    f.seek(-BLOCK_FOOTER.size, os.SEEK_END)
+    count, index_offset, magic = BLOCK_FOOTER.unpack(f.read(BLOCK_FOOTER.size))
+    if magic != MAGIC:
+        raise ValueError('不是壓縮時間序列檔案')
+    f.seek(index_offset)
+    data = f.read(count * BLOCK_ENTRY.size)
+    return [BlockInfo(*BLOCK_ENTRY.unpack_from(data, i * BLOCK_ENTRY.size)) for i in range(count)]
+
+
+def _read_blocks(f, blocks):
+    result = []
+    for block in blocks:
+        f.seek(block.offset)
+        result.extend(decode_block(f.read(block.length)))
+    return result
+
+
+def read_series(path, start=None, end=None):
+    """
+    讀取壓縮檔案中時間範圍內的原始數據（只解壓縮與範圍重疊的區塊）
+
+    Args:
+        path: 檔案路徑
+        start: 起始時間（epoch 毫秒，含；None 表示不限）
+        end: 結束時間（epoch 毫秒，不含；None 表示不限）
+
+    Returns:
+        list: 依時間排序的原始數據字典列表
+    """
+    with open(path, 'rb') as f:
+        blocks = [b for b in read_index(f)
+                  if (start is None or b.last >= start) and (end is None or b.first < end)]
+        samples = _read_blocks(f, blocks)
+    if start is None and end is None:
+        return samples
+    return [s for s in samples
+            if (start is None or s['timestamp'] >= start) and (end is None or s['timestamp'] < end)]
+
+
+def tail_series(path, count):
+    """讀取壓縮檔案中最後幾筆原始數據（只解壓縮最後的區塊）"""
+    with open(path, 'rb') as f:
+        blocks = read_index(f)
+        needed = []
+        total = 0
+        while blocks and total < count:
+            needed.insert(0, blocks.pop())
+            total += needed[0].count
+        samples = _read_blocks(f, needed)
+    return samples[-count:] if count > 0 else []
@@ -0,0 +1,39 @@
+"""
+app_flask.py 的單元測試（需要 flask 與 flask-socketio）
+
+執行：python -m unittest test_app_flask
+"""
+
+import json
+import unittest
+
+try:
+    import app_flask
+except ImportError:
+    app_flask = None
+
+import metrics
+
+
+@unittest.skipIf(app_flask is None, '沒有安裝 flask / flask-socketio')
+class DiagnosticsTest(unittest.TestCase):
+    def setUp(self):
+        app_flask.device_diagnostics.clear()
+
+    def test_unknown_device_is_not_labelled(self):
+        payload = json.dumps({'device': 'never-seen', 'mem_free': 1000}).encode()
+        app_flask.on_diagnostics('devices/never-seen/diag', payload)
+        self.assertNotIn('never-seen', app_flask.device_diagnostics)
+        self.assertEqual(metrics.DEVICE_MEM_FREE_BYTES.get('never-seen', 'current'), 0)
+
+    def test_known_device_is_recorded(self):
+        app_flask.DEVICES.update({'device': 'diag-known', 'timestamp': 1790812800000,
+                                  'temperature': 20.0, 'humidity': 50.0, 'light_status': '開'})
+        payload = json.dumps({'device': 'diag-known', 'mem_free': 1000}).encode()
+        app_flask.on_diagnostics('devices/diag-known/diag', payload)
+        self.assertIn('diag-known', app_flask.device_diagnostics)
+        self.assertEqual(metrics.DEVICE_MEM_FREE_BYTES.get('diag-known', 'current'), 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
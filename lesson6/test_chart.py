@@ -0,0 +1,81 @@
+"""
+chart.py 的單元測試
+
+執行：python -m unittest test_chart
+"""
+
+import unittest
+
+import chart
+from timestamps import HOUR_MS, MINUTE_MS
+
+START = 1790856000000
+END = START + HOUR_MS
+
+
+class ChartCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = chart.ChartCache(max_entries=2)
+        self.bodies = iter(b'body %d' % i for i in range(100))
+
+    def build(self):
+        return next(self.bodies)
+
+    def test_hit_until_new_data_in_range(self):
+        first = self.cache.get('a', START, END, self.build)
+        self.assertFalse(first[2])
+        self.assertEqual(self.cache.get('a', START, END, self.build), (first[0], first[1], True))
+
+        # 範圍外的數據不影響快取
+        self.cache.note(END)
+        self.cache.note(START - 1)
+        self.assertTrue(self.cache.get('a', START, END, self.build)[2])
+
+        self.cache.note(START + MINUTE_MS)
+        body, etag, cached = self.cache.get('a', START, END, self.build)
+        self.assertFalse(cached)
+        self.assertNotEqual(etag, first[1])
+        self.assertEqual(self.cache.builds, 2)
+
+    def test_moved_range_rebuilds(self):
+        self.cache.get('a', START, END, self.build)
+        self.assertFalse(self.cache.get('a', START + MINUTE_MS, END + MINUTE_MS, self.build)[2])
+
+    def test_data_written_while_building_marks_stale(self):
+        def build():
+            self.cache.note(START + 1)
+            return b'partial'
+
+        self.cache.get('a', START, END, build)
+        self.assertFalse(self.cache.get('a', START, END, self.build)[2])
+
+    def test_evicts_least_recently_used(self):
+        self.cache.get('a', START, END, self.build)
+        self.cache.get('b', START, END, self.build)
+        self.cache.get('a', START, END, self.build)
+        self.cache.get('c', START, END, self.build)
+        self.assertTrue(self.cache.get('a', START, END, self.build)[2])
+        self.assertFalse(self.cache.get('b', START, END, self.build)[2])
+
+
+class RenderTest(unittest.TestCase):
+    def rollups(self):
+        return [{'timestamp': START + i * MINUTE_MS, 'count': 60,
+                 'temperature_avg': 20.0 + i / 10, 'temperature_min': 19.0 + i / 10,
+                 'temperature_max': 21.0 + i / 10, 'humidity_avg': 50.0, 'humidity_min': 49.0,
+                 'humidity_max': 51.0, 'light_ratio': 1.0}
+                for i in range(60)]
+
+    def test_svg_and_png(self):
+        svg = chart.render_svg(self.rollups(), '1m', START, END)
+        self.assertTrue(svg.startswith(b'<svg'))
+        png = chart.render_png(self.rollups(), '1m', START, END, 300, 200)
+        self.assertTrue(png.startswith(b'\x89PNG\r\n\x1a\n'))
+
+    def test_empty_range(self):
+        self.assertTrue(chart.render_png([], '1h', START, START + 24 * HOUR_MS).startswith(b'\x89PNG'))
+        chart.render_svg([], '1h', START, START + 24 * HOUR_MS)
+
+
+if __name__ == '__main__':
+    unittest.main()
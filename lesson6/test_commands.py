@@ -0,0 +1,111 @@
+"""
+commands.py 的單元測試
+
+執行：python -m unittest test_commands
+"""
+
+import json
+import unittest
+from types import SimpleNamespace
+
+import commands
+
+LED_ON = {'action': 'led', 'value': 'on'}
+
+
+class ValidateTest(unittest.TestCase):
+    def test_validate_command(self):
+        self.assertEqual(commands.validate_command({'action': 'pwm', 'value': 100, 'extra': 1}),
+                         {'action': 'pwm', 'value': 100})
+        for data in (None, [], {'action': 'led', 'value': 'blink'}, {'action': 'pwm', 'value': True},
+                     {'action': 'pwm', 'value': commands.PWM_MAX + 1}, {'action': 'reboot'}):
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    commands.validate_command(data)
+
+    def test_validate_device(self):
+        self.assertEqual(commands.validate_device('pico_led_control'), 'pico_led_control')
+        for device in ('', None, 'a/b', 'a+', '#', 'a\0b'):
+            with self.subTest(device=device):
+                with self.assertRaises(ValueError):
+                    commands.validate_device(device)
+
+
+class CommandChannelTest(unittest.TestCase):
+    def setUp(self):
+        self.published = []
+        self.acks = []
+        self.rc = 0
+
+        def publish(topic, payload, qos):
+            self.published.append((topic, json.loads(payload), qos))
+            return SimpleNamespace(rc=self.rc)
+
+        self.channel = commands.CommandChannel(publish, on_ack=self.acks.append)
+
+    def ack(self, device, command_id, **fields):
+        payload = json.dumps(dict(fields, id=command_id))
+        return self.channel.handle_ack(commands.ACK_TOPIC.format(device=device), payload)
+
+    def test_send_publishes_to_device_topic(self):
+        command = self.channel.send('pico', LED_ON)
+        topic, payload, qos = self.published[0]
+        self.assertEqual(topic, 'devices/pico/command')
+        self.assertEqual(payload, {'action': 'led', 'value': 'on', 'id': command['id']})
+        self.assertEqual(qos, 0)
+        self.assertEqual(command['device'], 'pico')
+        self.assertEqual(self.channel.stats()['pending'], 1)
+
+    def test_ack_completes_command(self):
+        command = self.channel.send('pico', LED_ON)
+        result = self.ack('pico', command['id'], ok=True, state='on')
+        self.assertEqual(result['device'], 'pico')
+        self.assertTrue(result['ok'])
+        self.assertEqual(result['state'], 'on')
+        self.assertGreaterEqual(result['rtt_ms'], 0)
+        self.assertEqual(self.acks, [result])
+        self.assertEqual(self.channel.stats()['pending'], 0)
+        # 同一個確認再次送達時不會重複計算
+        self.assertIsNone(self.ack('pico', command['id']))
+
+    def test_ack_from_other_device_is_ignored(self):
+        command = self.channel.send('pico_a', LED_ON)
+        self.assertIsNone(self.ack('pico_b', command['id']))
+        self.assertEqual(self.channel.stats()['pending'], 1)
+        self.assertIsNotNone(self.ack('pico_a', command['id']))
+
+    def test_malformed_acks_are_ignored(self):
+        self.channel.send('pico', LED_ON)
+        for payload in (b'not json', b'[]', b'{"id": [1]}', b'{"id": true}', b'{"id": "unknown"}'):
+            with self.subTest(payload=payload):
+                self.assertIsNone(self.channel.handle_ack('devices/pico/ack', payload))
+        self.assertEqual(self.channel.stats()['pending'], 1)
+
+    def test_unacknowledged_command_times_out(self):
+        self.channel.timeout = 0
+        self.channel.send('pico', LED_ON)
+        stats = self.channel.stats()
+        self.assertEqual(stats['pending'], 0)
+        self.assertEqual(stats['timeouts'], 1)
+
+    def test_failed_publish_is_not_pending(self):
+        self.rc = 4
+        with self.assertRaises(ConnectionError):
+            self.channel.send('pico', LED_ON)
+        self.assertEqual(self.channel.stats()['pending'], 0)
+
+    def test_invalid_device_is_not_published(self):
+        with self.assertRaises(ValueError):
+            self.channel.send('a/b', LED_ON)
+        self.assertEqual(self.published, [])
+
+
+class DeviceFromTopicTest(unittest.TestCase):
+    def test_device_from_topic(self):
+        self.assertEqual(commands.device_from_topic('devices/pico/ack'), 'pico')
+        self.assertIsNone(commands.device_from_topic('devices/ack'))
+        self.assertIsNone(commands.device_from_topic('other/pico/ack'))
+
+
+if __name__ == '__main__':
+    unittest.main()
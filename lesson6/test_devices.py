@@ -0,0 +1,90 @@
+"""
+devices.py 的單元測試
+
+執行：python -m unittest test_devices
+"""
+
+import unittest
+
+import metrics
+from devices import OFFLINE_AFTER, DeviceIndex
+
+# 2026-10-01 12:00 UTC（避開換日）
+NOW = 1790856000000
+
+
+def _sample(device, timestamp, temperature=20.0, humidity=50.0, light_status='開'):
+    return {'device': device, 'timestamp': timestamp, 'temperature': temperature,
+            'humidity': humidity, 'light_status': light_status}
+
+
+class DeviceIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = DeviceIndex()
+
+    def names(self, result):
+        return [d['device'] for d in result['devices']]
+
+    def test_update_keeps_latest_values_and_today_range(self):
+        for i, temperature in enumerate([21.0, 25.0, 19.0]):
+            self.index.update(_sample('pico_a', NOW + i * 1000, temperature), now=NOW + i * 1000)
+        # 延遲送達的舊數據只計入統計
+        self.index.update(_sample('pico_a', NOW - 5000, 30.0, light_status='關'), now=NOW + 3000)
+
+        summary = self.index.get('pico_a', now=NOW + 3000)
+        self.assertEqual(summary['temperature'], 19.0)
+        self.assertEqual(summary['light_status'], '開')
+        self.assertEqual(summary['count'], 4)
+        self.assertEqual(summary['rate_per_min'], 60.0)
+        self.assertEqual(summary['today']['temperature_min'], 19.0)
+        self.assertEqual(summary['today']['temperature_max'], 30.0)
+        self.assertIsNone(self.index.get('missing'))
+
+    def test_online_state_and_silence(self):
+        self.index.update(_sample('old', NOW), now=NOW)
+        self.index.update(_sample('new', NOW), now=NOW + OFFLINE_AFTER * 1000)
+        now = NOW + OFFLINE_AFTER * 1000 + 1000
+
+        result = self.index.query(now=now)
+        self.assertEqual((result['total'], result['online']), (2, 1))
+        self.assertEqual(self.names(self.index.query(state='offline', now=now)), ['old'])
+        self.assertEqual(self.names(self.index.query(state='online', now=now)), ['new'])
+        self.assertEqual(self.names(self.index.query(silent_for=OFFLINE_AFTER, now=now)), ['old'])
+        self.assertEqual(self.names(self.index.query(sort='silence', now=now)), ['old', 'new'])
+        self.assertEqual(self.names(self.index.query(sort='last_seen', now=now)), ['new', 'old'])
+
+    def test_slow_reporting_device_stays_online(self):
+        # 每 10 分鐘批次回報的裝置，沉默 15 分鐘仍視為在線
+        interval = 10 * 60 * 1000
+        for i in range(3):
+            self.index.update(_sample('batch', NOW + i * interval), now=NOW + i * interval)
+        self.assertTrue(self.index.get('batch', now=NOW + 2 * interval + 15 * 60 * 1000)['online'])
+
+    def test_sort_limit_and_match(self):
+        for i, temperature in enumerate([22.0, 28.0, 25.0, 30.0]):
+            self.index.update(_sample(f'pico_{i}', NOW, temperature), now=NOW)
+        self.index.update(_sample('esp_0', NOW, 35.0), now=NOW)
+
+        hottest = self.index.query(sort='temperature', limit=2, match='pico', now=NOW)
+        self.assertEqual(self.names(hottest), ['pico_3', 'pico_1'])
+        self.assertEqual(hottest['matched'], 4)
+        coldest = self.index.query(sort='temperature', descending=False, limit=1, now=NOW)
+        self.assertEqual(self.names(coldest), ['pico_0'])
+        self.assertEqual(self.names(self.index.query(now=NOW))[0], 'esp_0')
+        self.assertEqual(self.index.query(limit=0, now=NOW)['devices'], [])
+
+    def test_rejects_unknown_sort_or_state(self):
+        with self.assertRaises(ValueError):
+            self.index.query(sort='name')
+        with self.assertRaises(ValueError):
+            self.index.query(state='sleeping')
+
+    def test_label_folds_unknown_devices(self):
+        self.index.update(_sample('pico_a', NOW), now=NOW)
+        self.assertIn('pico_a', self.index)
+        self.assertEqual(self.index.label('pico_a'), 'pico_a')
+        self.assertEqual(self.index.label('random-name'), metrics.OTHER_LABEL)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+history.py 的單元測試（需要 numpy）
+
+執行：python -m unittest test_history
+"""
+
+import os
+import time
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import timestamps
+from storage import rollup_samples
+
+
+def _set_tz(name):
+    os.environ['TZ'] = name
+    time.tzset()
+    # 清除 timestamps 的日期快取，避免沿用前一個時區的分段
+    timestamps._day_cache = (0, 0, '', 0)
+
+
+@unittest.skipIf(np is None, '沒有安裝 numpy')
+class ResampleDstTest(unittest.TestCase):
+    def setUp(self):
+        self.old_tz = os.environ.get('TZ')
+
+    def tearDown(self):
+        if self.old_tz is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = self.old_tz
+        time.tzset()
+        timestamps._day_cache = (0, 0, '', 0)
+
+    def frame(self, start, count, step):
+        import history
+
+        stamps = np.arange(count, dtype=np.int64) * step + start
+        frame = history.Frame({
+            'timestamp': stamps,
+            'temperature': np.linspace(20.0, 30.0, count),
+            'humidity': np.full(count, 50.0),
+            'light_status': np.zeros(count, dtype=np.uint16),
+        }, {'light_status': ['開']})
+        samples = [{'timestamp': int(ms), 'temperature': float(t), 'humidity': 50.0, 'light_status': '開'}
+                   for ms, t in zip(stamps, frame['temperature'])]
+        return frame, samples
+
+    def test_buckets_match_rollups_on_half_hour_dst_switch(self):
+        # Lord Howe 島 2026-10-04 02:00 由 UTC+10:30 切換為 UTC+11（半小時），切換前後的整點位置不同
+        _set_tz('Australia/Lord_Howe')
+        start = 1791034200000  # 2026-10-03 13:30 UTC = 當地 10-04 00:00
+        frame, samples = self.frame(start, 24 * 20, 3 * 60 * 1000)
+
+        for tier in ('1m', '1h'):
+            with self.subTest(tier=tier):
+                result = frame.resample(tier)
+                expected = rollup_samples(samples, tier)
+                self.assertEqual(result['timestamp'].tolist(), [r['timestamp'] for r in expected])
+                self.assertEqual(result['count'].tolist(), [r['count'] for r in expected])
+                for got, want in zip(result['temperature_avg'], expected):
+                    self.assertAlmostEqual(got, want['temperature_avg'])
+
+
+if __name__ == '__main__':
+    unittest.main()
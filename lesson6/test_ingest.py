@@ -0,0 +1,185 @@
+"""
+ingest.py 的單元測試
+
+執行：python -m unittest test_ingest
+"""
+
+import json
+import unittest
+
+import ingest
+import metrics
+
+TOPIC = 'living_room/sensor'
+RECEIVED_AT = 1790812800000
+
+
+class MemoryStore:
+    """只記錄寫入內容的 SensorStore 替代品"""
+
+    def __init__(self):
+        self.samples = []
+
+    def append(self, sample):
+        self.samples.append(dict(sample))
+
+
+def _payload(**values):
+    return json.dumps(values).encode('utf-8')
+
+
+class DecodePayloadTest(unittest.TestCase):
+    def test_decodes_values_and_aliases(self):
+        sample = ingest.decode_payload(_payload(light='開', temp=23.5, humi='61', device='pico'))
+        self.assertEqual(sample['light_status'], '開')
+        self.assertEqual(sample['temperature'], 23.5)
+        self.assertEqual(sample['humidity'], 61.0)
+        self.assertEqual(sample['device'], 'pico')
+
+    def test_missing_values_are_none(self):
+        sample = ingest.decode_payload(_payload(temperature=20))
+        self.assertIsNone(sample['humidity'])
+        self.assertIsNone(sample['light_status'])
+
+    def test_rejects_malformed_payloads(self):
+        for payload in (b'[1, 2]', b'not json', _payload(temperature='abc'),
+                        b'{"temperature": NaN}', b'{"temperature": 1e400}', _payload(device=[1])):
+            with self.subTest(payload=payload):
+                with self.assertRaises(ValueError):
+                    ingest.decode_payload(payload)
+
+    def test_rejects_invalid_light_status(self):
+        for value in (['a'], 1, 'a,b\nc', 'x\x00', 'x' * (ingest.LIGHT_STATUS_MAX + 1)):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    ingest.decode_payload(_payload(light_status=value))
+        self.assertEqual(ingest.decode_payload(_payload(light='on'))['light_status'], 'on')
+
+    def test_batch_age_must_be_in_range(self):
+        for age in (-100000, -1, ingest.MAX_BATCH_AGE + 1, 1e12):
+            with self.subTest(age=age):
+                with self.assertRaises(ValueError):
+                    ingest.decode_payload(_payload(samples=[{'temperature': 20, 'age': 0},
+                                                            {'temperature': 21, 'age': age}]))
+        batch = ingest.decode_payload(_payload(samples=[{'temperature': 20, 'age': 60}]))['batch']
+        self.assertEqual(batch[0]['age'], 60.0)
+
+
+class IngestPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.store = MemoryStore()
+        self.pipeline = ingest.IngestPipeline(self.store)
+
+    def test_stores_and_fills_unchanged_fields(self):
+        self.pipeline.process(TOPIC, _payload(temperature=20, humidity=50, light_status='開'), RECEIVED_AT)
+        self.pipeline.process(TOPIC, _payload(temperature=21), RECEIVED_AT + 1000)
+        last = self.store.samples[-1]
+        self.assertEqual(last['temperature'], 21.0)
+        self.assertEqual(last['humidity'], 50.0)
+        self.assertEqual(last['light_status'], '開')
+        self.assertEqual(last['device'], TOPIC)
+        self.assertEqual(last['timestamp'], RECEIVED_AT + 1000)
+
+    def test_batch_is_stored_with_sample_times(self):
+        payload = _payload(device='pico', samples=[{'temperature': 20, 'age': 120},
+                                                   {'temperature': 21, 'age': 0}])
+        self.pipeline.process(TOPIC, payload, RECEIVED_AT)
+        self.assertEqual([s['timestamp'] for s in self.store.samples], [RECEIVED_AT - 120000, RECEIVED_AT])
+
+    def test_batch_with_invalid_age_stores_nothing(self):
+        payload = _payload(samples=[{'temperature': 20, 'age': 0}, {'temperature': 21, 'age': -100000}])
+        self.assertIsNone(self.pipeline.process(TOPIC, payload, RECEIVED_AT))
+        self.assertEqual(self.store.samples, [])
+
+    def test_store_value_error_does_not_escape(self):
+        class FailingStore(MemoryStore):
+            def append(self, sample):
+                raise ValueError('year -29662 is out of range')
+
+        pipeline = ingest.IngestPipeline(FailingStore())
+        self.assertIsNotNone(pipeline.process(TOPIC, _payload(temperature=20), RECEIVED_AT))
+
+    def test_malformed_message_is_rejected(self):
+        before = metrics.MESSAGES_REJECTED.get(metrics.REJECT_DECODE)
+        self.assertIsNone(self.pipeline.process('any/topic/' + 'x' * 50, b'{', RECEIVED_AT))
+        self.assertEqual(self.store.samples, [])
+        # 以固定的原因作為標籤，不以主題作為標籤
+        self.assertEqual(metrics.MESSAGES_REJECTED.get(metrics.REJECT_DECODE), before + 1)
+
+    def test_thread_survives_errors(self):
+        def fail(sample):
+            raise RuntimeError('boom')
+
+        original = self.pipeline.process
+        calls = []
+
+        def process(topic, payload, received_at):
+            calls.append(payload)
+            if payload == b'crash':
+                raise RuntimeError('boom')
+            return original(topic, payload, received_at)
+
+        self.pipeline.process = process
+        self.pipeline.on_sample = fail
+        self.pipeline.start()
+        try:
+            for payload in (b'crash', b'{', _payload(temperature=20)):
+                self.assertTrue(self.pipeline.submit(TOPIC, payload, RECEIVED_AT))
+            self.pipeline.join()
+        finally:
+            self.pipeline.stop()
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(len(self.store.samples), 1)
+
+    def test_full_queue_rejects_without_blocking(self):
+        pipeline = ingest.IngestPipeline(self.store, maxsize=1)
+        self.assertTrue(pipeline.submit(TOPIC, b'{}'))
+        self.assertFalse(pipeline.submit(TOPIC, b'{}'))
+
+
+class SequenceTrackerTest(unittest.TestCase):
+    def setUp(self):
+        self.tracker = ingest.SequenceTracker(window=8)
+
+    def test_detects_redelivery(self):
+        self.assertFalse(self.tracker.is_duplicate('a', 1))
+        self.assertFalse(self.tracker.is_duplicate('a', 2))
+        self.assertTrue(self.tracker.is_duplicate('a', 2))
+        self.assertTrue(self.tracker.is_duplicate('a', 1))
+
+    def test_accepts_out_of_order_within_window(self):
+        self.assertFalse(self.tracker.is_duplicate('a', 5))
+        self.assertFalse(self.tracker.is_duplicate('a', 3))
+        self.assertTrue(self.tracker.is_duplicate('a', 3))
+        self.assertFalse(self.tracker.is_duplicate('a', 4))
+
+    def test_devices_are_independent(self):
+        self.assertFalse(self.tracker.is_duplicate('a', 1))
+        self.assertFalse(self.tracker.is_duplicate('b', 1))
+
+    def test_new_boot_restarts_sequence(self):
+        self.assertFalse(self.tracker.is_duplicate('a', 10, boot=1))
+        self.assertFalse(self.tracker.is_duplicate('a', 10, boot=2))
+        self.assertTrue(self.tracker.is_duplicate('a', 10, boot=2))
+
+    def test_large_rewind_is_treated_as_reboot(self):
+        self.assertFalse(self.tracker.is_duplicate('a', 100))
+        self.assertFalse(self.tracker.is_duplicate('a', 1))
+        self.assertTrue(self.tracker.is_duplicate('a', 1))
+
+    def test_large_jump_forgets_old_window(self):
+        self.assertFalse(self.tracker.is_duplicate('a', 1))
+        self.assertFalse(self.tracker.is_duplicate('a', 50))
+        self.assertTrue(self.tracker.is_duplicate('a', 50))
+
+    def test_pipeline_skips_duplicates(self):
+        store = MemoryStore()
+        pipeline = ingest.IngestPipeline(store)
+        payload = _payload(temperature=20, device='pico', seq=7, boot=3)
+        self.assertIsNotNone(pipeline.process(TOPIC, payload, RECEIVED_AT))
+        self.assertIsNone(pipeline.process(TOPIC, payload, RECEIVED_AT + 1000))
+        self.assertEqual(len(store.samples), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+metrics.py 與 log_config.py 的單元測試
+
+執行：python -m unittest test_metrics
+"""
+
+import logging
+import unittest
+
+import metrics
+from log_config import SampledLogger
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_counter_with_labels(self):
+        counter = metrics.Counter('test_total', '測試', ['topic'], registry=self.registry)
+        counter.inc('a')
+        counter.inc('a', amount=2)
+        counter.inc('b')
+        self.assertEqual(counter.get('a'), 3)
+        text = self.registry.render()
+        self.assertIn('# TYPE test_total counter', text)
+        self.assertIn('test_total{topic="a"} 3', text)
+        self.assertIn('test_total{topic="b"} 1', text)
+
+    def test_label_count_must_match(self):
+        counter = metrics.Counter('test_total', '測試', ['topic'], registry=self.registry)
+        with self.assertRaises(ValueError):
+            counter.inc()
+
+    def test_label_values_are_escaped(self):
+        counter = metrics.Counter('test_total', '測試', ['device'], registry=self.registry)
+        counter.inc('a"b\\c')
+        self.assertIn('test_total{device="a\\"b\\\\c"} 1', self.registry.render())
+
+    def test_unlabelled_metric_starts_at_zero(self):
+        metrics.Counter('test_total', '測試', registry=self.registry)
+        self.assertIn('test_total 0', self.registry.render())
+
+    def test_gauge_function(self):
+        gauge = metrics.Gauge('test_depth', '測試', registry=self.registry)
+        gauge.set_function(lambda: 7)
+        self.assertIn('test_depth 7', self.registry.render())
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('test_seconds', '測試', buckets=(0.1, 1.0), registry=self.registry)
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value)
+        text = self.registry.render()
+        self.assertIn('test_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{le="1"} 2', text)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn('test_seconds_sum 5.55', text)
+        self.assertIn('test_seconds_count 3', text)
+
+    def test_histogram_timer(self):
+        histogram = metrics.Histogram('test_seconds', '測試', registry=self.registry)
+        with histogram.time():
+            pass
+        self.assertEqual(histogram.count(), 1)
+
+    def test_latency_window_percentiles(self):
+        window = metrics.LatencyWindow(size=100)
+        self.assertEqual(window.percentiles()['p50_ms'], None)
+        for ms in range(1, 101):
+            window.add(ms / 1000)
+        result = window.percentiles()
+        self.assertEqual(result['count'], 100)
+        self.assertEqual(result['p50_ms'], 51.0)
+        self.assertEqual(result['max_ms'], 100.0)
+
+
+class SampledLoggerTest(unittest.TestCase):
+    def test_logs_first_and_every_nth(self):
+        logger = logging.getLogger('test_sampled')
+        logger.setLevel(logging.INFO)
+        sampled = SampledLogger(logger, every=3)
+        with self.assertLogs(logger, logging.INFO) as captured:
+            for _ in range(7):
+                sampled.info('key', 'message')
+        self.assertEqual(len(captured.records), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
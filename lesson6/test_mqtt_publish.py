@@ -14,6 +14,9 @@ BROKER = "localhost"
 PORT = 1883
 TOPIC = "living_room/sensor"  # 與 config.py 中的設定一致
 
+# 每次執行產生不同的 boot，監控端才不會把 message_id 重新從 1 開始的訊息當成重複
+BOOT_ID = random.getrandbits(16)
+
 def on_connect(client, userdata, flags, reason_code, properties):
     """連線回調函數"""
     if reason_code.is_failure:
@@ -41,8 +44,10 @@ def publish_test_data(client, count=10, interval=2):
             "humidity": round(50 + random.uniform(-10, 20), 2),     # 40-70%
             "light_status": "開" if i % 2 == 0 else "關",
             "timestamp": datetime.now().isoformat(),
+            "ts": int(time.time() * 1000),  # 取樣時間（epoch 毫秒），監控端用來量測延遲
             "device": "測試裝置",
-            "message_id": i + 1
+            "message_id": i + 1,
+            "boot": BOOT_ID
         }
         
         # 轉換為 JSON 字串
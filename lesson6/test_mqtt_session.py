@@ -0,0 +1,50 @@
+"""
+mqtt_session.py 的單元測試（需要 paho-mqtt）
+
+執行：python -m unittest test_mqtt_session
+"""
+
+import unittest
+from types import SimpleNamespace
+
+import metrics
+
+try:
+    import mqtt_session
+except ImportError:
+    mqtt_session = None
+
+
+@unittest.skipIf(mqtt_session is None, '沒有安裝 paho-mqtt')
+class MqttSessionTest(unittest.TestCase):
+    def test_backoff_is_capped(self):
+        for attempt in range(20):
+            delay = mqtt_session.backoff_delay(attempt, base=0.5, cap=30)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(30, 0.5 * 2 ** attempt))
+
+    def test_callback_error_does_not_escape(self):
+        received = []
+
+        def on_message(topic, payload):
+            received.append(payload)
+            if payload == b'bad':
+                raise RuntimeError('boom')
+
+        session = mqtt_session.MqttSession('localhost', 1883, 'test', ['t'], on_message)
+        for payload in (b'bad', b'good'):
+            session._on_message(None, None, SimpleNamespace(topic='t', payload=payload, dup=False))
+        self.assertEqual(received, [b'bad', b'good'])
+
+    def test_redeliveries_are_labelled_by_subscription(self):
+        session = mqtt_session.MqttSession('localhost', 1883, 'test', ['devices/+/ack'], lambda t, p: None)
+        before = metrics.MQTT_REDELIVERIES.get('devices/+/ack')
+        for device in ('a', 'b', 'c'):
+            session._on_message(None, None, SimpleNamespace(topic=f'devices/{device}/ack', payload=b'{}', dup=True))
+        self.assertEqual(metrics.MQTT_REDELIVERIES.get('devices/+/ack'), before + 3)
+        self.assertEqual(metrics.MQTT_REDELIVERIES.get('devices/a/ack'), 0)
+        self.assertEqual(session.subscription_for('other/topic'), 'other')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+packed.py 的單元測試
+
+執行：python -m unittest test_packed
+"""
+
+import math
+import unittest
+
+import packed
+
+
+class PackSampleTest(unittest.TestCase):
+    def sample(self, **values):
+        return dict({'timestamp': 1760000000000, 'temperature': 23.5, 'humidity': 61.0,
+                     'light_status': '開', 'device': 'pico_1'}, **values)
+
+    def test_round_trip(self):
+        decoded = packed.unpack_sample(packed.pack_sample(self.sample(), 1760000000123))
+        self.assertEqual(decoded['timestamp'], 1760000000000)
+        self.assertEqual(decoded['emitted_at'], 1760000000123)
+        self.assertEqual(decoded['temperature'], 23.5)
+        self.assertEqual(decoded['light_status'], '開')
+        self.assertEqual(decoded['device'], 'pico_1')
+
+    def test_missing_value_is_none(self):
+        decoded = packed.unpack_sample(packed.pack_sample(self.sample(humidity=None), 0))
+        self.assertIsNone(decoded['humidity'])
+
+    def test_out_of_float32_range_becomes_inf(self):
+        # 有限但超出 float32 範圍的數值不能讓 struct 拋出 OverflowError
+        decoded = packed.unpack_sample(packed.pack_sample(self.sample(temperature=1e39, humidity=-1e39), 0))
+        self.assertEqual(decoded['temperature'], math.inf)
+        self.assertEqual(decoded['humidity'], -math.inf)
+
+    def test_matches_columns(self):
+        # 與歷史數據的欄位式編碼結果一致
+        rows = [self.sample(temperature=1e39)]
+        column = packed.unpack_columns(packed.pack_columns(rows, packed.RAW_COLUMNS))[0]['temperature']
+        live = packed.unpack_sample(packed.pack_sample(rows[0], 0))['temperature']
+        self.assertEqual(live, column)
+
+    def test_columns_carry_same_fields_as_json(self):
+        # 二進位與 JSON 的歷史數據回應欄位相同
+        rows = [self.sample(), self.sample(device='pico_2', light_status='關')]
+        decoded = packed.unpack_columns(packed.pack_columns(rows, packed.RAW_COLUMNS))
+        self.assertEqual([set(row) for row in decoded], [set(row) for row in rows])
+        self.assertEqual([row['device'] for row in decoded], ['pico_1', 'pico_2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+replay.py 的單元測試
+
+執行：python -m unittest test_replay
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import replay
+from storage import SensorStore
+
+# 2026-10-01 00:00 UTC 之後，每秒一筆，兩台裝置交錯
+START = 1790812800000
+
+
+class ReplayDevicesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp, 'source')
+        self.target = os.path.join(self.tmp, 'target')
+        store = SensorStore(self.source)
+        for i in range(6):
+            store.append({'timestamp': START + i * 1000, 'light_status': '開',
+                          'temperature': 20.0 + i, 'humidity': 50.0,
+                          'device': 'pico_a' if i % 2 == 0 else 'pico_b'})
+        store.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def raw_dir(self):
+        return os.path.join(self.source, 'raw')
+
+    def test_events_keep_devices_and_count_seq_per_device(self):
+        payloads = [json.loads(payload) for _, _, payload in replay.read_csv_events(self.raw_dir())]
+        self.assertEqual([p['device'] for p in payloads],
+                         ['pico_a', 'pico_b', 'pico_a', 'pico_b', 'pico_a', 'pico_b'])
+        self.assertEqual([p['seq'] for p in payloads], [0, 0, 1, 1, 2, 2])
+
+    def test_direct_replay_verifies_with_two_devices(self):
+        send, close = replay.direct_sender(self.target)
+        try:
+            result = replay.replay(replay.read_events(self.raw_dir()), send, speed=0)
+        finally:
+            close()
+        self.assertEqual(result['count'], 6)
+        self.assertEqual(replay.verify(self.raw_dir(), self.target, None, check_timestamps=True), [])
+
+        stored = SensorStore(self.target)
+        devices = [s['device'] for day in stored.list_partitions('raw')
+                   for s in stored.read_partition('raw', day)]
+        stored.close()
+        self.assertEqual(devices.count('pico_a'), 3)
+        self.assertEqual(devices.count('pico_b'), 3)
+
+    def test_verify_detects_merged_devices(self):
+        # 接收端把兩台裝置合併為同一個名稱時，比對結果必須不一致
+        store = SensorStore(self.target)
+        for sample in replay.read_raw_samples(self.raw_dir()):
+            store.append(dict(sample, device=replay.REPLAY_DEVICE))
+        store.close()
+        problems = replay.verify(self.raw_dir(), self.target, None, check_timestamps=True)
+        self.assertTrue(any('device' in problem for problem in problems))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+"""
+retention.py 的單元測試
+
+執行：python -m unittest test_retention
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+import retention
+from storage import SensorStore
+from timestamps import DAY_MS, MINUTE_MS, from_datetime
+
+# 測試的「現在」：本地時間 2026-06-30 12:00
+NOW = from_datetime(datetime(2026, 6, 30, 12))
+
+
+def _at(day, hour, minute=0):
+    """本地時間 2026-<day> hour:minute 的 epoch 毫秒"""
+    return from_datetime(datetime.strptime(f'2026-{day} {hour}:{minute}', '%Y-%m-%d %H:%M'))
+
+
+class RetentionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = SensorStore(self.tmp)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp)
+
+    def write(self, timestamps, temperature=20.0):
+        for ms in timestamps:
+            self.store.append({'timestamp': ms, 'light_status': '開', 'temperature': temperature,
+                               'humidity': 50.0, 'device': 'pico'})
+        self.store.close()
+
+    def hourly(self, month='2026-06'):
+        return {r['timestamp']: r for r in self.store.read_partition('1h', month)}
+
+    def test_compacts_compresses_and_keeps_recent_raw(self):
+        self.write([_at('06-25', 10, m) for m in range(3)])
+        result = retention.run_retention(self.store, now=NOW)
+
+        self.assertEqual(result['compacted'], [('raw', '2026-06-25')])
+        self.assertEqual([entry[1] for entry in result['compressed']], ['2026-06-25'])
+        self.assertEqual(result['deleted'], [])
+        self.assertFalse(os.path.exists(self.store.partition_path('raw', '2026-06-25')))
+        self.assertEqual(len(self.store.read_partition('raw', '2026-06-25')), 3)
+        self.assertEqual(len(self.store.read_partition('1m', '2026-06-25')), 3)
+        self.assertEqual(self.hourly()[_at('06-25', 10)]['count'], 3)
+
+    def test_deletes_expired_raw_only_after_compaction(self):
+        self.write([_at('06-10', 8)])
+        result = retention.run_retention(self.store, now=NOW)
+
+        self.assertIn(('raw', '2026-06-10'), result['deleted'])
+        self.assertEqual(self.store.list_partitions('raw'), [])
+        self.assertEqual(self.store.list_partitions('1m'), ['2026-06-10'])
+        self.assertEqual(self.hourly()[_at('06-10', 8)]['count'], 1)
+
+    def test_skips_unsealed_partition(self):
+        self.write([NOW - MINUTE_MS])
+        result = retention.run_retention(self.store, now=NOW)
+        self.assertEqual(result['compacted'], [])
+        self.assertEqual(self.store.list_partitions('1m'), [])
+
+    def test_late_data_after_raw_expired_merges_into_minutes(self):
+        self.write([_at('06-10', 8)], temperature=20.0)
+        retention.run_retention(self.store, now=NOW)
+        # 原始數據已刪除，同一分鐘又收到一筆延遲數據
+        self.write([_at('06-10', 8) + 1000], temperature=30.0)
+        retention.run_retention(self.store, now=NOW)
+
+        minutes = self.store.read_partition('1m', '2026-06-10')
+        self.assertEqual(len(minutes), 1)
+        self.assertEqual(minutes[0]['count'], 2)
+        self.assertAlmostEqual(minutes[0]['temperature_avg'], 25.0)
+        self.assertEqual(self.hourly()[_at('06-10', 8)]['count'], 2)
+
+    def test_late_data_after_minutes_expired_keeps_hourly_history(self):
+        # 1 分鐘彙總保留 90 天，1 小時永久保留
+        self.write([_at('03-01', 8, m) for m in range(4)], temperature=20.0)
+        retention.run_retention(self.store, now=_at('03-02', 12))
+        retention.run_retention(self.store, now=NOW)
+        self.assertEqual(self.store.list_partitions('1m'), [])
+        before = self.hourly('2026-03')[_at('03-01', 8)]
+        self.assertEqual(before['count'], 4)
+
+        # 延遲數據：一筆落在既有的時間桶，一筆落在新的時間桶
+        self.write([_at('03-01', 8, 30), _at('03-01', 9)], temperature=30.0)
+        result = retention.run_retention(self.store, now=NOW)
+
+        hourly = self.hourly('2026-03')
+        self.assertEqual(hourly[_at('03-01', 8)]['count'], 5)
+        self.assertAlmostEqual(hourly[_at('03-01', 8)]['temperature_avg'], 22.0)
+        self.assertEqual(hourly[_at('03-01', 8)]['temperature_max'], 30.0)
+        self.assertEqual(hourly[_at('03-01', 9)]['count'], 1)
+        # 延遲數據的原始數據與 1 分鐘分區照常過期刪除
+        self.assertIn(('raw', '2026-03-01'), result['deleted'])
+        self.assertEqual(self.store.list_partitions('raw'), [])
+        self.assertEqual(self.store.list_partitions('1m'), [])
+
+        # 再執行一次不會重複合併
+        retention.run_retention(self.store, now=NOW)
+        self.assertEqual(self.hourly('2026-03')[_at('03-01', 8)]['count'], 5)
+
+    def test_late_data_not_merged_twice_when_raw_outlives_minutes(self):
+        policy = {'raw': 200, '1m': 90, '1h': None}
+        self.write([_at('03-01', 8)], temperature=20.0)
+        retention.run_retention(self.store, policy, now=_at('03-02', 12))
+        retention.run_retention(self.store, policy, now=NOW)
+        self.write([_at('03-01', 8, 5)], temperature=30.0)
+        retention.run_retention(self.store, policy, now=NOW)
+        retention.run_retention(self.store, policy, now=NOW)
+
+        self.assertEqual(self.hourly('2026-03')[_at('03-01', 8)]['count'], 2)
+        self.assertEqual(len(self.store.read_partition('raw', '2026-03-01')), 2)
+
+    def test_failed_partition_does_not_block_others(self):
+        self.write([_at('06-10', 8)])
+        self.write([_at('06-11', 8)])
+        original = self.store.compress_partition
+
+        def compress(day):
+            if day == '2026-06-10':
+                raise ValueError('boom')
+            return original(day)
+
+        self.store.compress_partition = compress
+        result = retention.run_retention(self.store, now=NOW)
+        self.assertEqual([entry[1] for entry in result['compressed']], ['2026-06-11'])
+        self.assertIn(('raw', '2026-06-10'), result['deleted'])
+        self.assertIn(('raw', '2026-06-11'), result['deleted'])
+
+    def test_expired_minutes_are_deleted(self):
+        self.write([_at('03-01', 8)])
+        retention.run_retention(self.store, now=_at('03-02', 12))
+        self.assertEqual(self.store.list_partitions('1m'), ['2026-03-01'])
+        result = retention.run_retention(self.store, now=NOW)
+        self.assertIn(('1m', '2026-03-01'), result['deleted'])
+        self.assertLess(_at('03-01', 8), NOW - 90 * DAY_MS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+series.py 的單元測試
+
+執行：python -m unittest test_series
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import series
+
+START = 1790812800000
+
+
+def _samples(count, start=START, step=1000):
+    return [{'timestamp': start + i * step, 'light_status': '開' if i % 7 < 4 else '關',
+             'temperature': round(20.0 + i * 0.1, 1), 'humidity': 55.0 + i % 3,
+             'device': 'pico_a' if i % 2 == 0 else 'pico_b'}
+            for i in range(count)]
+
+
+class BlockTest(unittest.TestCase):
+    def test_round_trip(self):
+        samples = _samples(50)
+        self.assertEqual(series.decode_block(series.encode_block(samples)), samples)
+
+    def test_irregular_timestamps_and_missing_device(self):
+        samples = _samples(5)
+        samples[2]['timestamp'] += 123
+        samples[3]['timestamp'] += 5000
+        samples[4]['device'] = None
+        self.assertEqual(series.decode_block(series.encode_block(samples)), samples)
+
+    def test_unscalable_floats_stored_as_float64(self):
+        # 小數位數過多或放大後超出 int64 範圍時以 float64 原樣儲存
+        samples = _samples(3)
+        samples[0]['temperature'] = 1 / 3
+        samples[1]['humidity'] = 1e300
+        decoded = series.decode_block(series.encode_block(samples))
+        self.assertEqual([s['temperature'] for s in decoded], [s['temperature'] for s in samples])
+        self.assertEqual([s['humidity'] for s in decoded], [s['humidity'] for s in samples])
+
+    def test_delta_overflow_falls_back_to_float64(self):
+        samples = _samples(2)
+        samples[0]['temperature'] = -9e18
+        samples[1]['temperature'] = 9e18
+        decoded = series.decode_block(series.encode_block(samples))
+        self.assertEqual([s['temperature'] for s in decoded], [-9e18, 9e18])
+
+
+class FileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, '2026-10-01.tsz')
+        self.samples = _samples(25)
+        series.write_series(self.path, list(reversed(self.samples)), block_size=10)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_read_all_sorted(self):
+        self.assertEqual(series.read_series(self.path), self.samples)
+        with open(self.path, 'rb') as f:
+            self.assertEqual([b.count for b in series.read_index(f)], [10, 10, 5])
+
+    def test_read_range(self):
+        start = self.samples[8]['timestamp']
+        end = self.samples[12]['timestamp']
+        self.assertEqual(series.read_series(self.path, start, end), self.samples[8:12])
+        self.assertEqual(series.read_series(self.path, start=self.samples[20]['timestamp']),
+                         self.samples[20:])
+        self.assertEqual(series.read_series(self.path, end=START), [])
+
+    def test_range_reads_only_overlapping_blocks(self):
+        with mock.patch.object(series, 'decode_block', wraps=series.decode_block) as decode:
+            series.read_series(self.path, self.samples[12]['timestamp'], self.samples[15]['timestamp'])
+        self.assertEqual(decode.call_count, 1)
+
+    def test_tail(self):
+        self.assertEqual(series.tail_series(self.path, 3), self.samples[-3:])
+        self.assertEqual(series.tail_series(self.path, 12), self.samples[-12:])
+        self.assertEqual(series.tail_series(self.path, 100), self.samples)
+        self.assertEqual(series.tail_series(self.path, 0), [])
+
+    def test_rejects_other_files(self):
+        other = os.path.join(self.tmp, 'other.tsz')
+        with open(other, 'wb') as f:
+            f.write(b'not a series file at all')
+        with self.assertRaises(ValueError):
+            series.read_series(other)
+
+    def test_failed_write_keeps_old_file_and_removes_temp(self):
+        with mock.patch.object(series, 'encode_block', side_effect=ValueError('boom')):
+            with self.assertRaises(ValueError):
+                series.write_series(self.path, _samples(3))
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+        self.assertEqual(series.read_series(self.path), self.samples)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+"""
+storage.py 的單元測試
+
+執行：python -m unittest test_storage
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from storage import RAW_FIELDS, SensorStore, read_header
+from timestamps import day_name
+
+# 2026-10-01 12:00 UTC 之後，每秒一筆
+START = 1790856000000
+
+
+class OldPartitionTest(unittest.TestCase):
+    """加入「裝置」欄位之前寫入的原始數據分區（只有 RAW_FIELDS）"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = SensorStore(self.tmp)
+        self.day = day_name(START)
+        self.path = self.store.partition_path('raw', self.day)
+        with open(self.path, 'w', encoding='utf-8', newline='') as f:
+            f.write(','.join(RAW_FIELDS) + '\r\n')
+            for i in range(3):
+                f.write(f'{START + i * 1000},開,{20 + i}.5,55.0\r\n')
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp)
+
+    def test_read_partition_without_device(self):
+        rows = self.store.read_partition('raw', self.day)
+        self.assertEqual([r['temperature'] for r in rows], [20.5, 21.5, 22.5])
+        self.assertEqual([r['device'] for r in rows], [None, None, None])
+
+    def test_recent_and_read_appended(self):
+        self.assertEqual([r['timestamp'] for r in self.store.recent(2)], [START + 1000, START + 2000])
+        rows, offset = self.store.read_appended(self.day, 0)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(offset, os.path.getsize(self.path))
+        self.assertIsNone(rows[0]['device'])
+
+    def test_append_keeps_old_header(self):
+        self.store.append({'timestamp': START + 3000, 'light_status': '關', 'temperature': 23.5,
+                           'humidity': 56.0, 'device': 'pico_a'})
+        self.store.close()
+        self.assertEqual(read_header(self.path), RAW_FIELDS)
+        rows = self.store.read_partition('raw', self.day)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual((rows[-1]['light_status'], rows[-1]['device']), ('關', None))
+
+    def test_compress_old_partition(self):
+        self.store.compress_partition(self.day)
+        rows = self.store.read_partition('raw', self.day)
+        self.assertEqual([r['timestamp'] for r in rows], [START, START + 1000, START + 2000])
+        self.assertEqual([r['device'] for r in rows], [None, None, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
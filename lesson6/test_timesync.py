@@ -0,0 +1,50 @@
+"""
+timesync.py 的單元測試
+
+執行：python -m unittest test_timesync
+"""
+
+import json
+import unittest
+
+import metrics
+import timesync
+
+
+class HandleRequestTest(unittest.TestCase):
+    def setUp(self):
+        self.published = []
+
+    def publish(self, topic, payload, qos):
+        self.published.append((topic, json.loads(payload)))
+
+    def test_responds_with_server_times(self):
+        timesync.handle_request('devices/pico/time/request', b'{"t0": 123}', self.publish)
+        topic, response = self.published[0]
+        self.assertEqual(topic, 'devices/pico/time/response')
+        self.assertEqual(response['t0'], 123)
+        self.assertLessEqual(response['t1'], response['t2'])
+
+    def test_malformed_request_is_ignored(self):
+        timesync.handle_request('devices/pico/time/request', b'{}', self.publish)
+        self.assertEqual(self.published, [])
+
+    def test_unknown_devices_share_one_label(self):
+        before = metrics.TIME_SYNC_REQUESTS.get(metrics.OTHER_LABEL)
+        for i in range(5):
+            timesync.handle_request(f'devices/random-{i}/time/request', b'{"t0": 1}', self.publish,
+                                    label=lambda device: metrics.OTHER_LABEL)
+        timesync.handle_request('devices/random-x/time/request', b'{"t0": 1}', self.publish)
+        self.assertEqual(metrics.TIME_SYNC_REQUESTS.get(metrics.OTHER_LABEL), before + 6)
+        self.assertEqual(metrics.TIME_SYNC_REQUESTS.get('random-0'), 0)
+
+    def test_known_device_keeps_its_label(self):
+        before = metrics.TIME_SYNC_REQUESTS.get('pico_known')
+        timesync.handle_request('devices/pico_known/time/request', b'{"t0": 1, "delay_ms": 12}',
+                                self.publish, label=lambda device: device)
+        self.assertEqual(metrics.TIME_SYNC_REQUESTS.get('pico_known'), before + 1)
+        self.assertEqual(metrics.TIME_SYNC_DELAY_SECONDS.count('pico_known'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+時間戳記工具
+程式內部一律以整數 epoch 毫秒表示時間，只在邊界（CSV 匯出、畫面顯示）才格式化為字串：
+
+    裝置 ts / 收到時間 --> int 毫秒 --> 分區檔案、API、WebSocket
+                                   \\--> format_timestamp()：匯出 CSV、終端機輸出
+
+時間範圍查詢、排序與降採樣都是整數運算；同一秒內的多筆數據也不會得到相同的時間戳記。
+舊版以 '%Y-%m-%d %H:%M:%S' 字串儲存的數據由 parse_timestamp() 轉換。
+"""
+
+import time
+from datetime import datetime, timedelta
+
+# 舊版時間戳記字串格式（本地時間），也是匯出 CSV 的格式
+TEXT_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+SECOND_MS = 1000
+MINUTE_MS = 60 * SECOND_MS
+HOUR_MS = 60 * MINUTE_MS
+DAY_MS = 24 * HOUR_MS
+
+# 最近一次查詢的本地日期：(起始毫秒, 結束毫秒, 'YYYY-MM-DD', UTC 偏移毫秒)
+# 範圍內的日期與 UTC 偏移都相同（通常是一整天；日光節約時間切換的那天在切換點分成兩段），
+# 範圍內的查詢只需比較整數，不必每筆都轉換為 datetime
+_day_cache = (0, 0, '', 0)
+
+
+def now_ms():
+    """目前時間（epoch 毫秒）"""
+    return time.time_ns() // 1_000_000
+
+
+def from_datetime(value):
+    """datetime（無時區時視為本地時間）轉換為 epoch 毫秒"""
+    return round(value.timestamp() * 1000)
+
+
+def parse_timestamp(value):
+    """
+    將儲存或輸入的時間戳記轉換為 epoch 毫秒
+
+    Args:
+        value: 整數毫秒、數字字串或舊版 '%Y-%m-%d %H:%M:%S' 字串
+
+    Returns:
+        int: epoch 毫秒
+
+    Raises:
+        ValueError: 無法辨識的格式
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    return from_datetime(datetime.strptime(value, TEXT_FORMAT))
+
+
+def format_timestamp(ms, fmt=TEXT_FORMAT):
+    """將 epoch 毫秒格式化為本地時間字串（只在匯出與顯示時使用）"""
+    return datetime.fromtimestamp(ms / 1000).strftime(fmt)
+
+
+def _utc_offset(ms):
+    """毫秒當時的本地 UTC 偏移（毫秒）"""
+    return time.localtime(ms // 1000).tm_gmtoff * 1000
+
+
+def local_day(ms):
+    """
+    毫秒所屬的本地日期分段
+
+    一段內的日期與 UTC 偏移都相同：通常是一整天，日光節約時間切換的那天在切換點分成兩段。
+    逐筆轉換大量時間戳記時，可先取得分段再以整數比較（見 _day_cache）。
+
+    Returns:
+        tuple: (起始毫秒, 結束毫秒（不含）, 'YYYY-MM-DD', UTC 偏移毫秒)
+    """
+    global _day_cache
+    cached = _day_cache
+    if cached[0] <= ms < cached[1]:
+        return cached
+    midnight = datetime.fromtimestamp(ms / 1000).replace(hour=0, minute=0, second=0, microsecond=0)
+    # 以本地日期計算隔日零時，日光節約時間切換的那天長度為 23 或 25 小時，不是 DAY_MS
+    start = from_datetime(midnight)
+    end = from_datetime(midnight + timedelta(days=1))
+    offset = _utc_offset(ms)
+    if _utc_offset(start) != _utc_offset(end - 1):
+        # 當天切換 UTC 偏移：以二分搜尋找出切換的那一秒，只快取 ms 所在的一段
+        low, high = start // 1000, (end - 1) // 1000
+        start_offset = _utc_offset(start)
+        while high - low > 1:
+            middle = (low + high) // 2
+            if _utc_offset(middle * 1000) == start_offset:
+                low = middle
+            else:
+                high = middle
+        switch = high * 1000
+        if ms < switch:
+            end = switch
+        else:
+            start = switch
+    cached = (start, end, midnight.strftime('%Y-%m-%d'), offset)
+    _day_cache = cached
+    return cached
+
+
+def day_name(ms):
+    """毫秒所屬的本地日期 'YYYY-MM-DD'（分區名稱）"""
+    return local_day(ms)[2]
+
+
+def bucket_start(ms, step_ms):
+    """
+    毫秒所屬時間桶的起始時間
+
+    以本地時間對齊（例如 1 小時桶從本地整點開始，UTC+5:30 的地區也正確）。
+    """
+    offset = local_day(ms)[3]
+    return ms - (ms + offset) % step_ms
@@ -0,0 +1,56 @@
+"""
+MQTT 校時（NTP 式請求 / 回應）
+Pico 沒有可靠的時鐘，開機後以監控程式的時間為準：
+
+    Pico  --devices/<id>/time/request  {"t0": 裝置 ticks}-->                監控程式
+    Pico  <--devices/<id>/time/response {"t0", "t1": 收到時間, "t2": 回應時間}--
+
+Pico 在 t3 收到回應後計算：
+    來回延遲 delay = (t3 - t0) - (t2 - t1)
+    t3 當下的時間 ≈ t2 + delay / 2
+之後以 ticks_ms() 推算時間，並在數據中附上取樣時間 ts（epoch 毫秒）。
+"""
+
+import json
+import time
+
+import metrics
+from log_config import get_logger
+
+log = get_logger('timesync')
+
+REQUEST_SUBSCRIPTION = 'devices/+/time/request'
+RESPONSE_TOPIC = 'devices/{device}/time/response'
+
+
+def is_request(topic):
+    """是否為校時請求主題"""
+    return topic.startswith('devices/') and topic.endswith('/time/request')
+
+
+def handle_request(topic, payload, publish, label=None):
+    """
+    回應校時請求（在 MQTT 執行緒中呼叫，越快回應越準確）
+
+    Args:
+        topic: devices/<id>/time/request
+        payload: {"t0": 裝置時間}，可附上前一次校時的結果 {"delay_ms", "offset_ms"}
+        publish: 發布函式 publish(topic, payload, qos)
+        label: 裝置名稱 -> 監控指標標籤的函式（例如 DEVICES.label）；
+            None 時一律為 metrics.OTHER_LABEL（主題中的 <id> 由客戶端決定，不能直接作為標籤）
+    """
+    t1 = int(time.time() * 1000)
+    device = topic.split('/')[1]
+    try:
+        request = json.loads(payload)
+        t0 = request['t0']
+    except (ValueError, KeyError, TypeError, UnicodeDecodeError) as e:
+        log.warning('校時請求格式錯誤 (device=%s): %s', device, e)
+        return
+    device_label = metrics.OTHER_LABEL if label is None else label(device)
+    metrics.TIME_SYNC_REQUESTS.inc(device_label)
+    if isinstance(request.get('delay_ms'), (int, float)):
+        metrics.TIME_SYNC_DELAY_SECONDS.observe(request['delay_ms'] / 1000, device_label)
+
+    response = {'t0': t0, 't1': t1, 't2': int(time.time() * 1000)}
+    publish(RESPONSE_TOPIC.format(device=device), json.dumps(response), qos=0)
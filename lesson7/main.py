@@ -1,18 +1,26 @@
 import wifi_connect as wifi
 import time
-import json
 import random
 from umqtt.simple import MQTTClient
+from publish_policy import DeadbandPolicy, REASON_HEARTBEAT
+from telemetry import LoopDiagnostics, PayloadEncoder
 
 # MQTT 設定
 MQTT_BROKER = "172.20.10.3"  # 公開測試用 Broker
 MQTT_PORT = 1883
 CLIENT_ID = "pico_w_publisher"
-TOPIC = "living_room/sensor"  # 改用英文主題避免編碼問題
+TOPIC = b"living_room/sensor"  # 改用英文主題避免編碼問題（預先編碼為 bytes）
 KEEPALIVE = 60  # 保持連線時間（秒）
+SAMPLE_INTERVAL = 10  # 取樣間隔（秒）
+HEARTBEAT = 60  # 數據沒有變化時的心跳間隔（秒）
+VERBOSE = False  # 印出每次發布的數值（print 會配置記憶體，長時間執行時請關閉）
 
-# 嘗試連線 WiFi
+# 燈光狀態：reading 使用字串比較變化，訊息使用預先編碼的 bytes
+LIGHT_BYTES = {"on": b"on", "off": b"off"}
+
+# 嘗試連線 WiFi（啟動時等待連線，之後由 manager.poll() 在背景重新連線）
 wifi.connect()
+manager = wifi.get_manager()
 
 # 顯示 IP
 print("IP:", wifi.get_ip())
@@ -29,38 +37,92 @@ def mqtt_connect():
 # 初始連線
 mqtt_connect()
 
-# 每隔 10 秒發布一次訊息
+# 溫濕度超過門檻或燈光狀態改變才發布，沒有變化時每 HEARTBEAT 秒送一次心跳
+# 數值以 0.1 為單位的整數運算，主迴圈避免配置記憶體
+policy = DeadbandPolicy({"temperature": 3, "humidity": 20}, heartbeat=HEARTBEAT)
+encoder = PayloadEncoder()
+diag = LoopDiagnostics(CLIENT_ID)
+data = {"temperature": 0, "humidity": 0, "light_status": "off"}  # 重複使用的字典
+temperature = 270
+humidity = 600
+light_status = "off"
+next_sample = time.ticks_ms()
+
+
+def wait_next_sample():
+    """在空閒時間回收記憶體、發布診斷，再依固定時間表等待下一次取樣"""
+    global next_sample
+    diag.loop_end()
+    diag.collect()
+    if diag.due() and manager.connected:
+        try:
+            client.publish(diag.topic, diag.encode(encoder))
+        except OSError as e:
+            print(f"診斷發布失敗: {e}")
+    next_sample = time.ticks_add(next_sample, SAMPLE_INTERVAL * 1000)
+    wait = time.ticks_diff(next_sample, time.ticks_ms())
+    if wait > 0:
+        time.sleep_ms(wait)
+    else:
+        next_sample = time.ticks_ms()
+
+
+# 每隔 10 秒取樣一次
 while True:
-    # 產生亂數資料
-    temperature = round(random.uniform(20.0, 35.0), 1)  # 溫度 20~35°C
-    humidity = round(random.uniform(40.0, 80.0), 1)     # 濕度 40~80%
-    light_status = random.choice(["on", "off"])         # 燈光狀態 (英文避免編碼問題)
-    
-    # 建立 JSON 資料
-    data = {
-        "temperature": temperature,
-        "humidity": humidity,
-        "light_status": light_status
-    }
-    message = json.dumps(data)
-    
-    print("-" * 30)
-    
+    diag.loop_start()
+    # 處理 WiFi 事件：斷線時略過發布，重新連上後再連線 MQTT
+    event = manager.poll()
+    if event == wifi.EVENT_DISCONNECTED:
+        print("WiFi 中斷，重新連線中...")
+    elif event == wifi.EVENT_CONNECTED:
+        print(f"WiFi 已重新連線 ({manager.last_join_ms} ms)")
+        try:
+            mqtt_connect()
+        except OSError as e:
+            print(f"MQTT 連線失敗: {e}")
+    if not manager.connected:
+        time.sleep_ms(100)
+        next_sample = time.ticks_ms()
+        continue
+
+    # 產生亂數資料（緩慢變化，模擬真實感測器；單位 0.1）
+    temperature = min(350, max(200, temperature + random.getrandbits(4) % 11 - 5))  # 溫度 20~35°C
+    humidity = min(800, max(400, humidity + random.getrandbits(5) % 31 - 15))       # 濕度 40~80%
+    if random.getrandbits(8) < 26:
+        light_status = "off" if light_status == "on" else "on"  # 燈光狀態 (英文避免編碼問題)
+
+    # 更新同一個字典，不在迴圈中建立新物件
+    data["temperature"] = temperature
+    data["humidity"] = humidity
+    data["light_status"] = light_status
+    reason = policy.check(data)
+    if not reason:
+        if VERBOSE:
+            print("數據沒有變化，略過發布 (已略過", policy.suppressed, "次)")
+        wait_next_sample()
+        continue
+
+    # 直接編碼到預先配置的緩衝區
+    encoder.begin()
+    encoder.put_fixed(b"temperature", temperature, 1)
+    encoder.put_fixed(b"humidity", humidity, 1)
+    encoder.put_str(b"light_status", LIGHT_BYTES[light_status])
+    encoder.put_bool(b"heartbeat", reason == REASON_HEARTBEAT)
+    message = encoder.end()
+
     # 嘗試發布，如果失敗則重新連線
     try:
         client.publish(TOPIC, message)
-        print("已發布訊息:")
-        print(f"  temperature: {temperature}")
-        print(f"  humidity: {humidity}")
-        print(f"  light_status: {light_status}")
-        print(f"Topic: {TOPIC}")
+        policy.sent(data)
+        if VERBOSE:
+            print("已發布訊息", reason, temperature, humidity, light_status)
     except OSError as e:
         print(f"發布失敗: {e}")
         print("嘗試重新連線...")
         mqtt_connect()
-        # 重新連線後再發布一次
+        # 重新連線後再發布一次（message 指向的緩衝區尚未被覆寫）
         client.publish(TOPIC, message)
+        policy.sent(data)
         print("重新連線後發布成功!")
-    
-    print("等待 10 秒後再次發布...")
-    time.sleep(10)
\ No newline at end of file
+
+    wait_next_sample()
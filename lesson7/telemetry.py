@@ -0,0 +1,247 @@
+"""
+避免在主迴圈配置記憶體的 MQTT 訊息編碼與迴圈診斷
+主迴圈每次建立 dict、json.dumps 字串與 f-string 都會配置記憶體，長時間執行後
+heap 破碎、gc.collect() 的停頓時間無法預測，取樣時間也跟著抖動。
+
+PayloadEncoder 將 JSON 直接寫入預先配置的 bytearray，數值以整數（定點數）寫入：
+
+    encoder = PayloadEncoder()
+    encoder.begin()
+    encoder.put_fixed(b"temperature", 253, 1)   # 25.3
+    encoder.put_str(b"device", DEVICE)           # DEVICE 為預先編碼的 bytes
+    client.publish(TOPIC, encoder.end())         # end() 回傳 memoryview
+
+LoopDiagnostics 記錄 gc.mem_free()、回收次數與最長迴圈時間，定期發布到
+devices/<裝置 id>/diag：
+
+    diag = LoopDiagnostics(CLIENT_ID)
+    while True:
+        diag.loop_start()
+        ...                                      # 工作
+        diag.loop_end()
+        diag.collect()                           # 在空閒時間主動回收
+        if diag.due():
+            client.publish(diag.topic, diag.encode(encoder))
+
+寫入使用 memoryview 切片；MicroPython 1.23 起對內建型別的切片不再配置 heap，
+除了 end() 回傳的 memoryview 外，編碼過程在 MicroPython 上不配置記憶體。
+在 CPython（picosim）上整數運算與切片仍會建立物件，bench 量到的配置量只能用來比較修改前後；
+實際情況以裝置回報的 gc_auto（迴圈中自動回收的次數）為準。
+
+本檔案在 lesson6/pico 與 lesson7 中內容相同，請一起修改。
+"""
+import gc
+import time
+
+DIAG_TOPIC = "devices/{}/diag"
+
+# 預設診斷發布間隔（秒）
+DIAG_INTERVAL = 300
+
+_POW10 = (1, 10, 100, 1000, 10000, 100000, 1000000)
+_TRUE = b"true"
+_FALSE = b"false"
+
+
+class PayloadEncoder:
+    """
+    寫入預先配置緩衝區的 JSON 物件編碼器
+
+    只支援整數、定點數、布林與預先編碼的字串（不做跳脫，內容不可包含 " 或 \\）。
+
+    Args:
+        size: 緩衝區大小（位元組）
+
+    Raises:
+        ValueError: 訊息超過緩衝區大小
+    """
+
+    def __init__(self, size=256):
+        self._buf = bytearray(size)
+        self._mv = memoryview(self._buf)
+        self._digits = bytearray(12)
+        self._len = 0
+        self._count = 0
+
+    def begin(self):
+        """開始一則新訊息"""
+        self._len = 0
+        self._count = 0
+        self._write(b"{")
+
+    def end(self):
+        """
+        結束訊息
+
+        Returns:
+            memoryview: 訊息內容（下一次 begin() 前有效，可直接傳給 client.publish）
+        """
+        self._write(b"}")
+        return self._mv[:self._len]
+
+    def put_int(self, key, value):
+        """寫入整數欄位"""
+        self._key(key)
+        if value < 0:
+            self._write(b"-")
+            value = -value
+        self._uint(value, 1)
+
+    def put_fixed(self, key, value, decimals):
+        """
+        寫入定點數欄位
+
+        Args:
+            key: 欄位名稱（bytes）
+            value: 放大 10 ** decimals 倍的整數（例如 253 + decimals=1 -> 25.3）
+            decimals: 小數位數（0 ~ 6）
+        """
+        self._key(key)
+        if value < 0:
+            self._write(b"-")
+            value = -value
+        scale = _POW10[decimals]
+        self._uint(value // scale, 1)
+        if decimals:
+            self._write(b".")
+            self._uint(value % scale, decimals)
+
+    def put_split(self, key, high, low, low_digits):
+        """
+        寫入超過 small int 範圍的整數（例如 epoch 毫秒）
+
+        數值為 high * 10 ** low_digits + low，兩段都在 small int 範圍內，不會配置長整數。
+        """
+        self._key(key)
+        if high:
+            self._uint(high, 1)
+            self._uint(low, low_digits)
+        else:
+            self._uint(low, 1)
+
+    def put_bool(self, key, value):
+        """寫入布林欄位"""
+        self._key(key)
+        self._write(_TRUE if value else _FALSE)
+
+    def put_str(self, key, value):
+        """寫入字串欄位（value 為預先編碼的 bytes）"""
+        self._key(key)
+        self._write(b'"')
+        self._write(value)
+        self._write(b'"')
+
+    def _key(self, key):
+        if self._count:
+            self._write(b",")
+        self._count += 1
+        self._write(b'"')
+        self._write(key)
+        self._write(b'":')
+
+    def _write(self, data):
+        end = self._len + len(data)
+        if end > len(self._buf):
+            raise ValueError("payload 超過緩衝區大小")
+        self._mv[self._len:end] = data
+        self._len = end
+
+    def _uint(self, value, width):
+        """寫入非負整數，不足 width 位數時前面補 0"""
+        digits = self._digits
+        count = 0
+        while value or count < width:
+            digits[count] = 48 + value % 10
+            value //= 10
+            count += 1
+        if self._len + count > len(self._buf):
+            raise ValueError("payload 超過緩衝區大小")
+        buf = self._buf
+        pos = self._len
+        for i in range(count):
+            buf[pos + i] = digits[count - 1 - i]
+        self._len = pos + count
+
+
+class LoopDiagnostics:
+    """
+    主迴圈的記憶體與時間診斷
+
+    gc 沒有提供回收次數，自動回收以「mem_free() 比上次增加」推算
+    （只有回收會釋放記憶體）；collect() 的主動回收另外計算。
+
+    Args:
+        device_id: 裝置 id，診斷發布到 devices/<裝置 id>/diag
+        interval: 診斷發布間隔（秒）
+    """
+
+    def __init__(self, device_id, interval=DIAG_INTERVAL):
+        self.topic = DIAG_TOPIC.format(device_id).encode()
+        self.device = device_id.encode()
+        self.interval_ms = int(interval * 1000)
+        self.loops = 0
+        self.collections = 0       # collect() 的主動回收次數
+        self.auto_collections = 0  # 推算的自動回收次數（配置記憶體時觸發）
+        self.loop_max_us = 0       # 本期最長迴圈時間
+        self.collect_max_us = 0    # 本期最長的主動回收時間
+        gc.collect()
+        self.mem_free = gc.mem_free()
+        self.mem_min_free = self.mem_free
+        self._start = time.ticks_us()
+        self._last_report = time.ticks_ms()
+
+    def loop_start(self):
+        """迴圈工作開始"""
+        self._start = time.ticks_us()
+
+    def loop_end(self):
+        """迴圈工作結束（sleep 之前呼叫）"""
+        elapsed = time.ticks_diff(time.ticks_us(), self._start)
+        if elapsed > self.loop_max_us:
+            self.loop_max_us = elapsed
+        self.loops += 1
+        self._check_free()
+
+    def collect(self):
+        """在空閒時間主動回收，讓回收不會發生在取樣途中"""
+        self._check_free()
+        start = time.ticks_us()
+        gc.collect()
+        elapsed = time.ticks_diff(time.ticks_us(), start)
+        if elapsed > self.collect_max_us:
+            self.collect_max_us = elapsed
+        self.collections += 1
+        self.mem_free = gc.mem_free()
+
+    def due(self):
+        """是否該發布診斷"""
+        return time.ticks_diff(time.ticks_ms(), self._last_report) >= self.interval_ms
+
+    def encode(self, encoder):
+        """
+        編碼診斷訊息，並重新開始計算本期的最大值
+
+        Returns:
+            memoryview: 訊息內容
+        """
+        encoder.begin()
+        encoder.put_str(b"device", self.device)
+        encoder.put_int(b"mem_free", self.mem_free)
+        encoder.put_int(b"mem_min_free", self.mem_min_free)
+        encoder.put_int(b"gc_collections", self.collections)
+        encoder.put_int(b"gc_auto", self.auto_collections)
+        encoder.put_int(b"gc_max_us", self.collect_max_us)
+        encoder.put_int(b"loop_max_us", self.loop_max_us)
+        encoder.put_int(b"loops", self.loops)
+        self.loop_max_us = 0
+        self.collect_max_us = 0
+        self._last_report = time.ticks_ms()
+        return encoder.end()
+
+    def _check_free(self):
+        free = gc.mem_free()
+        if free > self.mem_free:
+            self.auto_collections += 1
+        self.mem_free = free
+        if free < self.mem_min_free:
+            self.mem_min_free = free
@@ -1,84 +1,338 @@
-# wifi_connect.py
-# 作者：ChatGPT for 徐國堂老師
-# 適用：Raspberry Pi Pico W（MicroPython）
+"""
+WiFi 連線工具
+負責處理 WiFi 連線與狀態檢查
 
+提供非阻塞的連線管理器 WifiManager：
+- 在主迴圈中呼叫 poll()，不會卡住迴圈
+- 記住上次連線的 BSSID 與頻道，斷線後直接指定 AP 重新連線（免掃描）；
+  IP 一律由 DHCP 取得（租約可能到期或被分配給其他裝置），只有設定 WIFI_STATIC_IP 時才使用固定 IP
+- 連線失敗時以指數退避重試
+- 連線 / 斷線以事件回報給發布迴圈
+
+本檔案在 lesson6/pico 與 lesson7 中內容相同，請一起修改。
+"""
 import network
 import time
 import socket
+import json
+import random
+import ubinascii
 
 # -------------------------------
-# 你可以設定你的 WiFi 資訊
+# WiFi 設定：優先使用 secrets.py，沒有時使用下列預設值
 # -------------------------------
 WIFI_SSID = "xxxx"
 WIFI_PASSWORD = "xxx"
+# 固定 IP (ip, 子網路遮罩, 閘道, DNS)；None 表示使用 DHCP
+WIFI_STATIC_IP = None
+# 省電模式：False = 關閉省電（延遲最低），True = 開啟省電
+WIFI_POWER_SAVE = False
 
-# -------------------------------
-# WiFi 連線函式
-# -------------------------------
-def connect(ssid=WIFI_SSID, password=WIFI_PASSWORD, retry=20):
+try:
+    import secrets
+    # lesson6 的 secrets.py 使用 SSID / PASSWORD，lesson7 使用 WIFI_SSID / WIFI_PASSWORD
+    WIFI_SSID = getattr(secrets, "SSID", getattr(secrets, "WIFI_SSID", WIFI_SSID))
+    WIFI_PASSWORD = getattr(secrets, "PASSWORD", getattr(secrets, "WIFI_PASSWORD", WIFI_PASSWORD))
+    WIFI_STATIC_IP = getattr(secrets, "WIFI_STATIC_IP", WIFI_STATIC_IP)
+    WIFI_POWER_SAVE = getattr(secrets, "WIFI_POWER_SAVE", WIFI_POWER_SAVE)
+except ImportError:
+    pass
+
+# 快取檔案：記錄上次成功連線的 BSSID / 頻道
+CACHE_FILE = "wifi_cache.json"
+
+# 單次連線嘗試的逾時（毫秒）
+CONNECT_TIMEOUT_MS = 8000
+# 退避時間範圍（毫秒）
+BACKOFF_MIN_MS = 250
+BACKOFF_MAX_MS = 30000
+
+# 連線狀態
+STATE_IDLE = "idle"
+STATE_CONNECTING = "connecting"
+STATE_CONNECTED = "connected"
+STATE_BACKOFF = "backoff"
+
+# poll() 回傳的事件
+EVENT_CONNECTED = "connected"
+EVENT_DISCONNECTED = "disconnected"
+EVENT_FAILED = "failed"
+
+# cyw43 的連線狀態碼
+STAT_GOT_IP = 3
+
+
+def _load_cache():
+    try:
+        with open(CACHE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_cache(cache):
+    try:
+        with open(CACHE_FILE, "w") as f:
+            json.dump(cache, f)
+    except OSError:
+        pass
+
+
+class WifiManager:
     """
-    連線到 WiFi。
-    retry = 嘗試次數（每次間隔 1 秒）
-    回傳：連線後的 WLAN 物件
+    非阻塞 WiFi 連線管理器
+
+    使用方式：
+        wifi = WifiManager()
+        wifi.start()
+        while True:
+            event = wifi.poll()
+            if event == EVENT_CONNECTED:
+                ...  # 重新連線 MQTT
+            if wifi.connected:
+                ...  # 發布數據
     """
-    wlan = network.WLAN(network.STA_IF)
 
-    if wlan.isconnected():
-        print("已經連線過 WiFi：", wlan.ifconfig())
-        return wlan
+    def __init__(self, ssid=None, password=None, static_ip=None, power_save=None):
+        self.ssid = ssid or WIFI_SSID
+        self.password = password or WIFI_PASSWORD
+        self.static_ip = static_ip or WIFI_STATIC_IP
+        self.power_save = WIFI_POWER_SAVE if power_save is None else power_save
+        self.wlan = network.WLAN(network.STA_IF)
+        self.state = STATE_IDLE
+        self.attempts = 0
+        self.last_join_ms = 0  # 最近一次連線花費的時間
+        self._deadline = 0
+        self._started = 0
+        self._use_cache = True
+        self._cache = _load_cache()
+        if self._cache and self._cache.get("ssid") != self.ssid:
+            self._cache = None
 
-    print("啟動 WLAN...")
-    wlan.active(True)
-    time.sleep(1)
+    @property
+    def connected(self):
+        return self.state == STATE_CONNECTED
 
-    print(f"準備連線 SSID：{ssid}")
-    wlan.connect(ssid, password)
+    def ip(self):
+        """取得目前的 IP 位址（未連線時回傳 None）"""
+        if self.connected:
+            return self.wlan.ifconfig()[0]
+        return None
 
-    for i in range(retry):
-        if wlan.isconnected():
-            print("WiFi 連線成功！")
-            print("IP 資訊：", wlan.ifconfig())
-            return wlan
+    def start(self):
+        """開始連線（立即返回，之後由 poll() 推進）"""
+        self.wlan.active(True)
+        self._set_power_save()
+        if self.wlan.isconnected():
+            self.state = STATE_CONNECTED
+            return
+        self._begin_connect()
 
-        print(f"連線中... ({i+1}/{retry})")
-        time.sleep(1)
+    def stop(self):
+        """斷線並關閉 WLAN 介面"""
+        self.wlan.disconnect()
+        self.wlan.active(False)
+        self.state = STATE_IDLE
+
+    def poll(self):
+        """
+        推進連線狀態機（每次主迴圈呼叫一次，不會阻塞）
+
+        Returns:
+            str: EVENT_CONNECTED / EVENT_DISCONNECTED / EVENT_FAILED，沒有事件時回傳 None
+        """
+        now = time.ticks_ms()
+
+        if self.state == STATE_CONNECTED:
+            if self.wlan.isconnected():
+                return None
+            # AP 短暫中斷：不等待，直接用快取的 BSSID 重新連線
+            self.attempts = 0
+            self._use_cache = True
+            self._begin_connect()
+            return EVENT_DISCONNECTED
+
+        if self.state == STATE_CONNECTING:
+            status = self.wlan.status()
+            if status == STAT_GOT_IP:
+                self._on_connected(now)
+                return EVENT_CONNECTED
+            if status < 0 or time.ticks_diff(now, self._deadline) >= 0:
+                self._on_failed(now)
+                return EVENT_FAILED
+            return None
+
+        if self.state == STATE_BACKOFF and time.ticks_diff(now, self._deadline) >= 0:
+            self._begin_connect()
+        return None
+
+    def wait(self, timeout_ms=CONNECT_TIMEOUT_MS):
+        """
+        阻塞等待連線完成（用於程式啟動時）
+
+        Returns:
+            bool: 是否已連線
+        """
+        if self.state == STATE_IDLE:
+            self.start()
+        deadline = time.ticks_add(time.ticks_ms(), timeout_ms)
+        while not self.connected and time.ticks_diff(deadline, time.ticks_ms()) > 0:
+            self.poll()
+            time.sleep_ms(20)
+        return self.connected
+
+    def _set_power_save(self):
+        """設定省電模式（關閉省電可降低延遲，開啟省電可延長電池壽命）"""
+        mode = "PM_POWERSAVE" if self.power_save else "PM_NONE"
+        pm = getattr(network.WLAN, mode, None)
+        if pm is not None:
+            try:
+                self.wlan.config(pm=pm)
+            except (ValueError, OSError):
+                pass
+
+    def _begin_connect(self):
+        cache = self._cache if self._use_cache else None
+        if self.static_ip:
+            # 明確設定的固定 IP 可省略 DHCP 的往返時間
+            self.wlan.ifconfig(tuple(self.static_ip))
+        else:
+            # 不沿用上次取得的 IP：租約到期後同一個位址可能已分配給其他裝置
+            try:
+                self.wlan.ifconfig("dhcp")
+            except (TypeError, ValueError, OSError):
+                pass
+
+        self._started = time.ticks_ms()
+        self._deadline = time.ticks_add(self._started, CONNECT_TIMEOUT_MS)
+        self.state = STATE_CONNECTING
+        try:
+            if cache and cache.get("bssid"):
+                # 指定 BSSID 與頻道可省略掃描
+                self._connect_cached(cache)
+            else:
+                self.wlan.connect(self.ssid, self.password)
+        except OSError:
+            self._on_failed(self._started)
+
+    def _connect_cached(self, cache):
+        bssid = ubinascii.unhexlify(cache["bssid"])
+        try:
+            if cache.get("channel"):
+                self.wlan.connect(self.ssid, self.password,
+                                  bssid=bssid, channel=cache["channel"])
+            else:
+                self.wlan.connect(self.ssid, self.password, bssid=bssid)
+        except TypeError:
+            # 韌體不支援指定 BSSID / 頻道
+            self.wlan.connect(self.ssid, self.password)
+
+    def _on_connected(self, now):
+        self.state = STATE_CONNECTED
+        self.attempts = 0
+        self.last_join_ms = time.ticks_diff(now, self._started)
+
+        cache = {"ssid": self.ssid}
+        try:
+            cache["bssid"] = ubinascii.hexlify(self.wlan.config("bssid")).decode()
+            cache["channel"] = self.wlan.config("channel")
+        except (ValueError, OSError):
+            pass
+        # 只在內容改變時寫入 flash，減少磨損
+        if cache != self._cache:
+            self._cache = cache
+            _save_cache(cache)
+        self._use_cache = True
+
+    def _on_failed(self, now):
+        self.wlan.disconnect()
+        # 快取的 AP 可能已失效，下一次改用完整掃描
+        self._use_cache = False
+        delay = min(BACKOFF_MAX_MS, BACKOFF_MIN_MS << min(self.attempts, 10))
+        delay = delay // 2 + random.getrandbits(16) % (delay // 2 + 1)
+        self.attempts += 1
+        self._deadline = time.ticks_add(now, delay)
+        self.state = STATE_BACKOFF
 
-    raise RuntimeError("❌ WiFi 連線失敗，請檢查 SSID/密碼或距離")
 
 # -------------------------------
-# 斷線函式
+# 共用的連線管理器與簡易函式
 # -------------------------------
+_manager = None
+
+
+def get_manager():
+    """取得共用的 WifiManager"""
+    global _manager
+    if _manager is None:
+        _manager = WifiManager()
+    return _manager
+
+
+def connect_wifi(timeout_ms=10000):
+    """
+    連線到 WiFi（阻塞直到連線或逾時）
+
+    Returns:
+        wlan: network.WLAN 物件，失敗時回傳 None
+    """
+    wifi = get_manager()
+    if wifi.connected and wifi.wlan.isconnected():
+        return wifi.wlan
+
+    print(f"📡 正在連線到 WiFi: {wifi.ssid} ...")
+    if not wifi.wait(timeout_ms):
+        print("❌ WiFi 連線失敗")
+        return None
+
+    print(f"✅ WiFi 連線成功 ({wifi.last_join_ms} ms)")
+    print(f"   IP 位址: {wifi.ip()}")
+    return wifi.wlan
+
+
+def connect(ssid=None, password=None, retry=20):
+    """
+    連線到 WiFi（lesson7 使用）
+    retry = 等待秒數
+    回傳：連線後的 WLAN 物件
+    """
+    global _manager
+    if ssid or password:
+        _manager = WifiManager(ssid, password)
+    wifi = get_manager()
+    if wifi.wait(retry * 1000):
+        print("WiFi 連線成功！")
+        print("IP 資訊：", wifi.wlan.ifconfig())
+        return wifi.wlan
+    raise RuntimeError("❌ WiFi 連線失敗，請檢查 SSID/密碼或距離")
+
+
 def disconnect():
-    wlan = network.WLAN(network.STA_IF)
-    if wlan.isconnected():
-        wlan.disconnect()
-        wlan.active(False)
+    wifi = get_manager()
+    if wifi.wlan.isconnected():
+        wifi.stop()
         print("已斷線")
     else:
         print("目前沒有 WiFi 連線")
 
-# -------------------------------
-# 是否連線成功？
-# -------------------------------
+
 def is_connected():
-    wlan = network.WLAN(network.STA_IF)
-    return wlan.isconnected()
+    return get_manager().wlan.isconnected()
+
 
-# -------------------------------
-# 取得 IP 位址
-# -------------------------------
 def get_ip():
-    wlan = network.WLAN(network.STA_IF)
+    wlan = get_manager().wlan
     if wlan.isconnected():
         return wlan.ifconfig()[0]
     return None
 
-# -------------------------------
-# 測試連線到外部網站（例如 Google）
-# -------------------------------
+
 def test_internet(host="8.8.8.8", port=53, timeout=3):
     """
-    使用 UDP 測試外部網路是否可連線
+    使用 TCP 測試外部網路是否可連線
+
+    會阻塞最多 timeout 秒，請勿在發布迴圈中呼叫；
+    迴圈中請使用 WifiManager.poll() 的事件判斷連線狀態。
     """
     try:
         addr = socket.getaddrinfo(host, port)[0][-1]
@@ -87,5 +341,16 @@ def test_internet(host="8.8.8.8", port=53, timeout=3):
         s.connect(addr)
         s.close()
         return True
-    except:
-        return False
\ No newline at end of file
+    except OSError:
+        return False
+
+
+def test_connection():
+    """測試 WiFi 連線狀態"""
+    wlan = connect_wifi()
+    if wlan and wlan.isconnected():
+        print("網路測試: 正常")
+        return True
+    else:
+        print("網路測試: 失敗")
+        return False
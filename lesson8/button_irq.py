@@ -0,0 +1,148 @@
+"""
+中斷驅動的按鈕模組
+取代「每 10 ms 讀一次 button.value()」的輪詢寫法：
+
+- Pin.irq 在按鈕電位改變的瞬間觸發（硬體中斷），主迴圈不需要輪詢，CPU 可以閒置
+- 第一個邊緣立即生效（leading-edge 防彈跳），之後 debounce_ms 內的彈跳由 Timer 忽略
+- 每個事件以 time.ticks_us() 記錄邊緣發生的時間
+- 事件放入預先配置的環狀佇列，再以 micropython.schedule 交給一般程式碼處理
+
+使用方式：
+    from button_irq import Button, PRESS
+
+    led = Pin(15, Pin.OUT)
+    button = Button(14, fast=led.toggle)  # 按下時在中斷中直接切換 LED
+    while True:
+        event = button.get()              # 沒有事件時回傳 None
+        if event:
+            kind, ticks = event
+"""
+from machine import Pin, Timer, disable_irq, enable_irq
+import micropython
+import time
+from array import array
+
+# 事件種類
+PRESS = 1
+RELEASE = 0
+
+EVENT_NAMES = {PRESS: "press", RELEASE: "release"}
+
+# 中斷處理中發生例外時可以印出錯誤訊息
+micropython.alloc_emergency_exception_buf(100)
+
+
+class Button:
+    """
+    防彈跳的中斷驅動按鈕
+
+    Args:
+        pin: GPIO 編號
+        on_event: 一般回呼 on_event(kind, ticks_us)，以 micropython.schedule 執行，可以配置記憶體
+        fast: 按下時在硬體中斷中直接呼叫的函式（不可配置記憶體，例如 led.toggle）
+        fast_release: 放開時在硬體中斷中直接呼叫的函式（例如 led.off）
+        debounce_ms: 防彈跳時間
+        pull: Pin.PULL_UP（按下為 0）或 Pin.PULL_DOWN（按下為 1）
+        queue_size: 事件佇列大小，佇列滿時丟棄最新的事件並計入 dropped
+    """
+
+    def __init__(self, pin, on_event=None, fast=None, fast_release=None,
+                 debounce_ms=20, pull=Pin.PULL_UP, queue_size=16):
+        self.pin = Pin(pin, Pin.IN, pull)
+        self.on_event = on_event
+        self.fast = fast
+        self.fast_release = fast_release
+        self.debounce_ms = debounce_ms
+        self.pressed_level = 0 if pull == Pin.PULL_UP else 1
+        self.pressed = self.pin.value() == self.pressed_level
+        self.dropped = 0
+
+        # 預先配置佇列，中斷處理中不配置記憶體
+        self._kinds = bytearray(queue_size)
+        self._ticks = array("L", [0] * queue_size)
+        self._head = 0
+        self._count = 0
+
+        self._locked = False
+        self._timer = Timer()
+        # 預先建立綁定方法，避免在中斷中配置記憶體
+        self._unlock_cb = self._unlock
+        self._dispatch_cb = self._dispatch
+
+        self.pin.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING,
+                     handler=self._irq, hard=True)
+
+    def _irq(self, pin):
+        """硬體中斷：第一個邊緣立即生效，之後的彈跳在鎖定期間忽略"""
+        if self._locked:
+            return
+        ticks = time.ticks_us()
+        pressed = pin.value() == self.pressed_level
+        if pressed == self.pressed:
+            return
+        self._accept(pressed, ticks)
+        self._locked = True
+        self._timer.init(mode=Timer.ONE_SHOT, period=self.debounce_ms,
+                         callback=self._unlock_cb)
+
+    def _unlock(self, timer):
+        """防彈跳結束：若鎖定期間按鈕狀態已改變（例如快速放開），補上這個事件"""
+        pressed = self.pin.value() == self.pressed_level
+        if pressed != self.pressed:
+            self._accept(pressed, time.ticks_us())
+            self._timer.init(mode=Timer.ONE_SHOT, period=self.debounce_ms,
+                             callback=self._unlock_cb)
+            return
+        self._locked = False
+
+    def _accept(self, pressed, ticks):
+        self.pressed = pressed
+        if pressed and self.fast is not None:
+            self.fast()
+        elif not pressed and self.fast_release is not None:
+            self.fast_release()
+        if self._count == len(self._kinds):
+            self.dropped += 1
+            return
+        index = (self._head + self._count) % len(self._kinds)
+        self._kinds[index] = PRESS if pressed else RELEASE
+        self._ticks[index] = ticks
+        self._count += 1
+        if self.on_event is not None:
+            try:
+                micropython.schedule(self._dispatch_cb, None)
+            except RuntimeError:
+                # 排程佇列已滿：事件仍在佇列中，下一次 dispatch 會一併處理
+                pass
+
+    def get(self):
+        """
+        取出最舊的事件
+
+        Returns:
+            tuple: (PRESS 或 RELEASE, 邊緣發生時的 ticks_us)，沒有事件時回傳 None
+        """
+        state = disable_irq()
+        try:
+            if not self._count:
+                return None
+            kind = self._kinds[self._head]
+            ticks = self._ticks[self._head]
+            self._head = (self._head + 1) % len(self._kinds)
+            self._count -= 1
+        finally:
+            enable_irq(state)
+        return kind, ticks
+
+    def _dispatch(self, _):
+        """由 micropython.schedule 執行：把佇列中的事件交給 on_event"""
+        event = self.get()
+        while event is not None:
+            self.on_event(*event)
+            event = self.get()
+
+    def close(self):
+        """停用中斷與計時器"""
+        self.pin.irq(handler=None)
+        self._timer.deinit()
+
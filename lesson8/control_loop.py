@@ -0,0 +1,150 @@
+"""
+以硬體計時器驅動的 ADC -> PWM 控制迴圈
+取代「讀取 -> 浮點運算 -> print -> 設定 PWM -> sleep(0.5)」的 2 Hz 迴圈：
+
+- machine.Timer 以固定頻率（預設 1 kHz）在中斷中執行控制迴圈，不受 print 或網路速度影響
+- 中斷中只做整數運算：12 位元取樣 -> 移位平滑 -> 查表（校正 + gamma 曲線）-> duty_u16
+- 查表在初始化時計算一次，中斷中不配置記憶體
+- 每 telemetry_every 次取樣記錄一筆到環狀緩衝區，主迴圈再取出列印或透過 MQTT 發布
+
+使用方式：
+    from machine import ADC, Pin, PWM
+    from control_loop import ControlLoop
+
+    loop = ControlLoop(ADC(Pin(28)), PWM(Pin(15)), rate_hz=1000)
+    loop.start()
+    while True:
+        for ticks, raw, duty in loop.drain():
+            ...
+"""
+from machine import Timer, disable_irq, enable_irq
+import micropython
+import time
+from array import array
+
+# 中斷處理中發生例外時可以印出錯誤訊息
+micropython.alloc_emergency_exception_buf(100)
+
+# ADC 的有效位元數：read_u16() 的低 4 位元只是補零，取 12 位元查表
+ADC_BITS = 12
+ADC_MAX = (1 << ADC_BITS) - 1
+
+# 計數器上限：維持在 small int 範圍內，中斷中才不會配置大整數
+COUNTER_MASK = 0x3FFFFFFF
+
+
+def build_table(gamma=2.2, in_min=0, in_max=ADC_MAX, out_max=65535):
+    """
+    建立 12 位元取樣值 -> duty_u16 的對照表
+
+    Args:
+        gamma: gamma 曲線（人眼對亮度的感受不是線性的，2.2 讓調光更平均；1 = 線性）
+        in_min / in_max: 可變電阻實際的最小 / 最大值（12 位元），範圍外視為 0% / 100%
+        out_max: 最大 duty 值
+
+    Returns:
+        array: 4096 筆的 duty 對照表
+    """
+    span = max(1, in_max - in_min)
+    table = array("H", range(ADC_MAX + 1))
+    for value in range(ADC_MAX + 1):
+        x = min(1.0, max(0.0, (value - in_min) / span))
+        table[value] = int(out_max * x ** gamma + 0.5)
+    return table
+
+
+class ControlLoop:
+    """
+    固定頻率的 ADC -> PWM 控制迴圈
+
+    Args:
+        adc: machine.ADC 物件
+        pwm: machine.PWM 物件
+        rate_hz: 控制頻率（1 kHz 以上，PWM 頻率建議高於控制頻率）
+        smoothing: 平滑程度（0 = 不平滑，n = 以 2^n 筆做指數移動平均）
+        table: build_table() 的對照表，None 時使用 gamma 2.2 的預設曲線
+        telemetry_every: 每幾次取樣記錄一筆遙測
+        telemetry_size: 遙測環狀緩衝區大小，主迴圈來不及取出時覆蓋最舊的資料
+    """
+
+    def __init__(self, adc, pwm, rate_hz=1000, smoothing=3, table=None,
+                 telemetry_every=100, telemetry_size=64):
+        self.adc = adc
+        self.pwm = pwm
+        self.rate_hz = rate_hz
+        self.smoothing = smoothing
+        self.table = table if table is not None else build_table()
+        self.telemetry_every = telemetry_every
+        self.ticks = 0          # 已執行的控制次數（超過 COUNTER_MASK 後從 0 重新計算）
+        self.dropped = 0        # 被覆蓋的遙測筆數
+        self.value = 0          # 目前的平滑後取樣值（12 位元）
+        self.duty = 0           # 目前的 duty
+
+        # 預先配置遙測緩衝區，中斷中不配置記憶體
+        self._tel_ticks = array("L", [0] * telemetry_size)
+        self._tel_raw = array("H", [0] * telemetry_size)
+        self._tel_duty = array("H", [0] * telemetry_size)
+        self._tel_head = 0
+        self._tel_count = 0
+        self._countdown = telemetry_every
+
+        self._acc = (adc.read_u16() >> (16 - ADC_BITS)) << smoothing
+        self._timer = Timer()
+        # 預先建立綁定方法，避免在中斷中配置記憶體
+        self._tick_cb = self._tick
+
+    def start(self):
+        """啟動計時器"""
+        self._timer.init(mode=Timer.PERIODIC, freq=self.rate_hz, callback=self._tick_cb)
+
+    def stop(self):
+        """停止計時器"""
+        self._timer.deinit()
+
+    def _tick(self, timer):
+        """計時器中斷：整數運算完成一次取樣與輸出"""
+        raw = self.adc.read_u16() >> (16 - ADC_BITS)
+        # 指數移動平均：acc 保存 2^n 倍的平均值，只用加減與移位
+        self._acc += raw - (self._acc >> self.smoothing)
+        value = self._acc >> self.smoothing
+        duty = self.table[value]
+        if duty != self.duty:
+            self.pwm.duty_u16(duty)
+            self.duty = duty
+        self.value = value
+        self.ticks = (self.ticks + 1) & COUNTER_MASK
+
+        self._countdown -= 1
+        if self._countdown <= 0:
+            self._countdown = self.telemetry_every
+            size = len(self._tel_raw)
+            if self._tel_count == size:
+                # 緩衝區已滿：覆蓋最舊的一筆
+                self._tel_head = (self._tel_head + 1) % size
+                self._tel_count -= 1
+                self.dropped += 1
+            index = (self._tel_head + self._tel_count) % size
+            self._tel_ticks[index] = time.ticks_ms()
+            self._tel_raw[index] = raw
+            self._tel_duty[index] = duty
+            self._tel_count += 1
+
+    def drain(self):
+        """
+        取出所有遙測資料（在主迴圈中呼叫）
+
+        Returns:
+            list: [(ticks_ms, 12 位元取樣值, duty), ...]
+        """
+        result = []
+        while True:
+            state = disable_irq()
+            if not self._tel_count:
+                enable_irq(state)
+                return result
+            index = self._tel_head
+            item = (self._tel_ticks[index], self._tel_raw[index], self._tel_duty[index])
+            self._tel_head = (index + 1) % len(self._tel_raw)
+            self._tel_count -= 1
+            enable_irq(state)
+            result.append(item)
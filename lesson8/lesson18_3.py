@@ -1,33 +1,82 @@
 from machine import Pin
-from time import sleep_ms
+import machine
+import time
+import json
+import random
+from button_irq import Button, PRESS, EVENT_NAMES
 
 btn_pin = 14
 led_pin = 15
 
-button = Pin(btn_pin, Pin.IN, Pin.PULL_UP)
+# 是否將按鈕事件透過 MQTT 發送到監控程式（需上傳 lesson7 的 wifi_connect.py 並設定 secrets.py）
+MQTT_ENABLED = False
+MQTT_BROKER = "192.168.1.XXX"
+MQTT_PORT = 1883
+MQTT_TOPIC = "living_room/button"
+CLIENT_ID = "pico_button"
+DEVICE = "Pico (按鈕)"
+# 每次開機隨機產生，監控端以 (device, boot, seq) 判斷重複訊息
+BOOT_ID = random.getrandbits(16)
+
 led = Pin(led_pin, Pin.OUT)
 
-# LED 狀態變數
-led_state = False
-# 記錄上一次按鈕狀態
-last_button_state = 1  # PULL_UP，預設為高電位
+# 按下的瞬間在硬體中斷中切換 LED（延遲為微秒等級）
+# 防彈跳由計時器處理，主迴圈不需要 sleep_ms(50) 等待
+button = Button(btn_pin, fast=led.toggle, debounce_ms=20)
+
+
+def mqtt_connect():
+    """連線 WiFi 與 MQTT，失敗時回傳 None（只在本機切換 LED）"""
+    try:
+        import wifi_connect
+        from umqtt.simple import MQTTClient
+    except ImportError as e:
+        print(f"⚠️ 無法啟用 MQTT: {e}")
+        return None
+    if not wifi_connect.connect_wifi():
+        return None
+    client = MQTTClient(CLIENT_ID, MQTT_BROKER, port=MQTT_PORT)
+    try:
+        client.connect()
+        print(f"✅ 已連接到 {MQTT_BROKER}，按鈕事件發送到 {MQTT_TOPIC}")
+        return client
+    except OSError as e:
+        print(f"❌ MQTT 連線失敗: {e}")
+        return None
+
+
+client = mqtt_connect() if MQTT_ENABLED else None
+seq = 0
+last_press = None
 
 while True:
-    current_button_state = button.value()
-    
-    # 偵測按鈕從「放開」變成「按下」的瞬間 (下降邊緣)
-    if last_button_state == 1 and current_button_state == 0:
-        # 防彈跳延遲
-        sleep_ms(50)
-        
-        # 再次確認按鈕確實被按下
-        if button.value() == 0:
-            # 切換 LED 狀態
-            led_state = not led_state
-            led.value(led_state)
-    
-    # 更新按鈕狀態
-    last_button_state = current_button_state
-    
-    # 小延遲減少 CPU 使用
-    sleep_ms(10)
\ No newline at end of file
+    event = button.get()
+    if event is None:
+        # 沒有事件時讓 CPU 閒置，直到下一個中斷
+        machine.idle()
+        continue
+
+    kind, ticks = event
+    if kind == PRESS:
+        # 兩次按下之間的時間（微秒），使用中斷記錄的邊緣時間計算
+        if last_press is not None:
+            print(f"按下 (距離上次 {time.ticks_diff(ticks, last_press)} us)，LED: {led.value()}")
+        else:
+            print(f"按下，LED: {led.value()}")
+        last_press = ticks
+
+    if client is not None:
+        payload = {
+            "device": DEVICE,
+            "button": btn_pin,
+            "event": EVENT_NAMES[kind],
+            "led": led.value(),
+            "ticks_us": ticks,
+            "seq": seq,
+            "boot": BOOT_ID
+        }
+        try:
+            client.publish(MQTT_TOPIC, json.dumps(payload))
+            seq += 1
+        except OSError as e:
+            print(f"發布失敗: {e}")
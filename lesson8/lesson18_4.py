@@ -1,23 +1,77 @@
-from machine import ADC, Pin,PWM
-from time import sleep
+from machine import ADC, Pin, PWM
+from time import sleep, ticks_ms, ticks_diff
+import json
+from control_loop import ControlLoop, build_table, COUNTER_MASK
 
-# 初始化 ADC（使用 GPIO 26）
+# 初始化 ADC（使用 GPIO 28）
 potentiometer = ADC(Pin(28))
 led = PWM(Pin(15))
-led.freq(1000)  # 設定 PWM 頻率為 1000Hz
+led.freq(20000)  # PWM 頻率需高於控制頻率，20kHz 也不會有可聽見的雜音
+
+# 控制迴圈設定
+CONTROL_HZ = 1000     # 每秒調整 1000 次亮度（由硬體計時器執行）
+SMOOTHING = 3         # 以 2^3 = 8 筆做移動平均，減少抖動
+GAMMA = 2.2           # gamma 曲線，讓亮度變化符合人眼感受（1 = 線性）
+
+# 是否將遙測數據透過 MQTT 發布（需上傳 lesson7 的 wifi_connect.py 並設定 secrets.py）
+MQTT_ENABLED = False
+MQTT_BROKER = "192.168.1.XXX"
+MQTT_PORT = 1883
+MQTT_TOPIC = "living_room/dimmer"
+CLIENT_ID = "pico_dimmer"
+REPORT_INTERVAL = 1   # 每 1 秒列印 / 發布一次
+
+
+def mqtt_connect():
+    """連線 WiFi 與 MQTT，失敗時回傳 None（只在本機調光）"""
+    try:
+        import wifi_connect
+        from umqtt.simple import MQTTClient
+    except ImportError as e:
+        print(f"⚠️ 無法啟用 MQTT: {e}")
+        return None
+    if not wifi_connect.connect_wifi():
+        return None
+    client = MQTTClient(CLIENT_ID, MQTT_BROKER, port=MQTT_PORT)
+    try:
+        client.connect()
+        return client
+    except OSError as e:
+        print(f"❌ MQTT 連線失敗: {e}")
+        return None
+
+
+# 控制迴圈在計時器中斷中執行，下面的 print / 網路再慢也不會影響調光
+loop = ControlLoop(potentiometer, led, rate_hz=CONTROL_HZ, smoothing=SMOOTHING,
+                   table=build_table(GAMMA))
+loop.start()
+
+client = mqtt_connect() if MQTT_ENABLED else None
+last_ticks = loop.ticks
+last_time = ticks_ms()
 
 while True:
-    # 讀取 ADC 值（0 ~ 65535）
-    raw_value = potentiometer.read_u16()
-    
-    # 轉換為電壓值（0 ~ 3.3V）
-    voltage = raw_value * 3.3 / 65535
-    
-    # 轉換為百分比（0% ~ 100%）
-    percentage = raw_value * 100 / 65535
-    
-    print(f"原始值: {raw_value}, 電壓: {voltage:.2f}V, 百分比: {percentage:.1f}%")
-    
-    led.duty_u16(raw_value)
-    
-    sleep(0.5)
\ No newline at end of file
+    sleep(REPORT_INTERVAL)
+
+    # 量測實際控制頻率
+    now = ticks_ms()
+    count = (loop.ticks - last_ticks) & COUNTER_MASK
+    rate = count * 1000 // max(1, ticks_diff(now, last_time))
+    last_ticks = loop.ticks
+    last_time = now
+
+    samples = loop.drain()
+    percentage = loop.value * 100 // 4095
+    print(f"原始值: {loop.value}, 百分比: {percentage}%, duty: {loop.duty}, 控制頻率: {rate} Hz")
+
+    if client is not None and samples:
+        payload = {
+            "device": CLIENT_ID,
+            "rate_hz": rate,
+            "dropped": loop.dropped,
+            "samples": [[t, raw, duty] for t, raw, duty in samples]
+        }
+        try:
+            client.publish(MQTT_TOPIC, json.dumps(payload))
+        except OSError as e:
+            print(f"發布失敗: {e}")
@@ -1,16 +1,17 @@
 from machine import Pin
-from time import sleep
+import machine
+from button_irq import Button
 
 btn_pin = 14
 led_pin = 15
 
-button = Pin(btn_pin,Pin.IN,Pin.PULL_UP)
 led = Pin(led_pin, Pin.OUT)
 
+# 按下時 LED 亮、放開時 LED 滅
+# 在硬體中斷中直接切換 LED，不需要在迴圈中一直讀取按鈕
+button = Button(btn_pin, fast=led.on, fast_release=led.off)
+led.value(button.pressed)
+
 while(True):
-    if button.value() == 1:
-        led.off()
-    else:
-        led.on()
-    
-    
\ No newline at end of file
+    # 沒有中斷時讓 CPU 閒置
+    machine.idle()
@@ -0,0 +1,21 @@
+"""
+picosim：在電腦（CPython）上執行未修改的 Pico W 腳本
+
+提供假的 machine / network / umqtt.simple / mip / micropython 模組、
+模擬時鐘（計時器、中斷、sleep）與行程內的 MQTT broker（延遲、抖動、封包遺失），
+以及效能量測（bench）與虛擬機群負載測試（fleet）。
+
+    from picosim import Board, run_script
+    board = run_script('lesson6/pico/2_temp.py', duration_s=600)
+    print(board.broker.stats())
+
+命令列工具請見 python -m picosim --help 與 picosim/README.md。
+"""
+
+from picosim.board import Board, DeepSleep
+from picosim.broker import Broker, attach_time_responder
+from picosim.clock import SimClock, SimulationEnd
+from picosim.runtime import install, print_messages, run_script, uninstall
+
+__all__ = ['Board', 'Broker', 'DeepSleep', 'SimClock', 'SimulationEnd',
+           'attach_time_responder', 'install', 'print_messages', 'run_script', 'uninstall']
@@ -0,0 +1,156 @@
+"""
+picosim 命令列工具
+
+使用方式（在專案根目錄執行）：
+    # 執行 Pico 腳本 10 分鐘（虛擬時間，幾秒內完成），印出 broker 上的訊息
+    python -m picosim run lesson6/pico/2_temp.py --duration 600
+
+    # 第 120 秒 WiFi 中斷 30 秒，每 5 秒按一次 GP14 的按鈕
+    python -m picosim run lesson8/lesson18_3.py --outage 120:30 --button 14:5
+
+    # 量測迴圈時間、記憶體配置與發布抖動，超過門檻時結束碼為 1（CI 使用）
+    python -m picosim bench lesson6/pico/2_temp.py --max-loop-us 5000 --max-alloc-bytes 4096 --json
+
+    # 1000 台虛擬 Pico 以 10 倍速直接送入接收流程
+    python -m picosim fleet --devices 1000 --speed 10 --target direct --data-dir fleet_data
+"""
+
+import argparse
+import json
+import sys
+
+from picosim import bench, fleet, runtime
+from picosim.board import Board
+from picosim.broker import Broker
+from picosim.clock import SimClock
+
+
+def _pair(text):
+    """解析 A:B 形式的參數"""
+    first, _, second = text.partition(':')
+    return float(first), float(second)
+
+
+def _add_network_options(parser):
+    parser.add_argument('--latency', type=float, default=5.0, help='MQTT 單程延遲（毫秒）')
+    parser.add_argument('--jitter', type=float, default=2.0, help='延遲的隨機變化（±毫秒）')
+    parser.add_argument('--loss', type=float, default=0.0, help='QoS 0 訊息遺失率（0 ~ 1）')
+    parser.add_argument('--seed', type=int, default=1, help='亂數種子（結果可重現）')
+    parser.add_argument('--cpu-scale', type=float, default=0.0,
+                        help='程式實際執行時間計入虛擬時間的倍數（Pico 約比電腦慢 50 倍）')
+    parser.add_argument('--flash', default=None, help='模擬 flash 的目錄（預設為暫存目錄）')
+
+
+def command_run(args):
+    clock = SimClock(realtime=args.realtime, cpu_scale=args.cpu_scale)
+    broker = Broker(clock, args.latency, args.jitter, args.loss, seed=args.seed)
+    board = Board(clock, broker, seed=args.seed)
+    for outage in args.outage:
+        board.wifi.outage(*_pair(outage))
+    for button in args.button:
+        pin, every = _pair(button)
+        at = every
+        while at < args.duration:
+            board.press_button(int(pin), at)
+            at += every
+    if not args.quiet:
+        runtime.print_messages(broker)
+
+    board = runtime.run_script(args.script, args.duration, board, args.flash)
+    print(f"\n🏁 模擬 {args.duration:g} 秒結束：開機 {board.boots + 1} 次，broker {broker.stats()}")
+    return 0
+
+
+def command_bench(args):
+    result = bench.run_bench(args.script, args.duration, args.seed, args.cpu_scale,
+                             args.latency, args.jitter, args.loss, args.warmup, args.flash)
+    failures = bench.check_thresholds(result, args.max_loop_us, args.max_alloc_bytes,
+                                      args.max_jitter_ms)
+    if args.json:
+        result['failures'] = failures
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(bench.format_report(result))
+        for failure in failures:
+            print(f"❌ {failure}")
+    return 1 if failures else 0
+
+
+def command_fleet(args):
+    devices = fleet.build_fleet(args.devices, fleet.parse_mix(args.mix), args.seed, topic=args.topic)
+    counts = {kind: sum(1 for d in devices if d.kind == kind) for kind in fleet.KINDS}
+
+    print("=" * 60)
+    print(" 虛擬 Pico 機群")
+    print("=" * 60)
+    print(f" 裝置: {args.devices} 台 {counts}")
+    print(f" 目標: {args.target}")
+    print(f" 速度: {'盡快' if args.speed <= 0 else f'{args.speed:g}x'}，模擬 {args.duration:g} 秒")
+    print("=" * 60)
+
+    if args.target == 'broker':
+        send, pending, close = fleet.broker_sender(args.broker, args.port, args.connections, args.qos)
+    else:
+        send, pending, close = fleet.direct_sender(args.data_dir)
+    try:
+        result = fleet.run_fleet(devices, send, args.duration, args.speed, pending)
+    finally:
+        close()
+
+    print(f"✅ 已送出 {result['sent']} 則, 拒絕 {result['rejected']} 則, 耗時 {result['elapsed']:.2f} 秒 "
+          f"({result['rate']:.0f} 則/秒), 最大落後 {result['max_lag'] * 1000:.1f} ms, "
+          f"最大佇列 {result['max_pending']}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m picosim', description='在電腦上模擬 Pico W')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help='執行 Pico 腳本')
+    run_parser.add_argument('script', help='腳本路徑，例如 lesson6/pico/2_temp.py')
+    run_parser.add_argument('--duration', type=float, default=60.0, help='模擬時間（秒）')
+    run_parser.add_argument('--realtime', action='store_true', help='與實際時間同步執行')
+    run_parser.add_argument('--outage', action='append', default=[], metavar='AT:SEC',
+                            help='第 AT 秒 WiFi 中斷 SEC 秒（可重複）')
+    run_parser.add_argument('--button', action='append', default=[], metavar='PIN:EVERY',
+                            help='每 EVERY 秒按一次 PIN 腳位的按鈕（可重複）')
+    run_parser.add_argument('--quiet', action='store_true', help='不印出 broker 上的訊息')
+    _add_network_options(run_parser)
+
+    bench_parser = sub.add_parser('bench', help='量測迴圈時間、記憶體與發布抖動')
+    bench_parser.add_argument('script')
+    bench_parser.add_argument('--duration', type=float, default=600.0, help='模擬時間（秒）')
+    bench_parser.add_argument('--warmup', type=int, default=10, help='略過前幾次迴圈')
+    bench_parser.add_argument('--json', action='store_true', help='以 JSON 輸出結果')
+    bench_parser.add_argument('--max-loop-us', type=float, help='迴圈時間 p99 上限（µs）')
+    bench_parser.add_argument('--max-alloc-bytes', type=int, help='每次迴圈配置 p99 上限（bytes）')
+    bench_parser.add_argument('--max-jitter-ms', type=float, help='發布間隔最大偏差上限（ms）')
+    _add_network_options(bench_parser)
+
+    fleet_parser = sub.add_parser('fleet', help='虛擬 Pico 機群負載測試')
+    fleet_parser.add_argument('--devices', type=int, default=1000)
+    fleet_parser.add_argument('--mix', default='sensor=0.6,integrated=0.3,low_power=0.1',
+                              help='裝置類型比例')
+    fleet_parser.add_argument('--duration', type=float, default=600.0, help='模擬時間（秒）')
+    fleet_parser.add_argument('--speed', type=float, default=1.0,
+                              help='速度倍數（1 = 原速，0 = 盡快）')
+    fleet_parser.add_argument('--target', choices=['broker', 'direct'], default='broker')
+    fleet_parser.add_argument('--broker', default=fleet.BROKER)
+    fleet_parser.add_argument('--port', type=int, default=fleet.PORT)
+    fleet_parser.add_argument('--connections', type=int, default=10, help='broker 模式的 MQTT 連線數')
+    fleet_parser.add_argument('--qos', type=int, choices=[0, 1], default=0)
+    fleet_parser.add_argument('--topic', default=fleet.TOPIC)
+    fleet_parser.add_argument('--data-dir', default='fleet_data', help='direct 模式的輸出目錄')
+    fleet_parser.add_argument('--seed', type=int, default=None)
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        return command_run(args)
+    if args.command == 'bench':
+        return command_bench(args)
+    return command_fleet(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
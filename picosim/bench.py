@@ -0,0 +1,206 @@
+"""
+Pico 腳本的效能量測（可在 CI 中執行）
+
+以相同的亂數種子執行腳本兩次（模擬結果相同）：
+    第一次量測每次迴圈的實際 CPU 時間（不開 tracemalloc，避免追蹤的額外負擔）
+    第二次開啟 tracemalloc，量測每次迴圈的暫時配置與殘留的記憶體
+
+「一次迴圈」是兩個讓出點（sleep / idle / lightsleep）之間執行的程式碼。
+另外由 broker 的紀錄計算每個主題的發布間隔抖動與每秒訊息數。
+"""
+
+import contextlib
+import io
+import statistics
+import time as _time
+import tracemalloc
+
+from picosim import runtime
+from picosim.board import Board
+from picosim.broker import Broker
+from picosim.clock import SimClock
+
+
+def percentile(values, fraction):
+    """取百分位數（values 已排序）"""
+    if not values:
+        return 0
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50': percentile(values, 0.5),
+        'p99': percentile(values, 0.99),
+        'max': values[-1] if values else 0,
+    }
+
+
+class LoopProfiler:
+    """
+    在每個讓出點記錄一次迴圈的 CPU 時間與記憶體配置（由 Board.yield_point / resume_point 呼叫）
+
+    Args:
+        memory: 是否量測記憶體（需要已開啟 tracemalloc）
+        warmup: 略過前幾次迴圈（連線、匯入模組等啟動階段）
+    """
+
+    def __init__(self, memory=False, warmup=10):
+        self.memory = memory
+        self.warmup = warmup
+        self.loop_us = []
+        self.transient_bytes = []
+        self.retained_bytes = []
+        self._depth = 0
+        self._resumed = None
+        self._current = 0
+        self._skipped = 0
+
+    def on_yield(self):
+        self._depth += 1
+        if self._depth > 1 or self._resumed is None:
+            return
+        elapsed_us = (_time.perf_counter() - self._resumed) * 1_000_000
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+        if self._skipped < self.warmup:
+            self._skipped += 1
+            return
+        self.loop_us.append(elapsed_us)
+        if self.memory:
+            self.transient_bytes.append(max(0, peak - self._current))
+            self.retained_bytes.append(current - self._current)
+
+    def on_resume(self):
+        self._depth -= 1
+        if self._depth > 0:
+            return
+        if self.memory:
+            tracemalloc.reset_peak()
+            self._current = tracemalloc.get_traced_memory()[0]
+        self._resumed = _time.perf_counter()
+
+
+def publish_jitter(log):
+    """
+    每個主題的發布間隔（由 broker.log 計算）
+
+    deadband 會略過部分發布，間隔是標稱週期的整數倍；
+    抖動以每個間隔與最接近的整數倍週期的差距計算。
+
+    Returns:
+        dict: 主題 -> {count, interval_ms, max_deviation_ms}
+    """
+    times = {}
+    for at_us, topic, _size in log:
+        times.setdefault(topic, []).append(at_us)
+    result = {}
+    for topic, stamps in times.items():
+        intervals = [(b - a) / 1000 for a, b in zip(stamps, stamps[1:])]
+        if not intervals:
+            continue
+        median = statistics.median(intervals)
+        result[topic] = {
+            'count': len(stamps),
+            'interval_ms': round(median, 3),
+            'max_deviation_ms': round(max(abs(i - round(i / median) * median) for i in intervals), 3),
+        }
+    return result
+
+
+def _run(path, duration_s, profiler, make_board, flash_dir):
+    board = make_board()
+    board.profiler = profiler
+    start = _time.perf_counter()
+    runtime.run_script(path, duration_s, board, flash_dir)
+    return board, _time.perf_counter() - start
+
+
+def run_bench(path, duration_s=600.0, seed=1, cpu_scale=0.0, latency_ms=5.0,
+              jitter_ms=2.0, loss=0.0, warmup=10, flash_dir=None, quiet=True):
+    """
+    量測腳本的迴圈時間、記憶體配置、發布抖動與訊息量
+
+    Args:
+        path: 腳本路徑
+        duration_s: 模擬時間長度（秒）
+        seed: 亂數種子（兩次執行必須相同）
+        cpu_scale: 程式執行時間計入虛擬時間的倍數（> 0 時抖動會反映程式耗時）
+        latency_ms / jitter_ms / loss: 模擬網路
+        warmup: 略過前幾次迴圈
+        flash_dir: 模擬 flash 的目錄
+        quiet: 是否隱藏腳本的輸出
+
+    Returns:
+        dict: 量測結果
+    """
+    def make_board():
+        clock = SimClock(cpu_scale=cpu_scale, epoch=1_700_000_000)
+        broker = Broker(clock, latency_ms, jitter_ms, loss, seed=seed)
+        return Board(clock, broker, seed=seed)
+
+    output = contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext()
+    with output:
+        timing = LoopProfiler(warmup=warmup)
+        board, real_s = _run(path, duration_s, timing, make_board, flash_dir)
+
+        tracemalloc.start()
+        try:
+            memory = LoopProfiler(memory=True, warmup=warmup)
+            _run(path, duration_s, memory, make_board, flash_dir)
+        finally:
+            tracemalloc.stop()
+
+    published = board.broker.published
+    return {
+        'script': path,
+        'duration_s': duration_s,
+        'real_s': round(real_s, 3),
+        'boots': board.boots + 1,
+        'loop_us': {k: round(v, 1) for k, v in summarize(timing.loop_us).items()},
+        'alloc_bytes': summarize(memory.transient_bytes),
+        'retained_bytes': sum(memory.retained_bytes),
+        'publish': publish_jitter(board.broker.log),
+        'messages': board.broker.stats(),
+        'msgs_per_sim_s': round(published / duration_s, 3),
+        'msgs_per_real_s': round(published / real_s, 1) if real_s else 0,
+    }
+
+
+def check_thresholds(result, max_loop_us=None, max_alloc_bytes=None, max_jitter_ms=None):
+    """
+    檢查量測結果是否超過門檻（CI 使用）
+
+    Returns:
+        list: 超過門檻的說明（空清單表示通過）
+    """
+    failures = []
+    if max_loop_us is not None and result['loop_us']['p99'] > max_loop_us:
+        failures.append(f"迴圈時間 p99 {result['loop_us']['p99']} µs > {max_loop_us} µs")
+    if max_alloc_bytes is not None and result['alloc_bytes']['p99'] > max_alloc_bytes:
+        failures.append(f"每次迴圈配置 p99 {result['alloc_bytes']['p99']} bytes > {max_alloc_bytes} bytes")
+    if max_jitter_ms is not None:
+        for topic, stats in result['publish'].items():
+            if stats['max_deviation_ms'] > max_jitter_ms:
+                failures.append(f"{topic} 發布抖動 {stats['max_deviation_ms']} ms > {max_jitter_ms} ms")
+    return failures
+
+
+def format_report(result):
+    """把量測結果轉為文字報告"""
+    loop = result['loop_us']
+    alloc = result['alloc_bytes']
+    lines = [
+        f"📊 {result['script']}：模擬 {result['duration_s']:g} 秒，實際 {result['real_s']} 秒，開機 {result['boots']} 次",
+        f"   迴圈時間 (µs)    n={loop['count']}  p50={loop['p50']}  p99={loop['p99']}  max={loop['max']}",
+        f"   每次配置 (bytes) p50={alloc['p50']}  p99={alloc['p99']}  max={alloc['max']}  殘留合計={result['retained_bytes']}",
+        f"   訊息             {result['messages']}  每模擬秒 {result['msgs_per_sim_s']}  每實際秒 {result['msgs_per_real_s']}",
+    ]
+    for topic, stats in sorted(result['publish'].items()):
+        lines.append(f"   {topic}: {stats['count']} 則，間隔 {stats['interval_ms']} ms，"
+                     f"最大偏差 {stats['max_deviation_ms']} ms")
+    return '\n'.join(lines)
+
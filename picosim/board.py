@@ -0,0 +1,209 @@
+"""
+虛擬 Pico 的板子狀態
+假的 machine / network / umqtt 模組都透過 current() 取得目前的 Board：
+
+    Board
+    ├── clock       SimClock（時間、計時器、micropython.schedule）
+    ├── broker      Broker（行程內 MQTT）
+    ├── pins        腳位電位與中斷處理函式
+    ├── adc         ADC 通道的數值來源（內建溫度、可變電阻）
+    ├── wifi        WiFi 連線狀態（可模擬斷線）
+    ├── rtc_memory  deepsleep 後保留的 RTC 記憶體
+    └── profiler    bench 指令的迴圈量測（每個讓出點呼叫一次）
+"""
+
+import math
+import random
+
+from picosim.broker import Broker
+from picosim.clock import SimClock
+
+# machine.reset_cause() 的值
+PWRON_RESET = 1
+WDT_RESET = 3
+DEEPSLEEP_RESET = 4
+
+# 模擬的 heap 大小（RP2040 + MicroPython 約 190 KB 可用）
+HEAP_SIZE = 192 * 1024
+
+_current = None
+
+
+def current():
+    """取得目前的虛擬 Pico（尚未建立時建立預設的）"""
+    global _current
+    if _current is None:
+        _current = Board()
+    return _current
+
+
+def set_current(board):
+    global _current
+    _current = board
+
+
+class DeepSleep(BaseException):
+    """machine.deepsleep() / machine.reset()：中止腳本，由 runner 推進時間後重新開機"""
+
+    def __init__(self, ms, cause=DEEPSLEEP_RESET):
+        super().__init__(ms)
+        self.ms = ms
+        self.cause = cause
+
+
+def temperature_source(board, start=25.0):
+    """
+    內建溫度感測器（ADC 4）：溫度緩慢隨機漂移，轉換為 RP2040 感測器的電壓
+
+    Returns:
+        function: 回傳 16 位元讀值的函式
+    """
+    state = {'temperature': start}
+    rng = board.random
+
+    def read():
+        state['temperature'] = min(35.0, max(15.0, state['temperature'] + rng.uniform(-0.05, 0.05)))
+        voltage = 0.706 - (state['temperature'] - 27) * 0.001721
+        return _to_u16(voltage / 3.3 + rng.uniform(-0.0005, 0.0005))
+
+    return read
+
+
+def sweep_source(board, period_s=10.0):
+    """可變電阻：以 period_s 秒為週期來回旋轉"""
+    def read():
+        phase = board.clock.now_us / 1_000_000 / period_s
+        return _to_u16(0.5 - 0.5 * math.cos(2 * math.pi * phase))
+
+    return read
+
+
+def _to_u16(fraction):
+    """0 ~ 1 轉換為 read_u16() 的值（12 位元解析度，與實際硬體相同）"""
+    raw = max(0, min(4095, int(fraction * 4095)))
+    return (raw << 4) | (raw >> 8)
+
+
+class WifiState:
+    """WiFi 連線狀態：連線需要 join_ms，outage() 可模擬 AP 中斷"""
+
+    def __init__(self, board, join_ms=1200):
+        self.board = board
+        self.join_ms = join_ms
+        self.associated = False
+        self.connecting_until = None
+        self.down_until = 0  # AP 中斷到這個時間（µs）
+
+    @property
+    def ap_up(self):
+        return self.board.clock.now_us >= self.down_until
+
+    def outage(self, at_s, duration_s):
+        """在 at_s 秒時讓 AP 中斷 duration_s 秒"""
+        def start():
+            self.down_until = self.board.clock.now_us + int(duration_s * 1_000_000)
+            self.associated = False
+            self.connecting_until = None
+        self.board.clock.call_at(int(at_s * 1_000_000), start)
+
+
+class Board:
+    """
+    一塊虛擬 Pico
+
+    Args:
+        clock: SimClock（預設虛擬時間）
+        broker: Broker（預設使用同一個時鐘的新 broker）
+        seed: 亂數種子（感測器數值、網路延遲可重現）
+    """
+
+    def __init__(self, clock=None, broker=None, seed=None):
+        self.clock = clock or SimClock()
+        self.broker = broker or Broker(self.clock, seed=seed)
+        self.random = random.Random(seed)
+        self.pins = {}          # 腳位 id -> 電位
+        self.pull = {}          # 腳位 id -> 上拉 / 下拉時的預設電位
+        self.irq_handlers = {}  # 腳位 id -> (trigger, handler, pin 物件)
+        self.pwm_duty = {}      # 腳位 id -> duty_u16
+        self.adc = {4: temperature_source(self)}
+        for channel in (0, 1, 2):
+            self.adc[channel] = sweep_source(self)
+        self.wifi = WifiState(self)
+        self.rtc_memory = b''
+        self.reset_cause = PWRON_RESET
+        self.boots = 0
+        self.timers = []
+        self.clients = []       # 已連線的 MQTTClient
+        self.profiler = None
+        self.heap_size = HEAP_SIZE
+
+    # ---------- 腳位 ----------
+
+    def read_pin(self, pin_id):
+        return self.pins.get(pin_id, self.pull.get(pin_id, 0))
+
+    def write_pin(self, pin_id, level):
+        self.pins[pin_id] = 1 if level else 0
+
+    def set_input(self, pin_id, level):
+        """外部驅動輸入腳位（例如按鈕），符合觸發條件時呼叫中斷處理函式"""
+        previous = self.read_pin(pin_id)
+        level = 1 if level else 0
+        self.pins[pin_id] = level
+        entry = self.irq_handlers.get(pin_id)
+        if entry is None or previous == level:
+            return
+        trigger, handler, pin = entry
+        edge = 0x08 if level else 0x04  # IRQ_RISING / IRQ_FALLING
+        if trigger & edge and handler is not None:
+            handler(pin)
+
+    def press_button(self, pin_id, at_s, hold_ms=150, bounce=3, active_level=0):
+        """
+        排程一次按鈕按下與放開，包含接點彈跳
+
+        Args:
+            pin_id: 腳位
+            at_s: 按下的時間（秒）
+            hold_ms: 按住的時間
+            bounce: 每個邊緣的彈跳次數（間隔 0.2 ~ 1.5 ms）
+            active_level: 按下時的電位（上拉電路為 0）
+        """
+        start = int(at_s * 1_000_000)
+        for edge_at, level in ((start, active_level), (start + hold_ms * 1000, 1 - active_level)):
+            t = edge_at
+            for _ in range(bounce):
+                self.clock.call_at(t, lambda level=level: self.set_input(pin_id, level))
+                t += self.random.randint(200, 1500)
+                self.clock.call_at(t, lambda level=level: self.set_input(pin_id, 1 - level))
+                t += self.random.randint(200, 1500)
+            self.clock.call_at(t, lambda level=level: self.set_input(pin_id, level))
+
+    # ---------- 讓出點與重新開機 ----------
+
+    def yield_point(self):
+        """腳本讓出 CPU（sleep / idle / lightsleep）之前呼叫，供 bench 量測每次迴圈"""
+        if self.profiler is not None:
+            self.profiler.on_yield()
+
+    def resume_point(self):
+        """讓出結束、腳本繼續執行時呼叫"""
+        if self.profiler is not None:
+            self.profiler.on_resume()
+
+    def reset(self, cause):
+        """重新開機：停止計時器與中斷，RAM 清空（RTC 記憶體與 flash 保留）"""
+        for timer in self.timers:
+            timer.deinit()
+        self.timers = []
+        for client in self.clients:
+            client.disconnect()
+        self.clients = []
+        self.irq_handlers = {}
+        self.pins = {}
+        self.pwm_duty = {}
+        self.wifi.associated = False
+        self.wifi.connecting_until = None
+        self.reset_cause = cause
+        self.boots += 1
+        self.clock.reboot()
@@ -0,0 +1,123 @@
+"""
+行程內的 MQTT broker
+模擬網路延遲（平均值 + 抖動）與 QoS 0 封包遺失；訊息依模擬時鐘送達訂閱者
+
+訂閱者有兩種：
+    虛擬 Pico 的 MQTTClient（umqtt.simple），訊息放入收件匣，由 check_msg() / wait_msg() 取出
+    監聽函式 listen(topic_filter, fn)，模擬監控程式（例如校時回應、紀錄訊息）
+"""
+
+import json
+import random
+
+
+def topic_matches(topic_filter, topic):
+    """MQTT 主題比對（支援 + 與 #）"""
+    filter_parts = topic_filter.split('/')
+    topic_parts = topic.split('/')
+    for index, part in enumerate(filter_parts):
+        if part == '#':
+            return True
+        if index >= len(topic_parts):
+            return False
+        if part != '+' and part != topic_parts[index]:
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+def _text(value):
+    if isinstance(value, str):
+        return value
+    return bytes(value).decode('utf-8')
+
+
+class Broker:
+    """
+    模擬 broker
+
+    Args:
+        clock: SimClock
+        latency_ms: 單程平均延遲（毫秒）
+        jitter_ms: 延遲的隨機變化範圍（±毫秒）
+        loss: QoS 0 訊息的遺失率（0 ~ 1）
+        seed: 亂數種子（結果可重現）
+    """
+
+    def __init__(self, clock, latency_ms=5.0, jitter_ms=2.0, loss=0.0, seed=None):
+        self.clock = clock
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.loss = loss
+        self.available = True
+        self._random = random.Random(seed)
+        self._subscriptions = []  # (topic_filter, client)
+        self._listeners = []      # (topic_filter, fn)
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.log = []  # (模擬時間 µs, 主題, payload 位元組數)
+
+    def subscribe(self, client, topic_filter):
+        self._subscriptions.append((_text(topic_filter), client))
+
+    def unsubscribe_all(self, client):
+        self._subscriptions = [(f, c) for f, c in self._subscriptions if c is not client]
+
+    def listen(self, topic_filter, fn):
+        """加入監聽函式 fn(topic, payload)，模擬監控端"""
+        self._listeners.append((topic_filter, fn))
+
+    def publish(self, topic, payload, qos=0):
+        """
+        發布訊息（payload 會立即複製，發送端之後可以覆寫緩衝區）
+
+        Args:
+            topic: 主題（str 或 bytes）
+            payload: 內容（str、bytes、bytearray 或 memoryview）
+            qos: 0 = 可能遺失，1 = 保證送達
+        """
+        topic = _text(topic)
+        payload = payload.encode('utf-8') if isinstance(payload, str) else bytes(payload)
+        now = self.clock.now_us
+        self.published += 1
+        self.log.append((now, topic, len(payload)))
+
+        targets = [c for f, c in self._subscriptions if topic_matches(f, topic)]
+        targets += [fn for f, fn in self._listeners if topic_matches(f, topic)]
+        for target in targets:
+            if qos == 0 and self.loss and self._random.random() < self.loss:
+                self.dropped += 1
+                continue
+            delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+            self.clock.call_at(now + max(0, int(delay * 1000)),
+                               lambda target=target: self._deliver(target, topic, payload))
+
+    def _deliver(self, target, topic, payload):
+        self.delivered += 1
+        if callable(target):
+            target(topic, payload)
+        else:
+            target.deliver(topic.encode('utf-8'), payload)
+
+    def stats(self):
+        return {'published': self.published, 'delivered': self.delivered, 'dropped': self.dropped}
+
+
+def attach_time_responder(broker):
+    """
+    回應裝置的校時請求（與監控程式 lesson6/timesync.py 的協定相同）
+
+    以模擬時鐘的 epoch 時間回應，虛擬 Pico 的 TimeSync 可以在沒有監控程式時完成校時。
+    """
+    def on_request(topic, payload):
+        try:
+            request = json.loads(payload)
+            t0 = request['t0']
+        except (ValueError, KeyError, TypeError):
+            return
+        device = topic.split('/')[1]
+        now = broker.clock.epoch_ms()
+        response = {'t0': t0, 't1': now, 't2': now}
+        broker.publish(f'devices/{device}/time/response', json.dumps(response))
+
+    broker.listen('devices/+/time/request', on_request)
@@ -0,0 +1,165 @@
+"""
+模擬時鐘
+虛擬 Pico 的時間（微秒整數），以及在時間點觸發的事件（計時器、MQTT 送達、按鈕輸入）
+
+兩種模式：
+    虛擬時間（預設）：sleep 立即返回，時間直接跳到目標，一小時的程式幾秒內跑完
+    即時（realtime）：sleep 真的等待，與實際時間同步
+
+虛擬時間下程式碼的執行時間預設不計入（結果可重現）；cpu_scale > 0 時，
+每次讀取時間會把實際經過的 CPU 時間乘上倍數加入虛擬時間，用來觀察程式耗時造成的抖動。
+"""
+
+import heapq
+import itertools
+import time as _time
+
+# MicroPython 的 ticks_ms / ticks_us 在 2**30 溢位
+TICKS_PERIOD = 1 << 30
+TICKS_MASK = TICKS_PERIOD - 1
+TICKS_HALF = TICKS_PERIOD >> 1
+
+# 虛擬時間下每次讀取時間至少前進 1 µs，避免忙碌等待的迴圈永遠不會結束
+READ_COST_US = 1
+
+
+class SimulationEnd(BaseException):
+    """模擬時間到達終點（繼承 BaseException，腳本的 except Exception 不會攔截）"""
+
+
+class SimClock:
+    """
+    虛擬 Pico 的時鐘與事件佇列
+
+    Args:
+        realtime: 是否與實際時間同步
+        cpu_scale: 虛擬時間模式下，程式實際執行時間乘上的倍數（0 表示不計入）
+        epoch: 模擬開始時的 epoch 秒（預設現在）
+    """
+
+    def __init__(self, realtime=False, cpu_scale=0.0, epoch=None):
+        self.realtime = realtime
+        self.cpu_scale = 1.0 if realtime else cpu_scale
+        self.now_us = 0
+        self.boot_us = 0  # 最近一次開機的時間，ticks_* 從這裡起算
+        self.epoch_us = int((epoch if epoch is not None else _time.time()) * 1_000_000)
+        self.end_us = None
+        self._events = []
+        self._seq = itertools.count()
+        self._pending = []  # micropython.schedule() 的回呼
+        self._real_start = _time.perf_counter()
+        self._last_real = self._real_start
+        self._running_events = False
+
+    # ---------- 目前時間 ----------
+
+    def now(self):
+        """目前的模擬時間（微秒，從開機起算）"""
+        real = _time.perf_counter()
+        if self.realtime:
+            self.now_us = max(self.now_us, int((real - self._real_start) * 1_000_000))
+        elif self.cpu_scale:
+            self.now_us += int((real - self._last_real) * 1_000_000 * self.cpu_scale)
+        else:
+            self.now_us += READ_COST_US
+        self._last_real = real
+        if self.end_us is not None and self.now_us >= self.end_us:
+            raise SimulationEnd()
+        return self.now_us
+
+    def ticks_us(self):
+        return (self.now() - self.boot_us) & TICKS_MASK
+
+    def ticks_ms(self):
+        return ((self.now() - self.boot_us) // 1000) & TICKS_MASK
+
+    def reboot(self):
+        """重新開機：ticks 歸零，清除尚未執行的 micropython.schedule() 回呼"""
+        self.boot_us = self.now_us
+        self._pending = []
+
+    def epoch_ms(self):
+        """目前的模擬 epoch 毫秒"""
+        return (self.epoch_us + self.now_us) // 1000
+
+    # ---------- 事件 ----------
+
+    def call_at(self, due_us, callback):
+        """
+        在模擬時間 due_us 呼叫 callback()
+
+        Returns:
+            list: 事件控制代碼，可傳給 cancel()
+        """
+        event = [due_us, next(self._seq), callback]
+        heapq.heappush(self._events, event)
+        return event
+
+    def call_later(self, delay_us, callback):
+        return self.call_at(self.now_us + max(0, int(delay_us)), callback)
+
+    def cancel(self, event):
+        """取消尚未觸發的事件"""
+        if event is not None:
+            event[2] = None
+
+    def schedule(self, callback, arg):
+        """micropython.schedule()：在下一個讓出點執行"""
+        self._pending.append((callback, arg))
+
+    def next_event_us(self):
+        """下一個事件的時間（沒有事件時回傳 None）"""
+        while self._events and self._events[0][2] is None:
+            heapq.heappop(self._events)
+        return self._events[0][0] if self._events else None
+
+    # ---------- 等待 ----------
+
+    def sleep_us(self, us):
+        """等待指定時間，期間觸發到期的事件"""
+        self.run_until(self.now() + max(0, int(us)))
+
+    def run_until(self, target_us):
+        """推進時間到 target_us，依序觸發之間的事件"""
+        self.run_pending()
+        while True:
+            due = self.next_event_us()
+            if due is None or due > target_us:
+                break
+            event = heapq.heappop(self._events)
+            self._advance(max(due, self.now_us))
+            callback = event[2]
+            self._running_events = True
+            try:
+                callback()
+            finally:
+                self._running_events = False
+            self.run_pending()
+        self._advance(max(target_us, self.now_us))
+        self.run_pending()
+
+    def idle(self, max_us=1000):
+        """machine.idle()：等到下一個事件（最多 max_us，對應 1 ms 的系統節拍）"""
+        now = self.now()
+        due = self.next_event_us()
+        self.run_until(now + max_us if due is None else min(due, now + max_us))
+
+    def run_pending(self):
+        """執行 micropython.schedule() 排入的回呼"""
+        while self._pending and not self._running_events:
+            callback, arg = self._pending.pop(0)
+            callback(arg)
+
+    def _advance(self, target_us):
+        end = self.end_us
+        stop = end is not None and target_us >= end
+        if stop:
+            target_us = end
+        if self.realtime:
+            delay = self._real_start + target_us / 1_000_000 - _time.perf_counter()
+            if delay > 0:
+                _time.sleep(delay)
+        self.now_us = max(self.now_us, target_us)
+        self._last_real = _time.perf_counter()
+        if stop:
+            raise SimulationEnd()
@@ -0,0 +1,4 @@
+"""
+假的 MicroPython 模組
+由 picosim.runtime.install() 放入 sys.modules，取代 machine、network、umqtt.simple 等
+"""
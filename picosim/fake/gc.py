@@ -0,0 +1,40 @@
+"""
+假的 gc 模組
+mem_free() 以模擬的 heap 大小扣掉 tracemalloc 追蹤到的記憶體（bench 指令會開啟 tracemalloc）
+"""
+
+import gc as _gc
+import tracemalloc as _tracemalloc
+
+from picosim import board as _board
+
+collections = 0
+
+
+def _used():
+    if _tracemalloc.is_tracing():
+        return _tracemalloc.get_traced_memory()[0]
+    return 0
+
+
+def mem_alloc():
+    return _used()
+
+
+def mem_free():
+    return max(0, _board.current().heap_size - _used())
+
+
+def collect():
+    # 只回收最年輕的一代：CPython 完整回收會掃過模擬器本身的物件，耗時與 Pico 無關
+    global collections
+    collections += 1
+    return _gc.collect(0)
+
+
+def threshold(amount=None):
+    return -1 if amount is None else None
+
+
+def __getattr__(name):
+    return getattr(_gc, name)
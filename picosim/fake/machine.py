@@ -0,0 +1,225 @@
+"""
+假的 machine 模組：Pin / ADC / PWM / Timer / RTC 與睡眠、中斷控制
+狀態存在 picosim.board.current()，計時器與中斷在腳本讓出 CPU（sleep / idle）時觸發
+"""
+
+import time as _time
+
+from picosim import board as _board
+from picosim.board import DEEPSLEEP_RESET, PWRON_RESET, WDT_RESET, DeepSleep
+
+__all__ = ['Pin', 'ADC', 'PWM', 'Timer', 'RTC', 'idle', 'lightsleep', 'deepsleep',
+           'disable_irq', 'enable_irq', 'reset', 'reset_cause', 'unique_id', 'freq',
+           'PWRON_RESET', 'WDT_RESET', 'DEEPSLEEP_RESET']
+
+_freq = 125_000_000
+
+
+def _pin_id(pin):
+    return pin.id if isinstance(pin, Pin) else pin
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.init(mode, pull, value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        board = _board.current()
+        self.mode = mode
+        if pull == Pin.PULL_UP:
+            board.pull[self.id] = 1
+        elif pull == Pin.PULL_DOWN:
+            board.pull[self.id] = 0
+        if value is not None:
+            board.write_pin(self.id, value)
+
+    def value(self, value=None):
+        board = _board.current()
+        if value is None:
+            return board.read_pin(self.id)
+        board.write_pin(self.id, value)
+        return None
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def high(self):
+        self.value(1)
+
+    def low(self):
+        self.value(0)
+
+    def toggle(self):
+        self.value(0 if self.value() else 1)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        board = _board.current()
+        if handler is None:
+            board.irq_handlers.pop(self.id, None)
+        else:
+            board.irq_handlers[self.id] = (trigger, handler, self)
+
+    def __repr__(self):
+        return f'Pin({self.id!r})'
+
+
+class ADC:
+    CORE_TEMP = 4
+
+    def __init__(self, pin):
+        pin = _pin_id(pin)
+        # ADC(26) / ADC(Pin(26)) 對應通道 0
+        self.channel = pin - 26 if isinstance(pin, int) and pin >= 26 else pin
+
+    def read_u16(self):
+        source = _board.current().adc.get(self.channel)
+        return source() if source is not None else 0
+
+
+class PWM:
+    def __init__(self, pin, freq=None, duty_u16=None):
+        self.pin = _pin_id(pin)
+        self._freq = freq or 1000
+        if duty_u16 is not None:
+            self.duty_u16(duty_u16)
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self._freq = value
+        return None
+
+    def duty_u16(self, value=None):
+        board = _board.current()
+        if value is None:
+            return board.pwm_duty.get(self.pin, 0)
+        board.pwm_duty[self.pin] = max(0, min(65535, int(value)))
+        return None
+
+    def deinit(self):
+        _board.current().pwm_duty.pop(self.pin, None)
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self._event = None
+        self._clock = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, freq=-1, period=-1, callback=None, tick_hz=1000):
+        self.deinit()
+        board = _board.current()
+        if freq > 0:
+            self._period_us = int(1_000_000 / freq)
+        else:
+            self._period_us = int(period * 1_000_000 / tick_hz)
+        self._mode = mode
+        self._callback = callback
+        self._clock = board.clock
+        board.timers.append(self)
+        self._next_us = self._clock.now_us + self._period_us
+        self._event = self._clock.call_at(self._next_us, self._fire)
+
+    def _fire(self):
+        if self._mode == Timer.PERIODIC:
+            # 依固定時間表排下一次，不受回呼執行時間影響
+            self._next_us += self._period_us
+            self._event = self._clock.call_at(self._next_us, self._fire)
+        else:
+            self._event = None
+        if self._callback is not None:
+            self._callback(self)
+
+    def deinit(self):
+        if self._event is not None:
+            self._clock.cancel(self._event)
+            self._event = None
+
+
+class RTC:
+    def __init__(self):
+        self._offset_s = 0
+
+    def memory(self, data=None):
+        board = _board.current()
+        if data is None:
+            return board.rtc_memory
+        board.rtc_memory = bytes(data)
+        return None
+
+    def datetime(self, value=None):
+        board = _board.current()
+        if value is not None:
+            return None
+        t = _time.localtime(board.clock.epoch_ms() // 1000)
+        return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_wday, t.tm_hour, t.tm_min, t.tm_sec, 0)
+
+
+def idle():
+    board = _board.current()
+    board.yield_point()
+    board.clock.idle()
+    board.resume_point()
+
+
+def lightsleep(ms=None):
+    board = _board.current()
+    board.yield_point()
+    if ms is None:
+        board.clock.run_until(board.clock.next_event_us() or board.clock.now_us)
+    else:
+        board.clock.sleep_us(ms * 1000)
+    board.resume_point()
+
+
+def deepsleep(ms=None):
+    _board.current().yield_point()
+    raise DeepSleep(ms or 0)
+
+
+def disable_irq():
+    # 中斷只會在讓出點觸發，不需要真的關閉
+    return 0
+
+
+def enable_irq(state=0):
+    pass
+
+
+def reset():
+    raise DeepSleep(0, PWRON_RESET)
+
+
+def reset_cause():
+    return _board.current().reset_cause
+
+
+def unique_id():
+    return b'\xe6\x61\x41\x04\x03\x5a\x2c\x21'
+
+
+def freq(value=None):
+    global _freq
+    if value is None:
+        return _freq
+    _freq = value
+    return None
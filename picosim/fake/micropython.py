@@ -0,0 +1,42 @@
+"""
+假的 micropython 模組
+schedule() 與實際韌體一樣有佇列上限，回呼在下一個讓出點（sleep / idle）執行
+"""
+
+from picosim import board as _board
+
+# 韌體的排程佇列長度（MICROPY_SCHEDULER_DEPTH）
+SCHEDULE_DEPTH = 8
+
+
+def const(value):
+    return value
+
+
+def native(f):
+    return f
+
+
+def viper(f):
+    return f
+
+
+def schedule(callback, arg):
+    clock = _board.current().clock
+    if len(clock._pending) >= SCHEDULE_DEPTH:
+        raise RuntimeError('schedule queue full')
+    clock.schedule(callback, arg)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def mem_info(verbose=False):
+    import gc
+    print(f'stack: 0 out of 7936\nGC: total: {_board.current().heap_size}, '
+          f'used: {gc.mem_alloc()}, free: {gc.mem_free()}')
+
+
+def opt_level(level=None):
+    return 0 if level is None else None
@@ -0,0 +1,5 @@
+"""假的 mip 模組：套件已由 picosim 提供，install() 不做任何事"""
+
+
+def install(package, index=None, target=None, version=None, mpy=True):
+    print(f'Installing {package} (picosim: 已內建，略過)')
@@ -0,0 +1,95 @@
+"""
+假的 network 模組：WLAN（STA 模式）
+connect() 後經過 join_ms 才取得 IP；WifiState.outage() 可模擬 AP 中斷
+"""
+
+from picosim import board as _board
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_WRONG_PASSWORD = -3
+STAT_NO_AP_FOUND = -2
+STAT_CONNECT_FAIL = -1
+STAT_GOT_IP = 3
+
+_BSSID = b'\x02\x00\x5e\x10\x00\x01'
+
+
+def hostname(name=None):
+    return 'PicoW' if name is None else None
+
+
+class WLAN:
+    PM_NONE = 0xa11140
+    PM_PERFORMANCE = 0x111022
+    PM_POWERSAVE = 0xa11142
+
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self._active = False
+        self._ifconfig = ('192.168.4.23', '255.255.255.0', '192.168.4.1', '192.168.4.1')
+        self._config = {'pm': WLAN.PM_NONE, 'channel': 6, 'essid': '', 'mac': b'\x28\xcd\xc1\x00\x00\x01'}
+
+    def active(self, value=None):
+        if value is None:
+            return self._active
+        self._active = bool(value)
+        if not self._active:
+            self.disconnect()
+        return None
+
+    def connect(self, ssid=None, key=None, bssid=None, channel=None):
+        wifi = _board.current().wifi
+        self._config['essid'] = ssid
+        clock = wifi.board.clock
+        # 指定 BSSID（免掃描）時連線較快
+        join_us = wifi.join_ms * (500 if bssid else 1000)
+        wifi.associated = False
+        wifi.connecting_until = clock.now_us + join_us
+
+    def disconnect(self):
+        wifi = _board.current().wifi
+        wifi.associated = False
+        wifi.connecting_until = None
+
+    def status(self, param=None):
+        if param == 'rssi':
+            return -55
+        wifi = _board.current().wifi
+        if wifi.associated:
+            return STAT_GOT_IP
+        if wifi.connecting_until is None:
+            return STAT_IDLE
+        if wifi.board.clock.now_us < wifi.connecting_until:
+            return STAT_CONNECTING
+        if not wifi.ap_up:
+            wifi.connecting_until = None
+            return STAT_NO_AP_FOUND
+        wifi.associated = True
+        wifi.connecting_until = None
+        return STAT_GOT_IP
+
+    def isconnected(self):
+        return self.status() == STAT_GOT_IP
+
+    def ifconfig(self, value=None):
+        if value is None:
+            return self._ifconfig
+        if isinstance(value, tuple):
+            self._ifconfig = value
+        return None
+
+    def config(self, *args, **kwargs):
+        if kwargs:
+            self._config.update(kwargs)
+            return None
+        name = args[0]
+        if name == 'bssid':
+            return _BSSID
+        return self._config.get(name)
+
+    def scan(self):
+        return [(b'picosim', _BSSID, 6, -55, 3, 0)]
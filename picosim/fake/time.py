@@ -0,0 +1,64 @@
+"""
+假的 time / utime 模組
+ticks_* 與 sleep* 使用虛擬 Pico 的時鐘；其他函式（strftime、perf_counter …）沿用 CPython 的 time
+"""
+
+import time as _time
+
+from picosim import board as _board
+from picosim.clock import TICKS_HALF, TICKS_MASK, TICKS_PERIOD
+
+
+def ticks_ms():
+    return _board.current().clock.ticks_ms()
+
+
+def ticks_us():
+    return _board.current().clock.ticks_us()
+
+
+def ticks_cpu():
+    return _board.current().clock.ticks_us()
+
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + TICKS_HALF) & TICKS_MASK) - TICKS_HALF
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) % TICKS_PERIOD
+
+
+def sleep_us(us):
+    board = _board.current()
+    board.yield_point()
+    board.clock.sleep_us(us)
+    board.resume_point()
+
+
+def sleep_ms(ms):
+    sleep_us(int(ms) * 1000)
+
+
+def sleep(seconds):
+    sleep_us(int(seconds * 1_000_000))
+
+
+def time():
+    return _board.current().clock.epoch_ms() // 1000
+
+
+def time_ns():
+    return _board.current().clock.epoch_ms() * 1_000_000
+
+
+def localtime(secs=None):
+    return _time.localtime(time() if secs is None else secs)
+
+
+def gmtime(secs=None):
+    return _time.gmtime(time() if secs is None else secs)
+
+
+def __getattr__(name):
+    return getattr(_time, name)
@@ -0,0 +1,3 @@
+"""ubinascii：與 CPython 的 binascii 相同"""
+
+from binascii import *  # noqa: F401,F403
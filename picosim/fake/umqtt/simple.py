@@ -0,0 +1,97 @@
+"""
+假的 umqtt.simple：連線到行程內的 Broker（忽略 server / port）
+WiFi 未連線或 broker 停止時，connect / publish 與實際硬體一樣丟出 OSError
+"""
+
+import collections
+
+from picosim import board as _board
+
+
+class MQTTException(Exception):
+    pass
+
+
+class MQTTClient:
+    def __init__(self, client_id, server, port=0, user=None, password=None,
+                 keepalive=0, ssl=None, ssl_params=None):
+        self.client_id = client_id
+        self.server = server
+        self.port = port
+        self.keepalive = keepalive
+        self.cb = None
+        self.lw_topic = None
+        self.connected = False
+        self._inbox = collections.deque()
+        self._broker = None
+
+    def set_callback(self, f):
+        self.cb = f
+
+    def set_last_will(self, topic, msg, retain=False, qos=0):
+        self.lw_topic = (topic, msg, retain, qos)
+
+    def connect(self, clean_session=True, timeout=None):
+        board = _board.current()
+        if not board.wifi.associated or not board.broker.available:
+            raise OSError(113, 'EHOSTUNREACH')
+        if self._broker is not None and clean_session:
+            self._broker.unsubscribe_all(self)
+        self._broker = board.broker
+        self.connected = True
+        if self not in board.clients:
+            board.clients.append(self)
+        return 0
+
+    def disconnect(self):
+        if self._broker is not None:
+            self._broker.unsubscribe_all(self)
+        self.connected = False
+
+    def ping(self):
+        self._check()
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        self._check()
+        self._broker.publish(topic, msg, qos)
+
+    def subscribe(self, topic, qos=0):
+        self._check()
+        self._broker.subscribe(self, topic)
+
+    def wait_msg(self):
+        """等待並處理一則訊息（沒有訊息時推進時間到下一個事件）"""
+        clock = _board.current().clock
+        while not self._inbox:
+            self._check()
+            due = clock.next_event_us()
+            clock.run_until(due if due is not None else clock.now_us + 1000)
+        return self._dispatch()
+
+    def check_msg(self):
+        """處理一則已送達的訊息（沒有時立即返回）"""
+        self._check()
+        clock = _board.current().clock
+        clock.run_until(clock.now())
+        if self._inbox:
+            return self._dispatch()
+        return None
+
+    def deliver(self, topic, msg):
+        """由 Broker 呼叫：訊息送達"""
+        if self.connected:
+            self._inbox.append((topic, msg))
+
+    def _dispatch(self):
+        topic, msg = self._inbox.popleft()
+        if self.cb is not None:
+            self.cb(topic, msg)
+        return None
+
+    def _check(self):
+        board = _board.current()
+        if not self.connected:
+            raise OSError(104, 'ECONNRESET')
+        if not board.wifi.associated or not board.broker.available:
+            self.connected = False
+            raise OSError(104, 'ECONNRESET')
@@ -0,0 +1,314 @@
+"""
+虛擬 Pico 機群：對監控程式施加接近實際的負載
+
+每台虛擬 Pico 以與 lesson6/pico 腳本相同的訊息格式發布：
+    sensor      2_temp.py：每 5 秒取樣，deadband + 60 秒心跳，附 seq / boot / ts
+    integrated  3_integrated.py：同上並加上電燈狀態，每 300 秒發布診斷（devices/<id>/diag）
+    low_power   4_low_power.py：每 60 秒取樣，每 10 筆以 samples 批次發布（附 age / awake_ms）
+
+為了一台電腦就能模擬上千台，裝置不是執行完整腳本，而是輕量的狀態機，
+依時間排程（heap）輪流取樣。送出方式與 lesson6/replay.py 相同：
+    --target broker  經由 MQTT broker（由執行中的 app_flask.py 接收）
+    --target direct  直接送入接收流程 IngestPipeline（不經 broker），寫到獨立目錄
+"""
+
+import heapq
+import json
+import os
+import random
+import sys
+import time
+
+LESSON6_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lesson6')
+
+# MQTT 設定（與 app_flask.py 相同）
+BROKER = 'localhost'
+PORT = 1883
+TOPIC = 'living_room/sensor'
+
+KIND_SENSOR = 'sensor'
+KIND_INTEGRATED = 'integrated'
+KIND_LOW_POWER = 'low_power'
+KINDS = (KIND_SENSOR, KIND_INTEGRATED, KIND_LOW_POWER)
+
+# 取樣間隔（毫秒）
+SAMPLE_INTERVAL_MS = {KIND_SENSOR: 5000, KIND_INTEGRATED: 5000, KIND_LOW_POWER: 60000}
+
+# 與 pico/publish_policy.py 的預設值相同
+DEADBANDS = {'temperature': 0.3, 'humidity': 2.0}
+HEARTBEAT_MS = 60000
+BATCH_SIZE = 10
+DIAG_INTERVAL_MS = 300000
+
+DEFAULT_MIX = {KIND_SENSOR: 0.6, KIND_INTEGRATED: 0.3, KIND_LOW_POWER: 0.1}
+
+
+def _encode(payload):
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+class VirtualPico:
+    """
+    一台虛擬 Pico
+
+    Args:
+        index: 裝置編號（裝置名稱為 sim-0001 …）
+        kind: KIND_SENSOR / KIND_INTEGRATED / KIND_LOW_POWER
+        rng: random.Random
+        start_ms: 模擬開始的 epoch 毫秒（開機時間在第一個取樣週期內隨機分散）
+        topic: 感測器數據的主題
+    """
+
+    def __init__(self, index, kind, rng, start_ms, topic=TOPIC):
+        self.index = index
+        self.device = f'sim-{index:04d}'
+        self.kind = kind
+        self.topic = topic
+        self.rng = rng
+        self.boot = rng.getrandbits(16)
+        self.seq = 0
+        self.temperature = rng.uniform(20.0, 28.0)
+        self.humidity = rng.uniform(45.0, 70.0)
+        self.light = '開' if rng.random() < 0.5 else '關'
+        self.interval_ms = SAMPLE_INTERVAL_MS[kind]
+        self.next_ms = start_ms + rng.randrange(self.interval_ms)
+        self.last_sent = None
+        self.last_sent_ms = 0
+        self.buffer = []
+        self.next_diag_ms = self.next_ms + DIAG_INTERVAL_MS
+        self.mem_min_free = 150000
+
+    def _sample(self):
+        rng = self.rng
+        self.temperature = min(35.0, max(15.0, self.temperature + rng.gauss(0, 0.15)))
+        self.humidity = min(90.0, max(30.0, self.humidity + rng.gauss(0, 0.6)))
+        if self.kind == KIND_INTEGRATED and rng.random() < 0.02:
+            self.light = '關' if self.light == '開' else '開'
+        return {'temperature': round(self.temperature, 1), 'humidity': round(self.humidity, 1)}
+
+    def _changed(self, reading):
+        if self.last_sent is None:
+            return True
+        for key, value in reading.items():
+            threshold = DEADBANDS.get(key)
+            if threshold is None:
+                if value != self.last_sent[key]:
+                    return True
+            elif abs(value - self.last_sent[key]) >= threshold:
+                return True
+        return False
+
+    def step(self, now_ms):
+        """
+        取樣一次並排定下一次取樣時間
+
+        Returns:
+            list: 要發布的 (topic, payload bytes)
+        """
+        self.next_ms += self.interval_ms
+        reading = self._sample()
+        if self.kind == KIND_LOW_POWER:
+            return self._step_batch(now_ms, reading)
+
+        if self.kind == KIND_INTEGRATED:
+            reading['light_status'] = self.light
+        messages = []
+        changed = self._changed(reading)
+        if changed or now_ms - self.last_sent_ms >= HEARTBEAT_MS:
+            payload = dict(reading)
+            payload.update(device=self.device, seq=self.seq, boot=self.boot,
+                           heartbeat=not changed, ts=now_ms)
+            self.seq += 1
+            self.last_sent = reading
+            self.last_sent_ms = now_ms
+            messages.append((self.topic, _encode(payload)))
+
+        if self.kind == KIND_INTEGRATED and now_ms >= self.next_diag_ms:
+            self.next_diag_ms += DIAG_INTERVAL_MS
+            self.mem_min_free = min(self.mem_min_free, self.rng.randint(140000, 160000))
+            diag = {'device': self.device, 'mem_free': self.rng.randint(150000, 170000),
+                    'mem_min_free': self.mem_min_free, 'gc_collections': self.seq,
+                    'gc_auto': 0, 'gc_max_us': self.rng.randint(900, 1600),
+                    'loop_max_us': self.rng.randint(2000, 6000), 'loops': self.seq, 'ts': now_ms}
+            messages.append((f'devices/{self.device}/diag', _encode(diag)))
+        return messages
+
+    def _step_batch(self, now_ms, reading):
+        reading['at'] = now_ms
+        reading['awake_ms'] = self.rng.randint(300, 900)
+        self.buffer.append(reading)
+        if len(self.buffer) < BATCH_SIZE:
+            return []
+        samples = [{'temperature': r['temperature'], 'humidity': r['humidity'],
+                    'age': (now_ms - r['at']) // 1000} for r in self.buffer]
+        payload = {'samples': samples, 'interval': self.interval_ms // 1000,
+                   'awake_ms': [r['awake_ms'] for r in self.buffer],
+                   'seq': self.seq, 'boot': self.boot, 'device': self.device}
+        self.seq += 1
+        self.buffer = []
+        return [(self.topic, _encode(payload))]
+
+
+def parse_mix(text):
+    """解析 --mix，例如 sensor=0.6,integrated=0.3,low_power=0.1"""
+    mix = {}
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        kind = kind.strip()
+        if kind not in KINDS:
+            raise ValueError(f'未知的裝置類型: {kind}')
+        mix[kind] = float(weight)
+    return mix
+
+
+def build_fleet(count, mix=None, seed=None, start_ms=None, topic=TOPIC):
+    """
+    建立虛擬機群
+
+    Returns:
+        list: VirtualPico 列表
+    """
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    start_ms = start_ms if start_ms is not None else int(time.time() * 1000)
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    return [VirtualPico(index + 1, rng.choices(kinds, weights)[0],
+                        random.Random(rng.getrandbits(32)), start_ms, topic)
+            for index in range(count)]
+
+
+# ---------- 送出 ----------
+
+def broker_sender(broker=BROKER, port=PORT, connections=10, qos=0):
+    """
+    建立發布到 MQTT broker 的送出函式
+
+    以 connections 條連線分攤所有裝置（每條連線各自一個網路執行緒），
+    避免上千條連線耗盡 broker 或本機的檔案描述元。
+    """
+    import paho.mqtt.client as mqtt
+
+    clients = []
+    for index in range(connections):
+        client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+                             client_id=f'picosim-fleet-{os.getpid()}-{index}')
+        client.connect(broker, port, 60)
+        client.loop_start()
+        clients.append(client)
+
+    def send(device, topic, payload, at_ms):
+        info = clients[device.index % len(clients)].publish(topic, payload, qos=qos)
+        return info.rc == mqtt.MQTT_ERR_SUCCESS
+
+    def pending():
+        return sum(1 for client in clients if client.want_write())
+
+    def close():
+        for client in clients:
+            while client.want_write():
+                time.sleep(0.01)
+            client.loop_stop()
+            client.disconnect()
+
+    return send, pending, close
+
+
+def direct_sender(data_dir):
+    """
+    建立直接送入接收流程的送出函式（不經 broker）
+
+    收到時間使用模擬時間，加速播放時儲存的時間戳記仍與裝置時間一致。
+    """
+    sys.path.insert(0, LESSON6_DIR)
+    from ingest import IngestPipeline, decode_diagnostics
+    from storage import SensorStore
+
+    store = SensorStore(data_dir)
+    pipeline = IngestPipeline(store)
+    pipeline.start()
+
+    def send(device, topic, payload, at_ms):
+        if topic.endswith('/diag'):
+            try:
+                decode_diagnostics(payload)
+            except ValueError:
+                return False
+            return True
+        return pipeline.submit(topic, payload, at_ms)
+
+    def close():
+        pipeline.join()
+        pipeline.stop()
+        store.close()
+
+    return send, pipeline.qsize, close
+
+
+# ---------- 執行 ----------
+
+def run_fleet(fleet, send, duration_s, speed=1.0, pending=None, report_every=5.0, quiet=False):
+    """
+    依時間排程讓機群發布訊息
+
+    Args:
+        fleet: VirtualPico 列表
+        send: 送出函式 send(device, topic, payload, at_ms)，丟棄時回傳 False
+        duration_s: 模擬時間長度（秒）
+        speed: 速度倍數（1 = 實際時間，0 = 盡快）
+        pending: 回傳待處理訊息數的函式（接收佇列深度）
+        report_every: 每隔幾秒（實際時間）印出一次進度
+
+    Returns:
+        dict: 訊息數、被拒絕數、耗時、速率、最大落後時間與最大佇列深度
+    """
+    if not fleet:
+        return {'sent': 0, 'rejected': 0, 'elapsed': 0.0, 'rate': 0.0, 'max_lag': 0.0, 'max_pending': 0}
+    start_ms = min(device.next_ms for device in fleet)
+    end_ms = start_ms + int(duration_s * 1000)
+    heap = [(device.next_ms, device.index, device) for device in fleet]
+    heapq.heapify(heap)
+
+    sent = rejected = max_pending = steps = 0
+    max_lag = 0.0
+    start = time.perf_counter()
+    next_report = start + report_every
+    reported = 0
+
+    while heap and heap[0][0] < end_ms:
+        at_ms, _, device = heapq.heappop(heap)
+        if speed > 0:
+            delay = start + (at_ms - start_ms) / 1000 / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+        for topic, payload in device.step(at_ms):
+            if send(device, topic, payload, at_ms):
+                sent += 1
+            else:
+                rejected += 1
+        heapq.heappush(heap, (device.next_ms, device.index, device))
+
+        steps += 1
+        if steps % 256:
+            continue
+        depth = pending() if pending else 0
+        max_pending = max(max_pending, depth)
+        now = time.perf_counter()
+        if now >= next_report:
+            if not quiet:
+                print(f'📈 模擬 {(at_ms - start_ms) / 1000:7.0f} 秒：已送出 {sent} 則 '
+                      f'({(sent - reported) / report_every:.0f} 則/秒)，拒絕 {rejected}，佇列 {depth}')
+            reported = sent
+            next_report = now + report_every
+
+    elapsed = time.perf_counter() - start
+    return {
+        'sent': sent,
+        'rejected': rejected,
+        'elapsed': elapsed,
+        'rate': sent / elapsed if elapsed > 0 else 0.0,
+        'max_lag': max_lag,
+        'max_pending': max_pending,
+    }
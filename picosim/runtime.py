@@ -0,0 +1,157 @@
+"""
+在 CPython 上執行未修改的 Pico 腳本
+
+install() 把假的 machine / network / umqtt / time / gc 等模組放進 sys.modules，
+run_script() 在模擬的 flash 目錄中以 __main__ 執行腳本：
+    machine.deepsleep()  推進時間後重新開機、從頭執行（RTC 記憶體與 flash 檔案保留）
+    模擬時間到達終點    停止
+    腳本正常結束        繼續推進時間到終點（讓 Timer 與中斷繼續運作，例如 lesson5）
+"""
+
+import os
+import runpy
+import sys
+import tempfile
+
+from picosim import board as _board
+from picosim.board import Board, DeepSleep
+from picosim.broker import attach_time_responder
+from picosim.clock import SimulationEnd
+from picosim.fake import gc as fake_gc
+from picosim.fake import machine as fake_machine
+from picosim.fake import micropython as fake_micropython
+from picosim.fake import mip as fake_mip
+from picosim.fake import network as fake_network
+from picosim.fake import time as fake_time
+from picosim.fake import ubinascii as fake_ubinascii
+from picosim.fake import umqtt as fake_umqtt
+from picosim.fake.umqtt import simple as fake_umqtt_simple
+
+FAKE_MODULES = {
+    'machine': fake_machine,
+    'network': fake_network,
+    'micropython': fake_micropython,
+    'umqtt': fake_umqtt,
+    'umqtt.simple': fake_umqtt_simple,
+    'mip': fake_mip,
+    'ubinascii': fake_ubinascii,
+    'utime': fake_time,
+    'time': fake_time,
+    'gc': fake_gc,
+}
+
+_saved = None
+
+
+def install(board=None):
+    """
+    安裝假的 MicroPython 模組
+
+    Args:
+        board: 目前的虛擬 Pico（預設建立新的）
+
+    Returns:
+        Board: 目前的虛擬 Pico
+    """
+    global _saved
+    if board is None:
+        board = Board()
+    _board.set_current(board)
+    if _saved is None:
+        _saved = {name: sys.modules.get(name) for name in FAKE_MODULES}
+        sys.modules.update(FAKE_MODULES)
+    return board
+
+
+def uninstall():
+    """還原 CPython 原本的模組"""
+    global _saved
+    if _saved is None:
+        return
+    for name, module in _saved.items():
+        if module is None:
+            sys.modules.pop(name, None)
+        else:
+            sys.modules[name] = module
+    _saved = None
+
+
+def _script_modules(script_dir):
+    """腳本目錄中的模組名稱（wifi_connect、secrets …）"""
+    return {name[:-3] for name in os.listdir(script_dir) if name.endswith('.py')}
+
+
+def _forget_modules(names):
+    """重新開機時 RAM 清空：移除已匯入的腳本模組，下次重新執行模組層級的程式"""
+    for name in names:
+        module = sys.modules.get(name)
+        if module is not None and name not in FAKE_MODULES:
+            del sys.modules[name]
+
+
+def print_messages(broker, topic_filter='#'):
+    """印出 broker 上的訊息（模擬 mosquitto_sub -v）"""
+    def show(topic, payload):
+        seconds = broker.clock.now_us / 1_000_000
+        print(f'📨 [{seconds:10.3f}s] {topic} {payload.decode("utf-8", "replace")}')
+    broker.listen(topic_filter, show)
+
+
+def run_script(path, duration_s=60.0, board=None, flash_dir=None, time_responder=True):
+    """
+    執行 Pico 腳本直到模擬時間 duration_s 秒
+
+    Args:
+        path: 腳本路徑（例如 lesson6/pico/2_temp.py）
+        duration_s: 模擬時間長度（秒）
+        board: 虛擬 Pico（預設建立新的）
+        flash_dir: 模擬 flash 的目錄（腳本寫入的檔案放在這裡，預設為暫存目錄）
+        time_responder: 是否由模擬 broker 回應校時請求
+
+    Returns:
+        Board: 執行後的虛擬 Pico（可取得 broker 統計、開機次數等）
+    """
+    path = os.path.abspath(path)
+    script_dir = os.path.dirname(path)
+    board = install(board)
+    clock = board.clock
+    clock.end_us = int(duration_s * 1_000_000)
+    if time_responder:
+        attach_time_responder(board.broker)
+
+    names = _script_modules(script_dir)
+    cwd = os.getcwd()
+    temp = None
+    if flash_dir is None:
+        temp = tempfile.TemporaryDirectory(prefix='picosim-flash-')
+        flash_dir = temp.name
+    os.makedirs(flash_dir, exist_ok=True)
+    sys.path.insert(0, script_dir)
+    # 腳本目錄的模組優先於同名的標準函式庫模組（例如 secrets）
+    _forget_modules(names)
+    os.chdir(flash_dir)
+    try:
+        while True:
+            try:
+                runpy.run_path(path, run_name='__main__')
+                # 腳本結束後 Timer 與中斷仍在執行
+                while True:
+                    clock.idle(max_us=1_000_000)
+            except DeepSleep as sleep:
+                clock.sleep_us(sleep.ms * 1000)
+                board.reset(sleep.cause)
+                _forget_modules(names)
+    except SimulationEnd:
+        pass
+    except KeyboardInterrupt:
+        print('\n⏹ 已中止')
+    finally:
+        os.chdir(cwd)
+        sys.path.remove(script_dir)
+        _forget_modules(names)
+        clock.end_us = None
+        uninstall()
+        if temp is not None:
+            temp.cleanup()
+    return board
+